@@ -0,0 +1,173 @@
+import time
+import argparse
+
+import numpy as np
+
+from catalog import CATEGORY_MAP, is_catalog_dir, load_master_data, save_optional_index
+from scoring import DEFAULT_WEIGHTS, TABLE_MODALITIES, score_rows, select_top_candidates
+
+# [설정]
+IVF_ITERATIONS = 15
+IVF_SAMPLE_PER_LIST = 64     # k-means 학습에 쓰는 리스트당 샘플 수
+IVF_CHUNK_ROWS = 65536
+IVF_PROBES = 8
+
+# ---------------------------------------------------------
+# [공통] 전체 가중합 점수를 내적 하나로 표현하는 벡터
+#   카탈로그 행: [통합 행렬 행, sqrt(w_b) * 브랜드 테이블 행, sqrt(w_c) * 카테고리 테이블 행]
+#   쿼리 행:     [쿼리 통합 행, w_b / sqrt(base_w_b) * 브랜드 테이블 행, ...]
+# ---------------------------------------------------------
+def _table_part(data, m, rows, factor):
+    table = np.asarray(data[f'{m}_table'])
+    idx = np.asarray(data[f'{m}_idx'][rows])
+    part = np.zeros((len(idx), table.shape[1]), dtype=np.float32)
+    valid = idx >= 0
+    part[valid] = table[idx[valid]]
+    return part * np.float32(factor)
+
+def catalog_vectors(data, rows):
+    parts = [np.asarray(data['fused_vecs'][rows], dtype=np.float32)]
+    for m in TABLE_MODALITIES:
+        parts.append(_table_part(data, m, rows, np.sqrt(DEFAULT_WEIGHTS[m])))
+    return np.hstack(parts)
+
+def query_vectors(data, queries):
+    """prepare_queries 결과 -> 쿼리 벡터 (요청당 1회, queries 에 저장해 카테고리 간 재사용)"""
+    if 'ivf_vecs' not in queries:
+        parts = [queries['fused']]
+        for m in TABLE_MODALITIES:
+            base = DEFAULT_WEIGHTS[m]
+            factor = queries['weights'][m] / np.sqrt(base) if base > 0 else 0.0
+            parts.append(_table_part(data, m, queries['indices'], factor))
+        queries['ivf_vecs'] = np.hstack(parts)
+    return queries['ivf_vecs']
+
+# ---------------------------------------------------------
+# [오프라인] 카테고리별 IVF (k-means 중심 + 역 리스트)
+# ---------------------------------------------------------
+def train_centroids(vectors, n_lists, iterations, rng):
+    """내적 기준 spherical k-means. 빈 리스트는 무작위 샘플로 다시 채운다."""
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-9
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=n_lists)
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = sums
+    centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-9
+    return centroids.astype(np.float32)
+
+def build_ivf(data, lists_per_category=None, iterations=IVF_ITERATIONS, seed=0):
+    """
+    카테고리 구간마다 따로 k-means 를 학습하고 각 상품을 가장 가까운 리스트에 배정한다.
+    리스트 수 기본값은 ceil(sqrt(카테고리 상품 수)) -> 조회 비용이 카탈로그 크기의 제곱근 수준.
+
+    Returns:
+        {
+          centroids (L, D), list_offsets (L+1,), rows (N',) 리스트별로 모인 행 번호(리스트 안에서는 오름차순),
+          cat_list_offsets (카테고리 수 + 1,) 카테고리 c의 리스트는 [cat_list_offsets[c], cat_list_offsets[c+1])
+        }
+    """
+    rng = np.random.default_rng(seed)
+    offsets = data['index']['cat_offsets']
+
+    centroids, rows, list_sizes = [], [], []
+    cat_list_offsets = [0]
+    for code, kor_val in enumerate(CATEGORY_MAP.values()):
+        start, end = int(offsets[code]), int(offsets[code + 1])
+        n_rows = end - start
+        if n_rows == 0:
+            cat_list_offsets.append(cat_list_offsets[-1])
+            continue
+
+        n_lists = min(n_rows, lists_per_category or int(np.ceil(np.sqrt(n_rows))))
+        sample = np.sort(rng.choice(n_rows, min(n_rows, n_lists * IVF_SAMPLE_PER_LIST), replace=False)) + start
+        cat_centroids = train_centroids(catalog_vectors(data, sample), n_lists, iterations, rng)
+
+        assign = np.empty(n_rows, dtype=np.int64)
+        for chunk_start in range(start, end, IVF_CHUNK_ROWS):
+            chunk_end = min(chunk_start + IVF_CHUNK_ROWS, end)
+            vectors = catalog_vectors(data, np.arange(chunk_start, chunk_end))
+            assign[chunk_start - start:chunk_end - start] = np.argmax(vectors @ cat_centroids.T, axis=1)
+
+        # stable 정렬 -> 리스트 안의 행 번호는 오름차순 (가격 구간 searchsorted 용)
+        order = np.argsort(assign, kind='stable')
+        centroids.append(cat_centroids)
+        rows.append(order + start)
+        list_sizes.append(np.bincount(assign, minlength=n_lists))
+        cat_list_offsets.append(cat_list_offsets[-1] + n_lists)
+        print(f"   🧭 {kor_val}: {n_rows}개 -> 리스트 {n_lists}개")
+
+    dim = catalog_vectors(data, np.arange(0)).shape[1]
+    list_sizes = np.concatenate(list_sizes) if list_sizes else np.empty(0, dtype=np.int64)
+    return {
+        'centroids': np.vstack(centroids) if centroids else np.empty((0, dim), dtype=np.float32),
+        'list_offsets': np.concatenate([[0], np.cumsum(list_sizes)]).astype(np.int64),
+        'rows': np.concatenate(rows).astype(np.int64) if rows else np.empty(0, dtype=np.int64),
+        'cat_list_offsets': np.array(cat_list_offsets, dtype=np.int64),
+    }
+
+def build_and_save_ivf(catalog_dir, lists_per_category=None, iterations=IVF_ITERATIONS):
+    if not is_catalog_dir(catalog_dir):
+        print(f"❌ {catalog_dir} 는 카탈로그 디렉토리가 아닙니다. (catalog.py / preprocess.py 로 먼저 생성)")
+        return
+    data = load_master_data(catalog_dir)
+    if data is None:
+        return
+
+    print("🧭 IVF 인덱스 생성 중...")
+    start_time = time.time()
+    ivf = build_ivf(data, lists_per_category, iterations)
+    save_optional_index(catalog_dir, 'ivf', ivf, lists=int(len(ivf['centroids'])), iterations=iterations,
+                        built_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+    print(f"✅ IVF 인덱스 저장 완료 (리스트 {len(ivf['centroids'])}개, {time.time() - start_time:.1f}초)")
+
+# ---------------------------------------------------------
+# [요청 시] 카테고리 안에서 가까운 리스트만 탐색
+# ---------------------------------------------------------
+def ivf_candidates(data, queries, cat_code, start, end, k, n_probe=IVF_PROBES):
+    """
+    category_candidates 와 같은 결과 형식. 대표 상품마다 카테고리 cat_code 의 리스트 중
+    중심과 가장 가까운 n_probe 개를 고르고, 고른 리스트들의 합집합 중 [start, end) 구간(가격 필터)에
+    속한 상품만 모아 float32로 정확히 계산한다. (행을 한 번만 읽고 대표 상품 전체를 GEMM 1회로 계산)
+
+    Returns:
+        (indices, scores): 전역 행 인덱스와 점수
+    """
+    empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    ivf = data['ivf']
+    list_start = int(ivf['cat_list_offsets'][cat_code])
+    list_end = int(ivf['cat_list_offsets'][cat_code + 1])
+    if start >= end or list_start == list_end or len(queries['indices']) == 0:
+        return empty
+
+    sims = query_vectors(data, queries) @ np.asarray(ivf['centroids'][list_start:list_end]).T
+    n_probe = min(n_probe, list_end - list_start)
+    probe = np.unique(np.argpartition(-sims, n_probe - 1, axis=1)[:, :n_probe]) + list_start
+
+    list_offsets = ivf['list_offsets']
+    parts = []
+    for list_id in probe:
+        rows = ivf['rows'][list_offsets[list_id]:list_offsets[list_id + 1]]
+        lo, hi = np.searchsorted(rows, [start, end])
+        parts.append(rows[lo:hi])
+    # 정렬된 행 번호로 읽으면 mmap 접근이 순차에 가까워진다
+    candidates = np.sort(np.concatenate(parts))
+    if len(candidates) == 0:
+        return empty
+
+    local_indices, top_scores = select_top_candidates(score_rows(data, queries, candidates), k)
+    return candidates[local_indices], top_scores
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="master_data 디렉토리에 카테고리별 IVF 인덱스를 추가합니다.")
+    parser.add_argument('path', nargs='?', default='../data/master_data', help="카탈로그 디렉토리")
+    parser.add_argument('--lists', type=int, help="카테고리당 리스트 수 (기본: sqrt(카테고리 상품 수))")
+    parser.add_argument('--iters', type=int, default=IVF_ITERATIONS, help="k-means 반복 횟수")
+    args = parser.parse_args()
+
+    build_and_save_ivf(args.path, lists_per_category=args.lists, iterations=args.iters)
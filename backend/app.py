@@ -1,71 +1,203 @@
 import os
+import json
+import math
+import time
+import logging
 import numpy as np
-import pandas as pd
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, abort, g
+from werkzeug.exceptions import NotFound
 from flask_cors import CORS
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import IntegrityError
-import requests
-from io import BytesIO
-from PIL import Image
-from rembg import remove
 from dotenv import load_dotenv
+from scoring import MODALITIES, resolve_weights, prepare_queries, category_candidates
+from catalog import CATEGORY_MAP, CatalogManager, lookup_indices, price_window
+from ann import ivf_candidates
+from knn_graph import graph_candidates
+from image_jobs import ImageJobQueue, STATUS_READY
+from image_variants import is_immutable, srcsets
+from image_store import ProcessedImageStore, shard_of, product_of
+from image_fetch import remove_legacy_cache
+from pool_cache import CandidatePoolCache, representative_digest
+from shuffle_sessions import ShuffleSessionStore
+from response_cache import ResponseCache, etag_for, etag_matches
+from db import create_db_engine, RepresentativeMirror
+from outfit_writer import (OutfitWriter, OUTFIT_BUFFER_SIZE, KEY_COLUMNS, ACCEPTED, DUPLICATE, BUSY,
+                           parse_outfit)
+from metrics import REGISTRY, STAGE_SECONDS, CONTENT_TYPE
 
 load_dotenv()
 
+# 요청마다 찍는 로그는 DEBUG (기본 INFO 에서는 문자열도 만들지 않음)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=LOG_LEVEL, format='%(message)s')
+log = logging.getLogger('app')
+
 app = Flask(__name__)
 CORS(app)
 
 # [설정]
-master_data = {}
+# mmap 디렉토리 포맷이 있으면 우선 사용, 없으면 기존 npz
+MASTER_DATA_PATHS = ['../data/master_data', '../data/master_data.npz']
+CATALOG_WATCH_INTERVAL = int(os.getenv('CATALOG_WATCH_INTERVAL', '30'))  # 0이면 파일 감시 안 함
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+TOP_K_PER_REPRESENTATIVE = 10
+# 압축 통합 행렬(fused_q)이 있으면 대표 상품별 상위 N개를 근사 점수로 뽑은 뒤 float32로 재순위 (0이면 항상 정확 계산)
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', '200'))
+# IVF 인덱스(ann.py)가 있으면 카테고리별로 가까운 리스트 N개만 탐색 (0이면 전체 스캔)
+IVF_PROBES = int(os.getenv('IVF_PROBES', '8'))
+# 페르소나별 카테고리 후보 풀 LRU 항목 수 (셔플은 캐시된 풀에서 다시 뽑기만 함, 0이면 캐시 안 함)
+POOL_CACHE_SIZE = int(os.getenv('POOL_CACHE_SIZE', '256'))
+# representative_item 변경 확인 주기 (초, 0이면 시작 시 1회만 로드)
+REP_REFRESH_INTERVAL = int(os.getenv('REP_REFRESH_INTERVAL', '60'))
+# 누끼 이미지 브라우저 캐시: 내용 해시가 든 축소본은 1년 + immutable, 이름이 고정인 PNG 는 하루
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+PROCESSED_PNG_MAX_AGE = int(os.getenv('PROCESSED_PNG_MAX_AGE', '86400'))
+# 셔플 세션: 카테고리별로 이미 보여준 후보를 건너뛰는 커서 (최대 개수 / 마지막 사용 후 유지 시간(초), 0이면 세션 없음)
+SHUFFLE_SESSIONS = int(os.getenv('SHUFFLE_SESSIONS', '10000'))
+SHUFFLE_SESSION_TTL = int(os.getenv('SHUFFLE_SESSION_TTL', '1800'))
+SHUFFLE_PAGE_SIZE = 5  # 카테고리별 응답 상품 수
+# seed 를 지정한 /api/products 응답 캐시 (항목 수 / 유지 시간(초), 0이면 캐시 안 함)
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '1024'))
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '300'))
 PROCESSED_DIR = os.path.join(os.getcwd(), "static", "processed_imgs")
-os.makedirs(PROCESSED_DIR, exist_ok=True)
+# 누끼 이미지는 shard 폴더 + 메모리 색인 (디스크 예산: PROCESSED_MAX_MB)
+image_store = ProcessedImageStore(PROCESSED_DIR)
+image_jobs = ImageJobQueue(image_store)
+pool_cache = CandidatePoolCache(POOL_CACHE_SIZE)
+shuffle_sessions = ShuffleSessionStore(SHUFFLE_SESSIONS, SHUFFLE_SESSION_TTL)
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+# [지표] GET /metrics (Prometheus text format)
+REQUEST_SECONDS = REGISTRY.histogram('http_request_duration_seconds', 'API 응답 시간', ['endpoint', 'status'])
+CANDIDATE_SOURCE = REGISTRY.counter('candidate_source_total', '카테고리 후보 계산 경로 (knn / ivf / scan)', ['source'])
+IMAGE_FALLBACKS = REGISTRY.counter('image_fallback_total', '누끼 대신 원본 이미지로 응답한 수 (작업 상태별)', ['status'])
 
 # ---------------------------------------------------------
 # [초기화] 데이터 로드
 # ---------------------------------------------------------
+# 요청 핸들러는 시작 시 catalog.current() 를 한 번만 읽어 끝까지 같은 스냅샷을 사용한다.
+catalog = CatalogManager(MASTER_DATA_PATHS)
+
+# localhost (풀 크기 / 재활용 / pre-ping 은 db.py 의 DB_POOL_* 환경변수)
+engine = create_db_engine()
+# 추천 요청은 DB 대신 메모리의 representative_item 미러만 읽는다
+representatives = RepresentativeMirror(engine)
+# 아웃핏 저장은 버퍼에 모았다가 executemany 로 기록
+outfit_writer = OutfitWriter(engine)
+
 def init_data():
-    global master_data
-    try:
-        path = '../data/master_data.npz'
-        if not os.path.exists(path):
-            print(f"🚨 [오류] {path} 파일 없음")
-            return
-        data = np.load(path, allow_pickle=True)
-        required_keys = ['ids', 'names', 'prices', 'imgs', 'cats', 
-                         'name_vecs', 'brand_vecs', 'img_vecs', 'cat_vecs']
-        temp_data = {}
-        for key in required_keys:
-            if key not in data:
-                print(f"❌ [키 누락] {key}")
-                return
-            
-            val = data[key]
-            if key.endswith('_vecs'):
-                try:
-                    if val.dtype == object or isinstance(val, list):
-                        temp_data[key] = np.array([np.array(x, dtype=np.float32) for x in val])
-                    else:
-                        temp_data[key] = val.astype(np.float32)
-                except Exception:
-                    temp_data[key] = val
-            else:
-                temp_data[key] = val
-                
-        master_data = temp_data
-        print(f"✅ 데이터 로드 완료! (총 {len(master_data['ids'])}개)")
-    except Exception as e:
-        print(f"❌ 데이터 로딩 에러: {e}")
+    catalog.reload()
+    # preprocess.py 로 데이터가 갱신되면 재시작 없이 백그라운드에서 교체
+    catalog.start_watch(CATALOG_WATCH_INTERVAL)
+    # DB 가 내려가 있어도 서버는 뜨고, 감시 스레드가 다음 주기에 다시 시도한다
+    representatives.refresh(force=True)
+    representatives.start_watch(REP_REFRESH_INTERVAL)
+    outfit_writer.load_known_keys()
+    outfit_writer.start()
+    image_store.load()
+    image_store.start_saver()
+    remove_legacy_cache()
 
 init_data()
 
-# localhost
-db_url = f"mysql+mysqlconnector://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
-engine = create_engine(db_url)
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def add_catalog_version(response):
+    snapshot = catalog.current()
+    if snapshot is not None:
+        response.headers['X-Catalog-Version'] = snapshot.version
+    # 라벨 수가 늘지 않도록 URL 대신 라우트 이름으로 기록
+    if 'request_start' in g and request.endpoint != 'metrics':
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                endpoint=request.endpoint or 'unknown', status=response.status_code)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+# ---------------------------------------------------------
+# [API] 카탈로그 수동 리로드 / 캐시 상태 (관리자)
+# ---------------------------------------------------------
+def is_admin_request():
+    # ADMIN_TOKEN 이 설정되어 있으면 헤더로 확인, 없으면 로컬 요청만 허용
+    if ADMIN_TOKEN:
+        return request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/api/admin/reload', methods=['POST'])
+def reload_catalog():
+    if not is_admin_request():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+
+    snapshot = catalog.current()
+    catalog.reload_async(force=True)
+    representatives.refresh_async(force=True)
+    return jsonify({"ok": True, "current_version": snapshot.version if snapshot else None}), 202
+
+@app.route('/api/admin/cache', methods=['GET', 'DELETE'])
+def candidate_cache():
+    if not is_admin_request():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+
+    # DELETE ?persona=... : 해당 페르소나(없으면 전체) 후보 풀 비우기
+    if request.method == 'DELETE':
+        removed = pool_cache.invalidate(request.args.get('persona'))
+        response_cache.invalidate(request.args.get('persona'))
+        return jsonify({"ok": True, "removed": removed, **pool_cache.stats(), "shuffle": shuffle_sessions.stats(),
+                        "responses": response_cache.stats()})
+    return jsonify({"ok": True, **pool_cache.stats(), "shuffle": shuffle_sessions.stats(),
+                    "responses": response_cache.stats()})
+
+@app.route('/api/admin/images', methods=['GET'])
+def processed_images():
+    if not is_admin_request():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    return jsonify({"ok": True, **image_store.stats()})
+
+@app.route('/api/admin/outfits', methods=['GET'])
+def outfit_writer_stats():
+    if not is_admin_request():
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    return jsonify({"ok": True, **outfit_writer.stats()})
 
 # ---------------------------------------------------------
-# [API] 구매한 아웃핏 저장
+# [API] 구매한 아웃핏 저장 (write-behind: 메모리 버퍼에 접수 후 백그라운드에서 모아서 INSERT)
 # ---------------------------------------------------------
+def find_unknown_products(row):
+    """카탈로그에 없는 product_id (0 = 없음 제외). FK 실패를 DB 왕복 없이 미리 거른다"""
+    master_data = catalog.current()
+    if not master_data:
+        return []
+    product_ids = [row[col] for col in KEY_COLUMNS if row[col] != 0]
+    _, missing_ids = lookup_indices(master_data['index'], product_ids)
+    return [int(x) for x in missing_ids]
+
+def accept_outfits(payloads):
+    """
+    Returns:
+        [{"ok": bool, "status": accepted|duplicate|busy|invalid, "error"?: str}, ...] (payloads 순서)
+    """
+    results = [None] * len(payloads)
+    rows, positions = [], []
+    for i, payload in enumerate(payloads):
+        row, error = parse_outfit(payload)
+        if error is None:
+            unknown = find_unknown_products(row)
+            if unknown:
+                error = f"invalid product_id: {unknown}"
+        if error is not None:
+            results[i] = {"ok": False, "status": "invalid", "error": error}
+            continue
+        rows.append(row)
+        positions.append(i)
+
+    for i, status in zip(positions, outfit_writer.submit_many(rows)):
+        results[i] = {"ok": status == ACCEPTED, "status": status}
+    return results
+
 @app.route('/api/outfit', methods=['POST'])
 def create_outfit():
     """
@@ -81,84 +213,63 @@ def create_outfit():
       ]
     }
 
-    Rules:
-    - top/bottom/shoes are required
-    - outer/acc are optional; if missing, store 0 (dummy product_id meaning "None")
-    - outfit table should enforce uniqueness via UNIQUE(outer_id, top_id, bottom_id, shoes_id, acc_id)
+    - 202: 접수 (OUTFIT_FLUSH_INTERVAL 안에 기록)
+    - 409: 이미 저장(또는 접수)된 조합 / 카탈로그에 없는 product_id
+    - 503: 버퍼가 가득 참 (잠시 후 재시도)
     """
     payload = request.get_json(silent=True) or {}
-    persona = payload.get('persona')
-    items = payload.get('items', [])
-
-    if not persona or not isinstance(persona, str):
-        return jsonify({"ok": False, "error": "persona is required"}), 400
-    if not isinstance(items, list):
-        return jsonify({"ok": False, "error": "items must be a list"}), 400
-
-    by_cat = {}
-    for it in items:
-        if not isinstance(it, dict):
-            continue
-        cat = it.get('category')
-        pid = it.get('product_id')
-        if cat in ['outer', 'top', 'bottom', 'shoes', 'acc'] and pid is not None:
-            try:
-                by_cat[cat] = int(pid)
-            except Exception:
-                pass
-
-    # Required
-    if 'top' not in by_cat or 'bottom' not in by_cat or 'shoes' not in by_cat:
-        return jsonify({"ok": False, "error": "top, bottom, shoes are required"}), 400
-
-    # Optional -> dummy 0
-    outer_id = int(by_cat.get('outer', 0))
-    acc_id = int(by_cat.get('acc', 0))
-    top_id = int(by_cat['top'])
-    bottom_id = int(by_cat['bottom'])
-    shoes_id = int(by_cat['shoes'])
-
-    stmt = text("""
-        INSERT INTO outfit (persona, outer_id, acc_id, top_id, bottom_id, shoes_id)
-        VALUES (:persona, :outer_id, :acc_id, :top_id, :bottom_id, :shoes_id)
-    """)
+    row, error = parse_outfit(payload)
+    if error is not None:
+        return jsonify({"ok": False, "error": error}), 400
+
+    unknown = find_unknown_products(row)
+    if unknown:
+        return jsonify({"ok": False, "error": f"invalid product_id: {unknown}"}), 409
+
+    status = outfit_writer.submit(row)
+    if status == DUPLICATE:
+        return jsonify({"ok": False, "error": "duplicate outfit"}), 409
+    if status == BUSY:
+        return jsonify({"ok": False, "error": "outfit buffer full, retry later"}), 503, {"Retry-After": "1"}
+    return jsonify({"ok": True, "status": status}), 202
+
+@app.route('/api/outfits', methods=['POST'])
+def create_outfits():
+    """
+    여러 아웃핏을 한 번에 접수: {"outfits": [<create_outfit payload>, ...]}
+    -> {"ok": true, "accepted": n, "results": [{"ok", "status", "error"?}, ...]}
+    """
+    payload = request.get_json(silent=True) or {}
+    outfits = payload.get('outfits')
+    if not isinstance(outfits, list) or not outfits:
+        return jsonify({"ok": False, "error": "outfits must be a non-empty list"}), 400
+    if len(outfits) > OUTFIT_BUFFER_SIZE:
+        return jsonify({"ok": False, "error": f"at most {OUTFIT_BUFFER_SIZE} outfits per request"}), 413
 
-    try:
-        with engine.begin() as conn:
-            conn.execute(stmt, {
-                "persona": persona,
-                "outer_id": outer_id,
-                "acc_id": acc_id,
-                "top_id": top_id,
-                "bottom_id": bottom_id,
-                "shoes_id": shoes_id
-            })
-        return jsonify({"ok": True}), 201
-    except IntegrityError:
-        # duplicate UNIQUE or FK failure
-        return jsonify({"ok": False, "error": "duplicate outfit or invalid product_id"}), 409
-    except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 500
+    results = accept_outfits(outfits)
+    accepted = sum(1 for r in results if r["ok"])
+    return jsonify({"ok": True, "accepted": accepted, "results": results}), 202
 
 # ---------------------------------------------------------
 # [신규 API] master_data(npz)에서 카테고리별 가격 범위 추출
 # ---------------------------------------------------------
 @app.route('/api/price-ranges', methods=['GET'])
 def get_price_ranges():
+    master_data = catalog.current()
     if not master_data:
         return jsonify({"error": "Data not loaded"}), 500
 
-    CATEGORY_MAP = {"outer": "아우터", "top": "상의", "bottom": "바지", "shoes": "신발", "acc": "액세서리"}
     category_price_ranges = {}
 
-    for eng_key, kor_val in CATEGORY_MAP.items():
-        cat_mask = (master_data['cats'] == kor_val)
-        all_prices_in_cat = master_data['prices'][cat_mask]
+    # 카테고리 구간은 가격 오름차순으로 정렬되어 있으므로 양 끝이 최소/최대
+    cat_offsets = master_data['index']['cat_offsets']
+    for code, eng_key in enumerate(CATEGORY_MAP.keys()):
+        start, end = int(cat_offsets[code]), int(cat_offsets[code + 1])
 
-        if len(all_prices_in_cat) > 0:
+        if end > start:
             category_price_ranges[eng_key] = {
-                "min": int(np.min(all_prices_in_cat)),
-                "max": int(np.max(all_prices_in_cat))
+                "min": int(master_data['prices'][start]),
+                "max": int(master_data['prices'][end - 1])
             }
         else:
             category_price_ranges[eng_key] = {"min": 0, "max": 0}
@@ -166,23 +277,80 @@ def get_price_ranges():
     return jsonify(category_price_ranges)
 
 # ---------------------------------------------------------
-# [기능] 누끼 따기 및 저장 함수
+# [기능] 누끼 이미지 URL / 상태 조회
 # ---------------------------------------------------------
-def process_and_save_image(image_url, save_path):
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(image_url, headers=headers, timeout=10)
-        
-        if response.status_code == 200:
-            input_image = Image.open(BytesIO(response.content)).convert("RGBA")
-            output_image = remove(input_image)
-            output_image.save(save_path, format="PNG")
-            return True
+def processed_path(product_id):
+    return image_store.path(product_id)
+
+def resolve_images(products, host_url, issue=True):
+    """
+    누끼 이미지가 준비되어 있으면 그 URL(+ 축소본 srcset)을, 아니면 백그라운드 작업을 등록하고 원본 URL을 반환.
+    응답 1건의 이미지를 한 번에 넘겨야 원본 다운로드가 동시에 진행된다.
+    요청 스레드는 다운로드/rembg를 기다리지 않는다.
+
+    Args:
+        products: [(product_id, original_img_url), ...]
+        host_url: 누끼 이미지 URL 앞부분 (예: "http://127.0.0.1:5000/")
+        issue: False 면 추천 응답에 내보낸 적 없는 상품은 작업을 등록하지 않는다 (상태 조회 API)
+
+    Returns:
+        {product_id: (img_url, status, sources)}  sources: {MIME: srcset} (축소본이 없으면 None)
+    """
+    jobs = [(p_id, img_url, processed_path(p_id)) for p_id, img_url in products]
+    statuses = image_jobs.submit_many(jobs, issue=issue)
+
+    base_url = f"{host_url}static/processed_imgs/"
+    resolved = {}
+    for p_id, img_url in products:
+        status = statuses[p_id]
+        if status == STATUS_READY:
+            manifest = image_store.manifest(p_id)
+            sources = srcsets(manifest, f"{base_url}{shard_of(p_id)}/") if manifest else None
+            resolved[p_id] = (f"{base_url}{image_store.relpath(p_id)}", status, sources)
         else:
-            return False
-    except Exception as e:
-        print(f"   ⚠️ 누끼 에러: {e}")
-        return False
+            IMAGE_FALLBACKS.inc(status=status)
+            resolved[p_id] = (img_url, status, None)
+    return resolved
+
+def image_fields(img_url, status, sources):
+    """응답 상품의 이미지 필드. img_srcset 은 <img srcset> 에 바로 쓰는 기본 포맷(첫 번째), img_sources 는 포맷별"""
+    return {"img_url": img_url, "img_status": status,
+            "img_srcset": next(iter(sources.values())) if sources else None, "img_sources": sources}
+
+def image_statuses(args, host_url):
+    """
+    /api/images/status 본문 (Flask / ASGI 공용)
+
+    Returns:
+        (body, status_code)
+    """
+    master_data = catalog.current()
+    if not master_data:
+        return {"error": "Data not loaded"}, 500
+
+    try:
+        product_ids = [int(x) for x in args.get('ids', '').split(',') if x.strip()]
+    except ValueError:
+        return {"error": "ids must be comma-separated integers"}, 400
+
+    indices, _ = lookup_indices(master_data['index'], product_ids)
+    # 아무 상품 ID 로나 rembg 작업을 만들 수 없도록, 추천 응답에 나간 상품만 작업을 등록한다
+    resolved = resolve_images([(int(master_data['ids'][idx]), str(master_data['imgs'][idx])) for idx in indices],
+                              host_url, issue=False)
+    images = {}
+    for p_id, (img_url, status, sources) in resolved.items():
+        fields = image_fields(img_url, status, sources)
+        images[str(p_id)] = {"status": fields.pop("img_status"), **fields}
+    return {"images": images}, 200
+
+@app.route('/api/images/status', methods=['GET'])
+def get_image_status():
+    """
+    프론트엔드 폴링용: /api/images/status?ids=1,2,3
+    -> {"images": {"1": {"status": "ready", "img_url": "..."}, ...}}
+    """
+    body, status = image_statuses(request.args, request.host_url)
+    return jsonify(body), status
 
 # ---------------------------------------------------------
 # [API] 추천 상품 반환 (기존 버전 - 주석 처리)
@@ -311,169 +479,325 @@ def process_and_save_image(image_url, save_path):
 # ---------------------------------------------------------
 # [API] 추천 상품 반환 (새 버전 - representative_item 기반)
 # ---------------------------------------------------------
-@app.route('/api/products', methods=['GET'])
-def get_recommendations():
-    persona = request.args.get('persona', '아메카지')
-    target_category_filter = request.args.get('category')
+def query_arg(args, key, type=str, default=None):
+    """request.args.get(key, type=...) 와 같은 규칙 (없거나 변환 실패 시 default). Starlette QueryParams 에도 사용"""
+    value = args.get(key)
+    if value is None:
+        return default
+    try:
+        return type(value)
+    except (TypeError, ValueError):
+        return default
+
+def with_images(body, host_url):
+    """
+    추천 본문의 상품마다 누끼 이미지 URL / 상태를 채운 사본 (응답 캐시에 든 본문은 건드리지 않음).
+    누끼 이미지가 없으면 백그라운드 작업(원본 동시 다운로드 -> rembg)만 등록하고 원본 이미지 URL 을 넣는다.
+    """
+    with STAGE_SECONDS.time(stage='image_resolve'):
+        items = {eng_key: [dict(item) for item in items_list] for eng_key, items_list in body["items"].items()}
+        all_items = [item for items_list in items.values() for item in items_list]
+        resolved = resolve_images([(item["product_id"], item["img_url"]) for item in all_items], host_url)
+        for item in all_items:
+            item.update(image_fields(*resolved[item["product_id"]]))
+    return {**body, "items": items}
+
+def is_replayable(args):
+    """seed 를 지정하고 세션 없이 온 요청: 같은 요청이면 같은 응답 (응답 캐시 / ETag 대상)"""
+    return query_arg(args, 'seed', int) is not None and not args.get('session')
+
+def replay_session(base_key, seed, windows, candidates_by_category):
+    """
+    응답 캐시에서 꺼낸 seed 응답용 새 셔플 세션.
+    같은 seed 로 커서를 만들고 첫 페이지만큼 넘겨 두어, 이 세션의 셔플이 처음 계산한 응답과 같게 이어진다.
+    """
+    session_id, session = shuffle_sessions.create(base_key, seed)
+    for code, eng_key in enumerate(CATEGORY_MAP.keys()):
+        if eng_key in candidates_by_category:
+            shuffle_sessions.reset(session, eng_key, code, windows[eng_key], candidates_by_category[eng_key])
+            if len(session.categories[eng_key].indices):
+                shuffle_sessions.take(session, eng_key, SHUFFLE_PAGE_SIZE)
+    return session_id
+
+def recommend(args, host_url, allow_compute=True):
+    """
+    /api/products 본문 (Flask / ASGI 공용)
+
+    Args:
+        args: 쿼리 파라미터 (get(key) 를 지원하는 mapping)
+        allow_compute: False 면 후보 풀 캐시만으로 답할 수 있을 때만 응답하고, 계산이 필요하면 None
+                       (ASGI 서버가 빠른 요청은 이벤트 루프에서 바로, 느린 요청은 executor 에서 처리)
+                       None 을 돌려줄 때는 캐시 / 세션 조회 통계를 남기지 않는다
+
+    Returns:
+        (body, status_code) 또는 None
+    """
+    persona = args.get('persona', '아메카지')
+    target_category_filter = args.get('category')
+    session_id = args.get('session')  # 첫 응답의 session_id (셔플 시 전달)
+    seed = query_arg(args, 'seed', int)  # 없으면 서버가 정해 응답에 담아 준다
     
-    print(f"\n🔍 [추천 요청] 페르소나: {persona}")
+    log.debug(f"\n🔍 [추천 요청] 페르소나: {persona}")
 
+    master_data = catalog.current()
     if not master_data: 
-        return jsonify({"error": "Server data not loaded"}), 500
+        return {"error": "Server data not loaded"}, 500
+    if seed is not None and seed < 0:
+        return {"error": "seed must be a non-negative integer"}, 400
+    # 가중치 오버라이드: 페르소나 설정 + 요청 파라미터(w_name, w_brand, w_img, w_cat)
+    # nan / inf / 음수는 점수 순서를 깨뜨리므로 점수 계산 전에 거절
+    weight_overrides = {m: query_arg(args, f'w_{m}', float) for m in MODALITIES}
+    invalid = [f'w_{m}' for m, w in weight_overrides.items() if w is not None and not (math.isfinite(w) and w >= 0)]
+    if invalid:
+        return {"error": f"{', '.join(invalid)} must be a finite non-negative number"}, 400
+    
+    # 캐시 / 세션 조회 통계는 이 호출이 실제로 응답할 때만 넣는다
+    # (allow_compute=False 호출이 None 을 돌려주면 executor 에서 같은 조회를 다시 하므로 두 번 세지 않게)
+    lookups = []
+    def lookup(store, *key):
+        value, result = store.lookup(*key)
+        if allow_compute:
+            store.record(result)
+        else:
+            lookups.append((store, result))
+        return value
+    def record_lookups():
+        for store, result in lookups:
+            store.record(result)
+        lookups.clear()
 
     try:
-        # 1. representative_item 테이블에서 해당 페르소나의 대표 상품 ID 리스트 가져오기
-        with engine.connect() as conn:
-            query = "SELECT product_id FROM representative_item WHERE persona = %s"
-            rep_items_df = pd.read_sql(query, conn, params=(persona,))
-            
-            if rep_items_df.empty:
-                print(f"❌ 페르소나 '{persona}'에 해당하는 대표 상품이 없습니다.")
-                return jsonify({"error": "Persona not found"}), 404
-            
-            representative_ids = rep_items_df['product_id'].tolist()
-            print(f"📋 대표 상품 {len(representative_ids)}개 발견")
-        
-        # 2. master_data에서 대표 상품들의 인덱스 찾기
-        id_to_idx = {int(pid): idx for idx, pid in enumerate(master_data['ids'])}
-        representative_indices = []
-        missing_ids = []
+        # 1. 메모리 미러에서 해당 페르소나의 대표 상품 ID 가져오기 (DB 접근 없음)
+        with STAGE_SECONDS.time(stage='representatives'):
+            representative_ids = representatives.get(persona)
+        if representative_ids is None:
+            if not representatives.loaded:
+                log.warning("❌ representative_item 을 아직 불러오지 못했습니다.")
+                return {"error": "Representative items not loaded"}, 503
+            log.debug(f"❌ 페르소나 '{persona}'에 해당하는 대표 상품이 없습니다.")
+            return {"error": "Persona not found"}, 404
+        log.debug(f"📋 대표 상품 {len(representative_ids)}개 발견")
         
-        for rep_id in representative_ids:
-            rep_id_int = int(rep_id)
-            if rep_id_int in id_to_idx:
-                representative_indices.append(id_to_idx[rep_id_int])
-            else:
-                missing_ids.append(rep_id_int)
+        weights = resolve_weights(persona, weight_overrides)
+        # exact=1: kNN 그래프 / IVF / 압축 행렬 없이 전체 float32 스캔 (정확도 비교용)
+        exact = query_arg(args, 'exact', int, 0) == 1
+        use_ivf = not exact and IVF_PROBES > 0 and 'ivf' in master_data
         
-        if missing_ids:
-            print(f"⚠️ master_data에서 찾지 못한 ID: {missing_ids[:5]}{'...' if len(missing_ids) > 5 else ''} (총 {len(missing_ids)}개)")
+        # 후보 풀 캐시 키 공통부: 카탈로그 버전 + 대표 상품 지문 (둘 중 하나가 바뀌면 새 키)
+        base_key = (persona, master_data.version, representative_digest(representative_ids),
+                    tuple(sorted(weights.items())), exact)
+        # 같은 조건의 셔플 세션이면 이미 만든 카테고리 커서에서 다음 페이지만 자른다
+        session = lookup(shuffle_sessions, session_id, base_key)
         
-        if not representative_indices:
-            return jsonify({"error": "No valid representative items found in master data"}), 404
+        # 요청한 카테고리별 가격 구간 (정렬된 배열의 연속 행 범위)
+        windows = {}
+        for code, eng_key in enumerate(CATEGORY_MAP.keys()):
+            if target_category_filter and target_category_filter != eng_key:
+                continue
+            cat_min = query_arg(args, f'min_{eng_key}', int)
+            cat_max = query_arg(args, f'max_{eng_key}', int)
+            windows[eng_key] = price_window(master_data['index'], master_data['prices'], code, cat_min, cat_max)
         
-        print(f"✅ 유효한 대표 상품 {len(representative_indices)}개 확인")
+        # seed 를 지정한 재요청(새로고침 등)은 저장해 둔 본문에 이미지 상태만 다시 채워 응답
+        # 세션은 요청마다 새로 만든다 (같은 seed 를 보낸 다른 클라이언트와 셔플 커서를 공유하지 않게)
+        response_key = base_key + (seed, tuple(windows.items())) if is_replayable(args) else None
+        cached = lookup(response_cache, response_key) if response_key is not None else None
+        if cached is not None:
+            record_lookups()
+            cached_body, cached_candidates = cached
+            session_id = replay_session(base_key, seed, windows, cached_candidates)
+            return with_images({**cached_body, "session_id": session_id}, host_url), 200
         
-        # 3. 각 대표 상품에 대해 유사도 계산하여 상위 3개씩 찾기
-        all_candidate_indices = {}  # {product_id: max_similarity_score} 형식으로 저장
-        total_products = len(master_data['ids'])
+        # 2. master_data에서 대표 상품들의 인덱스 찾기 (캐시 미스가 있을 때만, 로드 시 만든 인덱스로 이진 탐색)
+        representative_indices = None
+        # 대표 상품 쿼리 행 + 브랜드/카테고리 테이블 유사도는 직접 계산이 필요할 때 요청당 1회만 준비
+        queries = None
         
-        for rep_idx in representative_indices:
-            rep_id = int(master_data['ids'][rep_idx])
-            rep_name = str(master_data['names'][rep_idx])
-            
-            # 전체 상품과의 유사도 계산
-            sim_name = np.dot(master_data['name_vecs'], master_data['name_vecs'][rep_idx])
-            sim_brand = np.dot(master_data['brand_vecs'], master_data['brand_vecs'][rep_idx])
-            sim_img = np.dot(master_data['img_vecs'], master_data['img_vecs'][rep_idx])
-            sim_cat = np.dot(master_data['cat_vecs'], master_data['cat_vecs'][rep_idx])
+        # 3. 카테고리별 가격 구간(연속 행 구간)에 대해서만 유사도 계산 및 후보 선택
+        candidates_by_category = {}
+        cache_hits = 0
+        for code, eng_key in enumerate(CATEGORY_MAP.keys()):
+            if eng_key not in windows:
+                continue
             
-            final_scores = (sim_name * 0.1) + (sim_brand * 0.2) + (sim_img * 0.6) + (sim_cat * 0.1)
+            start, end = windows[eng_key]
+            cursor = session.categories.get(eng_key) if session is not None else None
+            if cursor is not None and cursor.window == (start, end):
+                continue
             
-            # 대표 상품 자체는 제외
-            final_scores[rep_idx] = -1.0
+            cache_key = base_key + (eng_key, start, end)
+            cached = lookup(pool_cache, cache_key)
+            if cached is not None:
+                candidates_by_category[eng_key] = cached
+                cache_hits += 1
+                continue
+            if not allow_compute:
+                return None
             
-            # 상위 3개 선택
-            top_3_indices = np.argsort(final_scores)[::-1][:10]
+            if representative_indices is None:
+                representative_indices, missing_ids = lookup_indices(master_data['index'], representative_ids)
+                
+                if len(missing_ids):
+                    log.debug(f"⚠️ master_data에서 찾지 못한 ID: {missing_ids[:5].tolist()}{'...' if len(missing_ids) > 5 else ''} (총 {len(missing_ids)}개)")
+                
+                if len(representative_indices) == 0:
+                    return {"error": "No valid representative items found in master data"}, 404
+                
+                log.debug(f"✅ 유효한 대표 상품 {len(representative_indices)}개 확인")
             
-            for candidate_idx in top_3_indices:
-                candidate_id = int(master_data['ids'][candidate_idx])
-                candidate_score = final_scores[candidate_idx]
+            with STAGE_SECONDS.time(stage='scoring'):
+                candidates = None
+                # 오프라인 kNN 그래프로 답할 수 있으면 조회만 (가중치 오버라이드 / 부족한 이웃은 None -> 직접 계산)
+                if not exact:
+                    candidates = graph_candidates(master_data, representative_indices, code, start, end,
+                                                  TOP_K_PER_REPRESENTATIVE, weights)
+                    if candidates is not None:
+                        CANDIDATE_SOURCE.inc(source='knn')
                 
-                # 이미 후보에 있으면 더 높은 점수로 업데이트
-                if candidate_id not in all_candidate_indices:
-                    all_candidate_indices[candidate_id] = candidate_score
-                else:
-                    all_candidate_indices[candidate_id] = max(all_candidate_indices[candidate_id], candidate_score)
+                # 대표 상품 전체 vs 구간 내 상품을 한 번의 행렬곱으로 계산하고,
+                # 대표 상품별 상위 10개 부분 선택 후 중복 후보는 최대 점수로 병합
+                if candidates is None:
+                    if queries is None:
+                        queries = prepare_queries(master_data, representative_indices, weights)
+                    if use_ivf:
+                        candidates = ivf_candidates(
+                            master_data, queries, code, start, end, TOP_K_PER_REPRESENTATIVE, IVF_PROBES)
+                        CANDIDATE_SOURCE.inc(source='ivf')
+                    else:
+                        candidates = category_candidates(
+                            master_data, queries, start, end, TOP_K_PER_REPRESENTATIVE, 0 if exact else RERANK_CANDIDATES)
+                        CANDIDATE_SOURCE.inc(source='scan')
             
-            print(f"   🎯 {rep_name[:30]}... -> 후보 {len(top_3_indices)}개 추가")
+            candidates_by_category[eng_key] = candidates
+            pool_cache.put(cache_key, candidates)
         
-        print(f"📊 총 후보 상품: {len(all_candidate_indices)}개")
+        if cache_hits:
+            log.debug(f"🗃️ 후보 풀 캐시 hit {cache_hits}/{len(candidates_by_category)}개 카테고리")
         
-        # 4. 후보 상품을 카테고리별로 분류
-        CATEGORY_MAP = {"outer": "아우터", "top": "상의", "bottom": "바지", "shoes": "신발", "acc": "액세서리"}
-        candidates_by_category = {eng_key: [] for eng_key in CATEGORY_MAP.keys()}
+        # 새 세션이거나 가격 구간이 바뀐 카테고리는 후보 풀을 무작위 순서로 섞어 커서를 만든다
+        if session is None:
+            session_id, session = shuffle_sessions.create(base_key, seed if seed is not None else int(np.random.randint(2**31)))
+        for code, eng_key in enumerate(CATEGORY_MAP.keys()):
+            if eng_key in candidates_by_category:
+                shuffle_sessions.reset(session, eng_key, code, windows[eng_key], candidates_by_category[eng_key])
+        log.debug(f"📊 새 후보 풀 {len(candidates_by_category)}개 카테고리 (세션 {session_id})")
         
-        for candidate_id, score in all_candidate_indices.items():
-            if candidate_id in id_to_idx:
-                candidate_idx = id_to_idx[candidate_id]
-                category_kor = str(master_data['cats'][candidate_idx])
-                
-                # 영어 카테고리 키로 변환
-                for eng_key, kor_val in CATEGORY_MAP.items():
-                    if category_kor == kor_val:
-                        candidates_by_category[eng_key].append({
-                            'id': candidate_id,
-                            'idx': candidate_idx,
-                            'score': score
-                        })
-                        break
-        
-        # 5. 카테고리별로 5개씩 랜덤 선택
+        # 4. 카테고리별로 아직 보여주지 않은 후보 5개씩 선택
         # Keep compatibility with frontend which expects current_outfit_id
         final_response = {
             "persona": persona,
+            "catalog_version": master_data.version,
+            "session_id": session_id,
+            "seed": session.seed,
             "current_outfit_id": None,
             "items": {}
         }
         
-        for eng_key, kor_val in CATEGORY_MAP.items():
-            if target_category_filter and target_category_filter != eng_key:
-                final_response["items"][eng_key] = []
-                continue
+        debug_enabled = log.isEnabledFor(logging.DEBUG)
+        with STAGE_SECONDS.time(stage='selection'):
+            for eng_key, kor_val in CATEGORY_MAP.items():
+                if target_category_filter and target_category_filter != eng_key:
+                    final_response["items"][eng_key] = []
+                    continue
             
-            category_candidates = candidates_by_category[eng_key]
+                cursor = session.categories[eng_key]
+                cat_indices, cat_scores = cursor.indices, cursor.scores
             
-            if not category_candidates:
-                print(f"   ⚠️ {kor_val} 카테고리에 후보가 없습니다.")
-                final_response["items"][eng_key] = []
-                continue
+                if len(cat_indices) == 0:
+                    log.debug(f"   ⚠️ {kor_val} 카테고리에 후보가 없습니다.")
+                    final_response["items"][eng_key] = []
+                    continue
             
-            # 랜덤으로 5개 선택 (후보가 5개 미만이면 모두 선택)
-            num_select = min(5, len(category_candidates))
-            selected_candidates = np.random.choice(len(category_candidates), num_select, replace=False)
+                # 커서 다음 5개 (후보가 5개 미만이면 모두 선택, 풀을 다 보면 새 순서로 다시)
+                selected_candidates = shuffle_sessions.take(session, eng_key, SHUFFLE_PAGE_SIZE)
             
-            items_list = []
-            for sel_idx in selected_candidates:
-                candidate = category_candidates[sel_idx]
-                original_idx = candidate['idx']
-                p_id = candidate['id']
-                p_name = str(master_data['names'][original_idx])
-                score = candidate['score']
-                
-                print(f"      ✨ [{kor_val}] {p_name[:30]}... | 점수: {score:.4f}")
+                items_list = []
+                for sel_idx in selected_candidates:
+                    original_idx = int(cat_indices[sel_idx])
+                    p_id = int(master_data['ids'][original_idx])
+                    p_name = str(master_data['names'][original_idx])
                 
-                processed_filename = f"nobg_{p_id}.png"
-                processed_file_path = os.path.join(PROCESSED_DIR, processed_filename)
+                    # 후보마다 찍는 로그는 DEBUG 일 때만 문자열을 만든다
+                    if debug_enabled:
+                        log.debug(f"      ✨ [{kor_val}] {p_name[:30]}... | 점수: {cat_scores[sel_idx]:.4f}")
                 
-                if os.path.exists(processed_file_path):
-                    final_img_url = f"{request.host_url}static/processed_imgs/{processed_filename}"
-                else:
-                    success = process_and_save_image(master_data['imgs'][original_idx], processed_file_path)
-                    final_img_url = f"{request.host_url}static/processed_imgs/{processed_filename}" if success else master_data['imgs'][original_idx]
-                
-                items_list.append({
-                    "product_id": p_id,
-                    "product_name": p_name,
-                    "price": int(master_data['prices'][original_idx]),
-                    "img_url": final_img_url,
-                    "category": kor_val,
-                })
+                    items_list.append({
+                        "product_id": p_id,
+                        "product_name": p_name,
+                        "price": int(master_data['prices'][original_idx]),
+                        "img_url": str(master_data['imgs'][original_idx]),
+                        "category": kor_val,
+                    })
             
-            final_response["items"][eng_key] = items_list
+                final_response["items"][eng_key] = items_list
+        
+        record_lookups()
+        if response_key is not None:
+            # session_id 는 이 요청의 세션이므로 빼고, 다음 재요청이 새 세션을 만들 수 있게 후보 풀을 함께 저장
+            cached_body = {key: value for key, value in final_response.items() if key != "session_id"}
+            response_cache.put(response_key, (cached_body, candidates_by_category))
         
-        print(f"✅ 추천 결과 생성 완료 (페르소나: {persona})")
-        return jsonify(final_response)
+        log.debug(f"✅ 추천 결과 생성 완료 (페르소나: {persona})")
+        return with_images(final_response, host_url), 200
         
     except Exception as e:
-        print(f"❌ 추천 에러 발생: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
+        record_lookups()
+        log.exception(f"❌ 추천 에러 발생: {e}")
+        return {"error": str(e)}, 500
+
+def recommend_response(args, host_url, if_none_match=None, allow_compute=True):
+    """
+    /api/products 응답 바이트 + 캐시 헤더 (Flask / ASGI 공용)
+    seed 를 지정하고 세션 없이 온 요청만 ETag 를 붙이고, If-None-Match 가 같으면 본문 없이 304
+
+    Returns:
+        (payload, status_code, headers) 또는 None (recommend 와 같은 allow_compute 규칙)
+    """
+    result = recommend(args, host_url, allow_compute)
+    if result is None:
+        return None
+    body, status = result
+    if status != 200 or not is_replayable(args):
+        with STAGE_SECONDS.time(stage='serialize'):
+            payload = json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return payload, status, {'Cache-Control': 'no-store'}
+    
+    # 이미지 상태가 바뀌면 본문도 바뀌므로 매번 재검증 (바뀌지 않았으면 304)
+    # session_id 는 요청마다 다르므로 ETag 는 session_id 를 뺀 본문으로 만들고, 응답에는 맨 앞에 붙인다
+    session_id = body.pop("session_id", None)
+    with STAGE_SECONDS.time(stage='serialize'):
+        payload = json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = etag_for(payload)
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if etag_matches(if_none_match, etag):
+        return b'', 304, headers
+    payload = b'{"session_id":' + json.dumps(session_id).encode('utf-8') + b',' + payload[1:]
+    return payload, status, headers
+
+@app.route('/api/products', methods=['GET'])
+def get_recommendations():
+    payload, status, headers = recommend_response(request.args, request.host_url, request.headers.get('If-None-Match'))
+    return Response(payload, status=status, headers=headers, mimetype='application/json')
 
 @app.route('/static/processed_imgs/<path:filename>')
 def serve_processed_image(filename):
-    return send_from_directory(PROCESSED_DIR, filename)
+    # 저장소 이미지 파일(<shard>/nobg_<id>...)만 서빙
+    product_id = product_of(filename)
+    if product_id is None:
+        abort(404)
+    # 축소본 파일명에는 내용 해시가 있어 바뀔 일이 없으므로 재검증 없이 영구 캐시
+    immutable = is_immutable(filename)
+    try:
+        response = send_from_directory(PROCESSED_DIR, filename,
+                                       max_age=IMMUTABLE_MAX_AGE if immutable else PROCESSED_PNG_MAX_AGE)
+    except NotFound:
+        # 다른 워커가 예산 초과로 지운 상품이면 색인에서 빼 다음 요청에서 다시 작업하게 한다
+        image_store.verify(product_id)
+        raise
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.immutable = True
+    return response
 
 if __name__ == '__main__':
     app.run(port=5000)
\ No newline at end of file
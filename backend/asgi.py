@@ -0,0 +1,158 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+# Flask 앱 모듈을 그대로 import -> 카탈로그 / 대표 상품 미러 / 후보 풀 캐시 / 이미지 작업 큐를 공유 (init_data 1회)
+import app as server
+from image_jobs import STATUS_PENDING
+from image_variants import is_immutable
+from image_store import product_of
+from metrics import STAGE_SECONDS
+
+# ---------------------------------------------------------
+# [ASGI 서버] 추천 / 이미지 API 를 이벤트 루프에서 처리
+#   - 후보 풀 캐시만으로 답할 수 있는 요청(셔플 등)은 루프에서 바로 응답
+#   - 점수 계산이 필요한 요청 / 이미지 상태 조회(파일 확인)는 scoring executor 로 넘김 -> 느린 요청 뒤에 빠른 요청이 줄 서지 않음
+#   - 누끼 완료 대기(/api/images/wait)는 스레드를 잡지 않고 asyncio.sleep 으로 기다림
+#   - 나머지 경로(아웃핏 저장, 관리자, /metrics 등)는 기존 Flask 앱으로 전달
+# 실행: uvicorn asgi:app --port 5000 (워커 1개로 많은 동시 요청 처리)
+# ---------------------------------------------------------
+# [설정]
+SCORING_WORKERS = int(os.getenv('SCORING_WORKERS', str(max(2, (os.cpu_count() or 2) // 2))))
+IMAGE_WAIT_TIMEOUT = float(os.getenv('IMAGE_WAIT_TIMEOUT', '10'))  # /api/images/wait 최대 대기(초)
+IMAGE_WAIT_POLL = 0.1
+WSGI_WORKERS = int(os.getenv('WSGI_WORKERS', '8'))               # Flask 로 넘기는 요청용 스레드 수
+
+scoring_executor = ThreadPoolExecutor(max_workers=SCORING_WORKERS, thread_name_prefix='scoring')
+
+def common_headers(extra=None):
+    # Flask 쪽 after_request / flask_cors 와 같은 헤더
+    headers = {'Access-Control-Allow-Origin': '*', **(extra or {})}
+    snapshot = server.catalog.current()
+    if snapshot is not None:
+        headers['X-Catalog-Version'] = snapshot.version
+    return headers
+
+def json_response(request, endpoint, started, body, status):
+    with STAGE_SECONDS.time(stage='serialize'):
+        response = JSONResponse(body, status_code=status, headers=common_headers())
+    server.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, status=status)
+    return response
+
+def host_url(request):
+    return str(request.base_url)  # "http://host:port/" (Flask request.host_url 과 같은 형식)
+
+# ---------------------------------------------------------
+# [API] 추천 상품
+# ---------------------------------------------------------
+async def products(request):
+    started = time.perf_counter()
+    args = request.query_params
+    if_none_match = request.headers.get('if-none-match')
+    # 응답 캐시 / 셔플 세션 / 후보 풀 캐시로 답할 수 있으면 루프에서 바로 (행렬 계산 없음, 1ms 미만)
+    result = server.recommend_response(args, host_url(request), if_none_match, allow_compute=False)
+    if result is None:
+        # numpy 행렬곱은 GIL 을 놓으므로 executor 스레드끼리도 병렬로 돈다
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(scoring_executor, server.recommend_response,
+                                            args, host_url(request), if_none_match)
+    payload, status, headers = result
+    response = Response(payload, status_code=status, headers=common_headers(headers), media_type='application/json')
+    server.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint='get_recommendations', status=status)
+    return response
+
+# ---------------------------------------------------------
+# [API] 누끼 이미지 상태 / 완료 대기
+# ---------------------------------------------------------
+async def image_statuses(request):
+    # 처음 보는 상품의 파일 확인 / 작업 등록이 있으므로 recommend 처럼 executor 에서 (루프를 막지 않게)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(scoring_executor, server.image_statuses, request.query_params, host_url(request))
+
+async def image_status(request):
+    started = time.perf_counter()
+    body, status = await image_statuses(request)
+    return json_response(request, 'get_image_status', started, body, status)
+
+async def wait_images(request):
+    """
+    /api/images/wait?ids=1,2,3&timeout=5
+    pending 인 이미지가 모두 ready/failed 가 되거나 timeout 이 지나면 /api/images/status 와 같은 형식으로 응답.
+    대기 중에는 스레드를 쓰지 않으므로 동시에 많은 요청이 기다려도 다른 요청을 막지 않는다.
+    """
+    started = time.perf_counter()
+    body, status = await image_statuses(request)  # 현재 상태 (추천 응답에 나간 상품만 작업 등록)
+    if status != 200:
+        return json_response(request, 'wait_images', started, body, status)
+
+    timeout = min(server.query_arg(request.query_params, 'timeout', float, IMAGE_WAIT_TIMEOUT), IMAGE_WAIT_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max(0.0, timeout)
+    pending = [int(p_id) for p_id, image in body["images"].items() if image["status"] == STATUS_PENDING]
+    if pending:
+        while pending and loop.time() < deadline:
+            await asyncio.sleep(IMAGE_WAIT_POLL)
+            pending = [p_id for p_id in pending if server.image_jobs.status(p_id) == STATUS_PENDING]
+        body, status = await image_statuses(request)
+    return json_response(request, 'wait_images', started, body, status)
+
+# ---------------------------------------------------------
+# [정적 파일] 누끼 이미지 (Flask serve_processed_image 와 같은 캐시 헤더)
+# ---------------------------------------------------------
+class ProcessedImages(StaticFiles):
+    async def get_response(self, path, scope):
+        # 저장소 이미지 파일(<shard>/nobg_<id>...)만 서빙하고, 없으면 색인도 맞춘다 (app.serve_processed_image 와 같음)
+        product_id = product_of(path)
+        if product_id is None:
+            raise HTTPException(status_code=404)
+        try:
+            return await super().get_response(path, scope)
+        except HTTPException as e:
+            if e.status_code == 404:
+                await run_in_threadpool(server.image_store.verify, product_id)
+            raise
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if is_immutable(full_path):
+            response.headers['Cache-Control'] = f"public, max-age={server.IMMUTABLE_MAX_AGE}, immutable"
+        else:
+            response.headers['Cache-Control'] = f"public, max-age={server.PROCESSED_PNG_MAX_AGE}"
+        return response
+
+# ---------------------------------------------------------
+# [앱]
+# ---------------------------------------------------------
+@asynccontextmanager
+async def lifespan(_):
+    yield
+    # 종료 시 대기 중인 아웃핏 기록 / 백그라운드 풀 정리
+    server.outfit_writer.flush()
+    server.image_jobs.shutdown()
+    server.image_store.sync()
+    scoring_executor.shutdown(wait=False, cancel_futures=True)
+
+app = Starlette(
+    routes=[
+        Route('/api/products', products, methods=['GET']),
+        Route('/api/images/status', image_status, methods=['GET']),
+        Route('/api/images/wait', wait_images, methods=['GET']),
+        Mount('/static/processed_imgs', app=ProcessedImages(directory=server.PROCESSED_DIR), name='processed_imgs'),
+        Mount('/', app=WSGIMiddleware(server.app, workers=WSGI_WORKERS)),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, port=5000)
@@ -0,0 +1,2 @@
+# 벤치마크 패키지: 합성 카탈로그 + SQLite 대체 DB + 이미지 스텁으로 주요 경로의 소요 시간을 측정한다.
+# 실행: cd backend && python -m bench --help
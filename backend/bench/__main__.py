@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)  # 작업 디렉토리를 옮겨도 backend 모듈을 찾도록
+
+import numpy as np
+
+SCENARIOS = ['load', 'recommend', 'preprocess', 'outfits']
+# 비교 시 낮을수록 좋은 값 / 높을수록 좋은 값
+LOWER_IS_BETTER = ('mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'seconds')
+HIGHER_IS_BETTER = ('rows_per_sec',)
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def prepare_environment(work_dir):
+    """app.py import 전에 호출: SQLite 대체 DB, 파일 감시 끔, 로그 최소화"""
+    db_path = os.path.join(work_dir, 'bench.db')
+    os.environ['DB_URL'] = f"sqlite:///{db_path}"
+    os.environ['CATALOG_WATCH_INTERVAL'] = '0'
+    os.environ['REP_REFRESH_INTERVAL'] = '0'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    # app.py 는 ../data/master_data 와 ./static/processed_imgs 를 상대 경로로 쓴다
+    server_dir = os.path.join(work_dir, 'server')
+    os.makedirs(server_dir, exist_ok=True)
+    os.chdir(server_dir)
+
+    from bench.standin import create_standin_engine
+    return create_standin_engine(db_path)
+
+def run(args):
+    work_dir = os.path.abspath(args.work_dir)
+    out_path = os.path.abspath(args.out) if args.out else None  # 작업 디렉토리를 옮기기 전에 절대 경로로
+    os.makedirs(work_dir, exist_ok=True)
+    engine = prepare_environment(work_dir)
+
+    from bench import scenarios
+    from bench.synthetic import DIMS
+
+    sizes = [int(x) for x in args.sizes.split(',')]
+    selected = SCENARIOS if args.scenarios == 'all' else args.scenarios.split(',')
+    np.random.seed(args.seed)  # seed 없는 요청에 서버가 정하는 셔플 seed(np.random.randint)도 재현 가능하게
+
+    catalog_dirs, build_seconds = scenarios.prepare_catalogs(
+        sizes, work_dir, seed=args.seed, quantize=args.quantize, ivf=args.ivf, rebuild=args.rebuild)
+    # app.py 기본 경로(../data/master_data)가 첫 카탈로그를 가리키도록 (시나리오에서 크기별로 교체)
+    link = os.path.join(work_dir, 'data', 'master_data')
+    os.makedirs(os.path.dirname(link), exist_ok=True)
+    if os.path.lexists(link):
+        os.remove(link)
+    try:
+        os.symlink(catalog_dirs[sizes[0]], link, target_is_directory=True)
+    except OSError:
+        pass
+
+    report = {
+        "revision": git_revision(),
+        "created_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "machine": {"python": platform.python_version(), "numpy": np.__version__,
+                    "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {"sizes": sizes, "dims": DIMS, "requests": args.requests, "seed": args.seed,
+                   "quantize": args.quantize, "ivf": args.ivf, "fetch_latency": args.fetch_latency,
+                   "preprocess_rows": args.preprocess_rows, "outfit_rows": args.outfit_rows},
+        "build": build_seconds,
+        "results": {},
+    }
+
+    if 'load' in selected:
+        print("⏱️ [load] 카탈로그 로드")
+        report["results"]["load"] = scenarios.bench_load(catalog_dirs)
+    if 'recommend' in selected:
+        print("⏱️ [recommend] /api/products")
+        report["results"]["recommend"] = scenarios.bench_recommend(
+            catalog_dirs, engine, n_requests=args.requests, seed=args.seed, fetch_latency=args.fetch_latency)
+    if 'preprocess' in selected:
+        print("⏱️ [preprocess] create_master_data")
+        report["results"]["preprocess"] = scenarios.bench_preprocess(args.preprocess_rows, engine, work_dir, seed=args.seed)
+    if 'outfits' in selected:
+        print("⏱️ [outfits] 아웃핏 저장")
+        report["results"]["outfits"] = scenarios.bench_outfits(catalog_dirs[sizes[0]], engine, n_rows=args.outfit_rows,
+                                                               seed=args.seed)
+
+    out_path = out_path or os.path.join(work_dir, f"results-{report['revision'] or 'local'}.json")
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report["results"], ensure_ascii=False, indent=2))
+    print(f"✅ 결과 저장: {out_path}")
+
+# ---------------------------------------------------------
+# [비교] 두 결과 파일의 같은 항목끼리 변화율
+# ---------------------------------------------------------
+def _flatten(node, prefix=''):
+    if isinstance(node, dict):
+        for key, val in node.items():
+            yield from _flatten(val, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        yield prefix, node
+
+def compare(base_path, new_path):
+    with open(base_path, encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"📊 {base.get('revision')} -> {new.get('revision')}")
+    if base.get('config') != new.get('config'):
+        print("⚠️ 설정이 다릅니다. 같은 --sizes / --requests / --seed 로 측정한 결과끼리 비교하세요.")
+
+    new_values = dict(_flatten(new.get('results', {})))
+    for key, old in _flatten(base.get('results', {})):
+        metric = key.rsplit('.', 1)[-1]
+        if metric not in LOWER_IS_BETTER + HIGHER_IS_BETTER or key not in new_values or old == 0:
+            continue
+        change = (new_values[key] - old) / old * 100
+        better = change < 0 if metric in LOWER_IS_BETTER else change > 0
+        mark = '🟢' if better and abs(change) >= 5 else '🔴' if not better and abs(change) >= 5 else '⚪'
+        print(f"   {mark} {key}: {old} -> {new_values[key]} ({change:+.1f}%)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="합성 카탈로그 + SQLite 대체 DB + 이미지 스텁으로 주요 경로를 측정합니다.")
+    parser.add_argument('--work-dir', default='bench_work', help="합성 데이터 / 결과 저장 위치 (카탈로그는 재사용)")
+    parser.add_argument('--sizes', default='10000,50000', help="카탈로그 크기 목록 (쉼표 구분)")
+    parser.add_argument('--scenarios', default='all', help=f"실행할 시나리오: all 또는 {','.join(SCENARIOS)} 중 일부")
+    parser.add_argument('--requests', type=int, default=100, help="크기별 /api/products 호출 수")
+    parser.add_argument('--preprocess-rows', type=int, default=20000, help="전처리 시나리오 상품 수")
+    parser.add_argument('--outfit-rows', type=int, default=5000, help="아웃핏 저장 시나리오 행 수")
+    parser.add_argument('--fetch-latency', type=float, default=0.0, help="이미지 스텁의 다운로드 지연(초)")
+    parser.add_argument('--quantize', choices=['int8', 'float16'], help="카탈로그에 압축 통합 행렬 포함")
+    parser.add_argument('--ivf', action='store_true', help="카탈로그에 IVF 인덱스 포함")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rebuild', action='store_true', help="합성 카탈로그를 다시 생성")
+    parser.add_argument('--out', help="결과 JSON 경로 (기본: <work-dir>/results-<git 리비전>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="두 결과 JSON 비교만 수행")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
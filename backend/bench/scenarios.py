@@ -0,0 +1,220 @@
+import os
+import time
+import importlib
+
+import numpy as np
+
+from catalog import CATEGORY_MAP, load_master_data
+from metrics import STAGE_SECONDS
+from outfit_writer import OutfitWriter, INSERT_STMT
+from .synthetic import generate_catalog, write_catalog_dir, write_preprocess_sources
+from .standin import PERSONAS, seed_representatives, reset_outfits
+from .stubs import install_image_stubs, clear_processed
+
+# ---------------------------------------------------------
+# [공통] 통계
+# ---------------------------------------------------------
+def summarize(samples):
+    """초 단위 측정값 -> ms 요약"""
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    if len(ms) == 0:
+        return {"count": 0}
+    return {
+        "count": int(len(ms)),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+def stage_breakdown(before, after):
+    """STAGE_SECONDS.totals() 전후 차이 -> 단계별 평균(ms)"""
+    out = {}
+    for key, (count, total) in after.items():
+        prev_count, prev_total = before.get(key, (0, 0.0))
+        if count > prev_count:
+            out[key[0]] = {"count": count - prev_count,
+                           "mean_ms": round((total - prev_total) / (count - prev_count) * 1000, 3)}
+    return out
+
+# ---------------------------------------------------------
+# [시나리오 1] 카탈로그 로드 시간 (mmap 디렉토리)
+# ---------------------------------------------------------
+def bench_load(catalog_dirs, repeats=3):
+    results = {}
+    for n, path in catalog_dirs.items():
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            data = load_master_data(path)
+            samples.append(time.perf_counter() - start)
+            del data
+        results[str(n)] = summarize(samples)
+    return results
+
+# ---------------------------------------------------------
+# [시나리오 2] /api/products 지연 (카탈로그 크기별, 캐시 미스 / 히트)
+# ---------------------------------------------------------
+def _request_plan(rng, n_requests, price_range):
+    """(persona, query string) 목록. 절반은 셔플(카테고리 1개), 일부는 가격 필터"""
+    categories = list(CATEGORY_MAP.keys())
+    plan = []
+    for _ in range(n_requests):
+        persona = PERSONAS[rng.integers(len(PERSONAS))]
+        params = {"persona": persona}
+        if rng.random() < 0.5:
+            category = categories[rng.integers(len(categories))]
+            params["category"] = category
+            if rng.random() < 0.3:
+                low = int(rng.integers(price_range[0], price_range[1]))
+                params[f"min_{category}"] = low
+                params[f"max_{category}"] = low + 100000
+        plan.append(params)
+    return plan
+
+def bench_recommend(catalog_dirs, engine, n_requests=100, seed=0, fetch_latency=0.0):
+    """
+    app.py 를 import 해 Flask test client 로 호출한다. (DB_URL / 감시 주기 환경변수는 호출 측에서 설정)
+    - cold: 매 요청 전에 후보 풀 캐시를 비움 (점수 계산 경로)
+    - warm: 같은 요청을 다시 (캐시에서 다시 뽑기만)
+    - shuffle: 페르소나별 첫 응답의 session_id 로 같은 요청 (세션 커서에서 다음 페이지만)
+    - replay: seed 를 붙인 같은 요청을 다시 (응답 캐시에서 이미지 상태만 다시 채움)
+    """
+    app_module = importlib.import_module('app')
+    install_image_stubs(app_module.image_jobs, fetch_latency=fetch_latency)
+    client = app_module.app.test_client()
+
+    results = {}
+    for n, path in catalog_dirs.items():
+        app_module.catalog.candidate_paths = [path]
+        app_module.catalog.reload(force=True)
+        snapshot = app_module.catalog.current()
+        seed_representatives(engine, np.asarray(snapshot['ids']), seed=seed)
+        app_module.representatives.refresh(force=True)
+        app_module.pool_cache.invalidate()
+        clear_processed(app_module.image_store)
+
+        rng = np.random.default_rng(seed)
+        plan = _request_plan(rng, n_requests, (10000, 400000))
+        client.get('/api/products', query_string=plan[0])  # import / 첫 호출 비용 제외
+
+        scenario = {}
+        for mode in ('cold', 'warm', 'shuffle', 'replay'):
+            if mode == 'warm':
+                for params in plan:  # 모든 키를 캐시에 채운 뒤 측정
+                    client.get('/api/products', query_string=params)
+            if mode == 'shuffle':
+                sessions = {persona: client.get('/api/products', query_string={"persona": persona}).get_json()["session_id"]
+                            for persona in {params["persona"] for params in plan}}
+                plan = [{**params, "session": sessions[params["persona"]]} for params in plan]
+                for params in plan:  # 가격 필터가 있는 카테고리 커서도 미리 만든 뒤 측정
+                    client.get('/api/products', query_string=params)
+            if mode == 'replay':
+                plan = [{**{key: val for key, val in params.items() if key != "session"}, "seed": i % 10}
+                        for i, params in enumerate(plan)]
+                for params in plan:  # 응답 캐시를 채운 뒤 측정
+                    client.get('/api/products', query_string=params)
+            before = STAGE_SECONDS.totals()
+            samples, errors = [], 0
+            for params in plan:
+                if mode == 'cold':
+                    app_module.pool_cache.invalidate()
+                start = time.perf_counter()
+                response = client.get('/api/products', query_string=params)
+                samples.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+            scenario[mode] = {**summarize(samples), "errors": errors,
+                              "stages": stage_breakdown(before, STAGE_SECONDS.totals())}
+        scenario["catalog_flags"] = sorted(k for k in ('fused_q', 'ivf', 'knn') if k in snapshot)
+        results[str(n)] = scenario
+    return results
+
+# ---------------------------------------------------------
+# [시나리오 3] 전처리 처리량 (SQLite product/category + 임베딩 npz -> master_data)
+# ---------------------------------------------------------
+def bench_preprocess(n, engine, work_dir, seed=0, chunk_size=20000):
+    import preprocess
+
+    pre_dir = os.path.join(work_dir, 'preprocess')
+    os.makedirs(pre_dir, exist_ok=True)
+    write_preprocess_sources(generate_catalog(n, seed=seed), pre_dir, engine)
+
+    cwd = os.getcwd()
+    os.chdir(pre_dir)  # preprocess 는 data/ 상대 경로 사용
+    try:
+        results = {}
+        for label, incremental in (('full', False), ('incremental_unchanged', True)):
+            start = time.perf_counter()
+            preprocess.create_master_data(incremental=incremental, chunk_size=chunk_size)
+            elapsed = time.perf_counter() - start
+            results[label] = {"seconds": round(elapsed, 3), "rows_per_sec": round(n / elapsed, 1)}
+    finally:
+        os.chdir(cwd)
+    results["rows"] = n
+    return results
+
+# ---------------------------------------------------------
+# [시나리오 4] 아웃핏 저장: 행마다 트랜잭션 1번 vs 버퍼 + executemany
+# ---------------------------------------------------------
+def _outfit_rows(catalog_dir, n_rows, duplicate_ratio, seed):
+    data = load_master_data(catalog_dir)
+    rng = np.random.default_rng(seed)
+    offsets = data['index']['cat_offsets']
+    codes = {key: code for code, key in enumerate(CATEGORY_MAP.keys())}
+
+    def pick(category):
+        start, end = int(offsets[codes[category]]), int(offsets[codes[category] + 1])
+        return int(data['ids'][rng.integers(start, end)]) if end > start else 0
+
+    unique = [{"persona": PERSONAS[rng.integers(len(PERSONAS))], "outer_id": 0, "acc_id": 0,
+               "top_id": pick('top'), "bottom_id": pick('bottom'), "shoes_id": pick('shoes')}
+              for _ in range(int(n_rows * (1 - duplicate_ratio)))]
+    # 인기 조합이 반복 구매되는 상황
+    repeats = [unique[i] for i in rng.integers(0, len(unique), n_rows - len(unique))]
+    rows = unique + repeats
+    rng.shuffle(rows)
+    return rows
+
+def bench_outfits(catalog_dir, engine, n_rows=5000, duplicate_ratio=0.3, seed=0):
+    rows = _outfit_rows(catalog_dir, n_rows, duplicate_ratio, seed)
+    results = {"rows": n_rows, "duplicate_ratio": duplicate_ratio}
+
+    # 기존 방식: 요청마다 engine.begin() + 중복은 IntegrityError 대신 IGNORE 로 흡수
+    reset_outfits(engine)
+    start = time.perf_counter()
+    for row in rows:
+        with engine.begin() as conn:
+            conn.execute(INSERT_STMT, row)
+    elapsed = time.perf_counter() - start
+    results["per_row"] = {"seconds": round(elapsed, 3), "rows_per_sec": round(n_rows / elapsed, 1)}
+
+    reset_outfits(engine)
+    writer = OutfitWriter(engine)
+    start = time.perf_counter()
+    statuses = [writer.submit(row) for row in rows]
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    results["write_behind"] = {"seconds": round(elapsed, 3), "rows_per_sec": round(n_rows / elapsed, 1),
+                               "accepted": statuses.count('accepted'), "duplicates": statuses.count('duplicate')}
+    return results
+
+# ---------------------------------------------------------
+# [준비] 크기별 합성 카탈로그 디렉토리
+# ---------------------------------------------------------
+def prepare_catalogs(sizes, work_dir, seed=0, quantize=None, ivf=False, rebuild=False):
+    """work_dir/catalogs/n<N>/ 에 저장. 같은 설정으로 이미 있으면 다시 만들지 않는다."""
+    dirs, build_seconds = {}, {}
+    for n in sizes:
+        tag = f"n{n}" + (f"_{quantize}" if quantize else "") + ("_ivf" if ivf else "")
+        path = os.path.join(work_dir, 'catalogs', tag)
+        if rebuild or not os.path.exists(os.path.join(path, 'meta.json')):
+            print(f"🧪 합성 카탈로그 생성: {n}개 -> {path}")
+            start = time.perf_counter()
+            catalog = generate_catalog(n, seed=seed)
+            generate_seconds = time.perf_counter() - start
+            save_seconds = write_catalog_dir(catalog, path, quantize=quantize, ivf=ivf)
+            build_seconds[str(n)] = {"generate_seconds": round(generate_seconds, 3),
+                                     "save_seconds": round(save_seconds, 3)}
+        dirs[n] = path
+    return dirs, build_seconds
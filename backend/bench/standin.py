@@ -0,0 +1,71 @@
+import re
+import zlib
+
+import numpy as np
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+
+# ---------------------------------------------------------
+# [SQLite 대체 DB] 서버 코드의 MySQL 쿼리를 그대로 실행할 수 있게 맞춘다
+#   - CRC32 / CONCAT 함수 등록 (db.RepresentativeMirror 변경 확인 쿼리)
+#   - INSERT ... ON DUPLICATE KEY UPDATE -> INSERT ... ON CONFLICT DO NOTHING (outfit_writer)
+#   app.py 는 DB_URL=sqlite:///... 로 같은 파일을 열므로 엔진 클래스 전체에 리스너를 건다
+# ---------------------------------------------------------
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS representative_item (persona TEXT NOT NULL, product_id INTEGER NOT NULL)",
+    """CREATE TABLE IF NOT EXISTS outfit (
+        outfit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        persona TEXT NOT NULL,
+        outer_id INTEGER NOT NULL, acc_id INTEGER NOT NULL,
+        top_id INTEGER NOT NULL, bottom_id INTEGER NOT NULL, shoes_id INTEGER NOT NULL,
+        UNIQUE (outer_id, top_id, bottom_id, shoes_id, acc_id))""",
+]
+PERSONAS = ['아메카지', '미니멀', '스트릿', '캐주얼', '포멀', '스포티', '빈티지', '워크웨어']
+
+ON_DUPLICATE_KEY = re.compile(r'ON DUPLICATE KEY UPDATE\s+(\w+)\s*=\s*\1\b')
+
+_installed = False
+
+def _register_functions(dbapi_conn, record):
+    if not type(dbapi_conn).__module__.startswith('sqlite3'):
+        return
+    dbapi_conn.create_function('CRC32', 1, lambda s: zlib.crc32(str(s).encode('utf-8')))
+    dbapi_conn.create_function('CONCAT', -1, lambda *parts: ''.join('' if p is None else str(p) for p in parts))
+
+def _rewrite_mysql(conn, cursor, statement, parameters, context, executemany):
+    if conn.dialect.name == 'sqlite' and 'ON DUPLICATE KEY' in statement:
+        # 유니크 키 충돌만 무시 (NOT NULL 등 다른 제약 위반은 MySQL 처럼 오류로 남는다)
+        statement = ON_DUPLICATE_KEY.sub('ON CONFLICT DO NOTHING', statement)
+    return statement, parameters
+
+def install_sqlite_compat():
+    """이후 만들어지는 모든 SQLite 엔진에 MySQL 호환 함수 / 구문 변환을 적용"""
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, 'connect', _register_functions)
+    event.listen(Engine, 'before_cursor_execute', _rewrite_mysql, retval=True)
+    _installed = True
+
+def create_standin_engine(path):
+    install_sqlite_compat()
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for stmt in SCHEMA:
+            conn.execute(text(stmt))
+    return engine
+
+def seed_representatives(engine, product_ids, per_persona=20, personas=PERSONAS, seed=0):
+    """페르소나마다 대표 상품 per_persona 개를 무작위로 채운다 (기존 행은 교체)"""
+    rng = np.random.default_rng(seed)
+    rows = [{"persona": persona, "product_id": int(pid)}
+            for persona in personas
+            for pid in rng.choice(product_ids, size=min(per_persona, len(product_ids)), replace=False)]
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM representative_item"))
+        conn.execute(text("INSERT INTO representative_item (persona, product_id) VALUES (:persona, :product_id)"), rows)
+    return rows
+
+def reset_outfits(engine):
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM outfit"))
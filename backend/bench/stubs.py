@@ -0,0 +1,56 @@
+import os
+import time
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import image_fetch
+import image_jobs
+from image_variants import write_variants
+
+# ---------------------------------------------------------
+# [이미지 스텁] 네트워크 / rembg 없이 이미지 작업 흐름(작업 테이블, 프리페치, 완료 콜백)만 실행
+#   fetch_latency: 원본 1장 다운로드에 걸리는 것으로 칠 시간(초)
+#   rembg_latency: 누끼 1장 추론에 걸리는 것으로 칠 시간(초)
+# ---------------------------------------------------------
+def _tiny_image():
+    return Image.new('RGBA', (8, 8), (200, 200, 200, 255))
+
+def _tiny_png():
+    buf = BytesIO()
+    _tiny_image().save(buf, format='PNG')
+    return buf.getvalue()
+
+def install_image_stubs(queue, fetch_latency=0.0, rembg_latency=0.0, workers=2):
+    content = _tiny_png()
+
+    def fetch_image(url, timeout=10, **kwargs):
+        time.sleep(fetch_latency)
+        return content
+
+    def fetch_many(urls, **kwargs):
+        # 실제 fetch_many 처럼 동시에 받는 것으로 보고 지연은 한 번만
+        time.sleep(fetch_latency if urls else 0.0)
+        return {url: content for url in urls}
+
+    def timed_job(image_url, save_path, lock_dir=None):
+        start = time.perf_counter()
+        time.sleep(rembg_latency)
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        write_variants(_tiny_image(), save_path)  # 실제 작업처럼 축소본 + 목록 파일을 먼저
+        with open(save_path, 'wb') as f:
+            f.write(content)
+        return True, {'rembg': time.perf_counter() - start}
+
+    image_fetch.fetch_image = fetch_image
+    image_fetch.fetch_many = fetch_many
+    image_jobs.fetch_image = fetch_image
+    image_jobs.fetch_many = fetch_many
+    image_jobs._timed_job = timed_job
+    # rembg 프로세스 풀 대신 스레드 풀 (submit 시 image_jobs._timed_job 을 다시 찾으므로 스텁이 쓰인다)
+    queue._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bench-rembg')
+
+def clear_processed(store):
+    """이전 실행에서 만든 누끼 파일(+ 저장소 색인)을 지워 매번 같은 조건에서 측정"""
+    store.clear()
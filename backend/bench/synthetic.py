@@ -0,0 +1,103 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from catalog import CATEGORY_MAP, save_catalog_dir
+from ann import build_and_save_ivf
+
+# [설정] 실제 임베딩 차원 (preprocess.EMB_SOURCES 기본값과 동일)
+DIMS = {'name': 200, 'brand': 768, 'img': 512, 'cat': 50}
+N_BRANDS = 300
+N_LOWER_CATEGORIES = 60     # category_id 수 (상위 카테고리 5개에 나눠 배정)
+N_CLUSTERS = 64             # 상품명/이미지 벡터 군집 수 (IVF / kNN 이 의미 있도록)
+GEN_CHUNK_ROWS = 50000
+
+def _normalize(vecs):
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-9
+    return vecs
+
+def _clustered(rng, centers, assign, noise):
+    vecs = centers[assign] + rng.standard_normal((len(assign), centers.shape[1])).astype(np.float32) * noise
+    return _normalize(vecs)
+
+def generate_catalog(n, seed=0, n_brands=N_BRANDS, n_lower=N_LOWER_CATEGORIES, n_clusters=N_CLUSTERS):
+    """
+    n개 상품의 합성 카탈로그. preprocess 결과와 같은 키/차원 구성.
+
+    Returns:
+        {
+          ids, names, prices, imgs, cats, lower_cats, name_vecs, img_vecs (product_id 순),
+          brand_ids, category_ids: 상품별 원본 키 (SQLite 대체 DB / 임베딩 파일용),
+          brand_keys, brand_table, brand_idx, cat_keys, cat_table, cat_idx
+        }
+    """
+    rng = np.random.default_rng(seed)
+    upper = np.array(list(CATEGORY_MAP.values()))
+    lower_to_upper = np.arange(n_lower) % len(upper)
+
+    ids = np.arange(1000, 1000 + n, dtype=np.int64)
+    category_ids = rng.integers(0, n_lower, n)
+    brand_ids = rng.integers(0, n_brands, n)
+    clusters = rng.integers(0, n_clusters, n)
+
+    name_vecs = np.empty((n, DIMS['name']), dtype=np.float32)
+    img_vecs = np.empty((n, DIMS['img']), dtype=np.float32)
+    name_centers = _normalize(rng.standard_normal((n_clusters, DIMS['name'])).astype(np.float32))
+    img_centers = _normalize(rng.standard_normal((n_clusters, DIMS['img'])).astype(np.float32))
+    for start in range(0, n, GEN_CHUNK_ROWS):
+        rows = slice(start, min(start + GEN_CHUNK_ROWS, n))
+        name_vecs[rows] = _clustered(rng, name_centers, clusters[rows], 0.08)
+        img_vecs[rows] = _clustered(rng, img_centers, clusters[rows], 0.05)
+
+    brand_table = _normalize(rng.standard_normal((n_brands, DIMS['brand'])).astype(np.float32))
+    cat_table = _normalize(rng.standard_normal((n_lower, DIMS['cat'])).astype(np.float32))
+
+    return {
+        'ids': ids,
+        'names': np.array([f"합성상품 {i}" for i in ids]),
+        'prices': rng.integers(10, 500, n).astype(np.int64) * 1000,
+        'imgs': np.array([f"https://bench.invalid/img/{i}.jpg" for i in ids]),
+        'cats': upper[lower_to_upper[category_ids]],
+        'lower_cats': np.array([f"세부{c}" for c in category_ids]),
+        'name_vecs': name_vecs,
+        'img_vecs': img_vecs,
+        'brand_ids': brand_ids,
+        'category_ids': category_ids,
+        'brand_keys': np.arange(n_brands, dtype=np.int64),
+        'brand_table': brand_table,
+        'brand_idx': brand_ids.astype(np.int32),
+        'cat_keys': np.arange(n_lower, dtype=np.int64),
+        'cat_table': cat_table,
+        'cat_idx': category_ids.astype(np.int32),
+    }
+
+def write_catalog_dir(catalog, out_dir, quantize=None, ivf=False):
+    """서버용 master_data 디렉토리로 저장 (app.py 가 그대로 읽는 형식). Returns: 소요 시간(초)"""
+    start_time = time.time()
+    save_catalog_dir(catalog, out_dir, quantize=quantize)
+    if ivf:
+        build_and_save_ivf(out_dir)
+    return time.time() - start_time
+
+def write_preprocess_sources(catalog, work_dir, engine):
+    """
+    preprocess.create_master_data 입력을 만든다.
+    - work_dir/data/*_emb.npz: 임베딩 파일 (1차원 키 + 2차원 벡터)
+    - engine: product / category 테이블
+    """
+    data_dir = os.path.join(work_dir, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    np.savez(os.path.join(data_dir, 'product_name_emb.npz'), ids=catalog['ids'], vecs=catalog['name_vecs'])
+    np.savez(os.path.join(data_dir, 'image_emb.npz'), ids=catalog['ids'], vecs=catalog['img_vecs'])
+    np.savez(os.path.join(data_dir, 'brand_description_emb.npz'), ids=catalog['brand_keys'], vecs=catalog['brand_table'])
+    np.savez(os.path.join(data_dir, 'category_emb.npz'), ids=catalog['cat_keys'], vecs=catalog['cat_table'])
+
+    categories = pd.DataFrame({'category_id': catalog['category_ids'], 'upper_category': catalog['cats'],
+                               'lower_category': catalog['lower_cats']}).drop_duplicates('category_id')
+    products = pd.DataFrame({'product_id': catalog['ids'], 'product_name': catalog['names'],
+                             'original_price': catalog['prices'], 'img_url': catalog['imgs'],
+                             'category_id': catalog['category_ids'], 'brand_id': catalog['brand_ids']})
+    categories.to_sql('category', engine, index=False, if_exists='replace')
+    products.to_sql('product', engine, index=False, if_exists='replace', chunksize=10000)
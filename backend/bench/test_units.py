@@ -0,0 +1,258 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np
+from sqlalchemy import create_engine
+
+from catalog import CATEGORY_MAP, StringColumn, StringColumnWriter, load_master_data, price_window
+from scoring import DEFAULT_WEIGHTS, resolve_weights, prepare_queries, category_candidates
+from shuffle_sessions import CategoryCursor, ShuffleSessionStore
+from response_cache import etag_for, etag_matches
+from outfit_writer import OutfitWriter, ACCEPTED, outfit_key
+from bench.synthetic import generate_catalog, write_catalog_dir
+from bench.standin import create_standin_engine
+
+# ---------------------------------------------------------
+# [단위 확인] 벤치마크가 빠르게 재는 경로가 여전히 맞는 결과를 내는지
+#   실행: cd backend && python -m pytest bench (또는 python -m unittest bench.test_units)
+#   - 정확 모드 점수(통합 행렬 + 테이블 gather) vs 원본 벡터로 직접 계산한 가중합
+#   - price_window 경계 / 셔플 커서 소진·재시작 / If-None-Match 비교
+#   - 문자열 열을 청크 단위로 쓴 결과가 한 번에 쓴 것과 같은지
+#   - 아웃핏 write-behind: 문제 행이 뒤의 행을 막지 않는지, 연결 오류는 재시도로 남는지
+# ---------------------------------------------------------
+N_ITEMS = 3000
+TOP_K = 10
+
+def brute_force_candidates(catalog, master_data, rep_indices, start, end, k, weights):
+    """
+    합성 카탈로그 원본(상품 ID 순) 벡터로 대표 상품 x 구간 상품 가중합을 float64 로 직접 계산하고
+    대표 상품별 상위 k개를 합친다 (중복은 최대 점수). Returns: {카탈로그 행: 점수}
+    """
+    rows = master_data['ids'] - catalog['ids'][0]  # 정렬된 카탈로그 행 -> 원본 행 (ID 가 1000부터 연속)
+    reps, items = rows[rep_indices], rows[start:end]
+
+    def sims(vecs_r, vecs_i):
+        return np.asarray(vecs_r, dtype=np.float64) @ np.asarray(vecs_i, dtype=np.float64).T
+
+    scores = (weights['name'] * sims(catalog['name_vecs'][reps], catalog['name_vecs'][items])
+              + weights['img'] * sims(catalog['img_vecs'][reps], catalog['img_vecs'][items])
+              + weights['brand'] * sims(catalog['brand_table'][catalog['brand_idx'][reps]],
+                                        catalog['brand_table'][catalog['brand_idx'][items]])
+              + weights['cat'] * sims(catalog['cat_table'][catalog['cat_idx'][reps]],
+                                      catalog['cat_table'][catalog['cat_idx'][items]]))
+
+    best = {}
+    for r, rep in enumerate(rep_indices):
+        row = scores[r].copy()
+        if start <= rep < end:
+            row[rep - start] = -1.0  # 자기 자신 제외 (score_block 과 같음)
+        for local in np.argsort(-row, kind='stable')[:k]:
+            best[start + int(local)] = max(best.get(start + int(local), -np.inf), row[local])
+    return best
+
+class ExactScoringTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp(prefix='bench-units-')
+        cls.catalog = generate_catalog(N_ITEMS, seed=7)
+        write_catalog_dir(cls.catalog, os.path.join(cls.tmp_dir, 'master_data'))
+        cls.master_data = load_master_data(os.path.join(cls.tmp_dir, 'master_data'))
+        cls.rep_indices = np.random.default_rng(7).choice(N_ITEMS, 20, replace=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.master_data = None
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def assert_matches_brute_force(self, weights, start, end):
+        queries = prepare_queries(self.master_data, self.rep_indices, weights)
+        indices, scores = category_candidates(self.master_data, queries, start, end, TOP_K, 0)
+        expected = brute_force_candidates(self.catalog, self.master_data, self.rep_indices, start, end, TOP_K, weights)
+        self.assertEqual(sorted(int(i) for i in indices), sorted(expected))
+        np.testing.assert_allclose(scores, [expected[int(i)] for i in indices], rtol=1e-4, atol=1e-4)
+
+    def test_default_weights_every_category(self):
+        for code in range(len(CATEGORY_MAP)):
+            start, end = price_window(self.master_data['index'], self.master_data['prices'], code)
+            with self.subTest(category=code):
+                self.assert_matches_brute_force(dict(DEFAULT_WEIGHTS), start, end)
+
+    def test_weight_overrides_and_price_filter(self):
+        weights = resolve_weights(None, {'name': 0.5, 'img': 0.2, 'brand': 0.0, 'cat': 0.3})
+        start, end = price_window(self.master_data['index'], self.master_data['prices'], 1, 100000, 300000)
+        self.assertLess(0, end - start)
+        self.assert_matches_brute_force(weights, start, end)
+
+class PriceWindowTest(unittest.TestCase):
+    def setUp(self):
+        # 카테고리 0: [10, 20, 20, 30], 카테고리 1: 비어 있음, 카테고리 2: [5, 50]
+        self.index = {'cat_offsets': np.array([0, 4, 4, 6])}
+        self.prices = np.array([10, 20, 20, 30, 5, 50])
+
+    def test_unbounded_is_whole_category(self):
+        self.assertEqual(price_window(self.index, self.prices, 0), (0, 4))
+        self.assertEqual(price_window(self.index, self.prices, 2), (4, 6))
+
+    def test_bounds_are_inclusive(self):
+        self.assertEqual(price_window(self.index, self.prices, 0, 20, 20), (1, 3))
+        self.assertEqual(price_window(self.index, self.prices, 0, 10, 30), (0, 4))
+        self.assertEqual(price_window(self.index, self.prices, 0, 11, 29), (1, 3))
+
+    def test_empty_windows(self):
+        self.assertEqual(price_window(self.index, self.prices, 1), (4, 4))
+        for min_price, max_price in [(31, None), (None, 9), (25, 15)]:
+            start, end = price_window(self.index, self.prices, 0, min_price, max_price)
+            self.assertEqual(start, end)
+
+    def test_window_stays_inside_category(self):
+        start, end = price_window(self.index, self.prices, 2, 0, 10 ** 9)
+        self.assertEqual((start, end), (4, 6))
+
+class CategoryCursorTest(unittest.TestCase):
+    def make_cursor(self, size, seed=3):
+        return CategoryCursor((0, size), np.arange(size), np.zeros(size, dtype=np.float32), stream=(seed, 0))
+
+    def test_first_pass_shows_every_candidate_once(self):
+        cursor = self.make_cursor(23)
+        seen = np.concatenate([cursor.take(5) for _ in range(4)])  # 20개
+        self.assertEqual(len(set(seen.tolist())), 20)
+        self.assertEqual(cursor.rounds, 0)
+
+    def test_exhaustion_puts_unseen_first_then_reshuffles(self):
+        cursor = self.make_cursor(23)
+        seen = set(np.concatenate([cursor.take(5) for _ in range(4)]).tolist())
+        unseen = set(range(23)) - seen
+        page = cursor.take(5)  # 남은 3개 + 새 순서의 2개
+        self.assertEqual(cursor.rounds, 1)
+        self.assertEqual(set(page[:3].tolist()), unseen)
+        self.assertEqual(len(set(page.tolist())), 5)
+        # 새 회차의 나머지(23 - 5개)는 처음 회차에 본 20개를 한 번씩
+        rest = np.concatenate([page[3:], cursor.take(18)])
+        self.assertEqual(sorted(rest.tolist()), sorted(seen))
+
+    def test_small_pool_returns_everything(self):
+        cursor = self.make_cursor(3)
+        self.assertEqual(sorted(cursor.take(5).tolist()), [0, 1, 2])
+        self.assertEqual(sorted(cursor.take(5).tolist()), [0, 1, 2])
+
+    def test_same_stream_same_pages(self):
+        a, b = self.make_cursor(40), self.make_cursor(40)
+        for _ in range(12):
+            np.testing.assert_array_equal(a.take(5), b.take(5))
+        self.assertFalse(np.array_equal(self.make_cursor(40, seed=4).take(5), self.make_cursor(40).take(5)))
+
+    def test_reset_starts_a_new_cursor(self):
+        store = ShuffleSessionStore(max_sessions=10, ttl=60)
+        session_id, session = store.create(('base',), seed=3)
+        pool = (np.arange(30), np.zeros(30, dtype=np.float32))
+        store.reset(session, 'top', 0, (0, 30), pool)
+        first = store.take(session, 'top', 5)
+        store.take(session, 'top', 5)
+        store.reset(session, 'top', 0, (0, 30), pool)  # 가격 구간 변경 등
+        self.assertEqual(session.categories['top'].cursor, 0)
+        np.testing.assert_array_equal(store.take(session, 'top', 5), first)
+        self.assertIs(store.get(session_id, ('base',)), session)
+        self.assertIsNone(store.get(session_id, ('other',)))  # 조건이 바뀐 세션은 쓰지 않음
+
+class EtagTest(unittest.TestCase):
+    def test_etag_is_quoted_and_stable(self):
+        etag = etag_for(b'{"a":1}')
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+        self.assertEqual(etag, etag_for(b'{"a":1}'))
+        self.assertNotEqual(etag, etag_for(b'{"a":2}'))
+
+    def test_if_none_match(self):
+        etag = etag_for(b'body')
+        self.assertTrue(etag_matches(etag, etag))
+        self.assertTrue(etag_matches(f'W/{etag}', etag))
+        self.assertTrue(etag_matches(f'"other", {etag}', etag))
+        self.assertTrue(etag_matches('*', etag))
+        self.assertFalse(etag_matches(None, etag))
+        self.assertFalse(etag_matches('', etag))
+        self.assertFalse(etag_matches('"other"', etag))
+        self.assertFalse(etag_matches(etag.strip('"'), etag))  # 따옴표 없는 값은 다른 태그
+
+class StringColumnWriterTest(unittest.TestCase):
+    def test_chunked_write_matches_encode(self):
+        values = ['셔츠', '', 'jeans', None, '가' * 300, 'x']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            prefix = os.path.join(tmp_dir, 'names')
+            writer = StringColumnWriter(prefix, len(values))
+            for start in range(0, len(values), 4):
+                writer.append(np.array(values[start:start + 4], dtype=object))
+            writer.close()
+            offsets = np.load(f"{prefix}.offsets.npy")
+            buffer = np.load(f"{prefix}.bytes.npy")
+            expected_offsets, expected_buffer = StringColumn.encode(values)
+            np.testing.assert_array_equal(offsets, expected_offsets)
+            np.testing.assert_array_equal(buffer, expected_buffer)
+            self.assertEqual(StringColumn(offsets, buffer)[0], '셔츠')
+            self.assertFalse(os.path.exists(f"{prefix}.bytes.raw"))
+
+    def test_short_write_is_an_error(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            writer = StringColumnWriter(os.path.join(tmp_dir, 'names'), 3)
+            writer.append(['a', 'b'])
+            with self.assertRaises(RuntimeError):
+                writer.close()
+
+def outfit_row(n, persona='미니멀'):
+    return {"persona": persona, "outer_id": 0, "acc_id": 0, "top_id": n, "bottom_id": n + 1, "shoes_id": n + 2}
+
+class OutfitWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='bench-outfits-')
+        self.engine = create_standin_engine(os.path.join(self.tmp_dir, 'outfits.db'))
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def stored_keys(self):
+        with self.engine.connect() as conn:
+            return {tuple(r) for r in conn.exec_driver_sql(
+                "SELECT outer_id, top_id, bottom_id, shoes_id, acc_id FROM outfit")}
+
+    def test_bad_row_does_not_block_rows_behind_it(self):
+        writer = OutfitWriter(self.engine, flush_rows=4)
+        good = [outfit_row(n) for n in range(10, 70, 10)]
+        bad = outfit_row(5, persona=None)  # NOT NULL 위반 (MySQL 의 FK 위반처럼 행 자체의 오류)
+        rows = [good[0], bad] + good[1:]
+        self.assertEqual(writer.submit_many(rows), [ACCEPTED] * len(rows))
+
+        self.assertTrue(writer.flush())
+        self.assertEqual(self.stored_keys(), {outfit_key(r) for r in good})
+        stats = writer.stats()
+        self.assertEqual((stats['pending'], stats['written'], stats['dropped']), (0, len(good), 1))
+        self.assertEqual(writer.submit(dict(bad, persona='미니멀')), ACCEPTED)  # 버린 조합은 다시 접수 가능
+
+    def test_row_stored_by_another_process_is_not_an_error(self):
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO outfit (persona, outer_id, acc_id, top_id, bottom_id, shoes_id) "
+                                 "VALUES ('미니멀', 0, 0, 10, 11, 12)")
+        writer = OutfitWriter(self.engine)
+        writer.submit_many([outfit_row(10), outfit_row(20)])
+        self.assertTrue(writer.flush())
+        self.assertEqual(writer.stats()['dropped'], 0)
+        self.assertEqual(len(self.stored_keys()), 2)
+
+    def test_connection_error_keeps_rows_for_retry(self):
+        writer = OutfitWriter(create_engine(f"sqlite:///{os.path.join(self.tmp_dir, 'missing', 'x.db')}"))
+        writer.submit_many([outfit_row(10), outfit_row(20)])
+        self.assertFalse(writer.flush())
+        stats = writer.stats()
+        self.assertEqual((stats['pending'], stats['failed_flushes'], stats['dropped']), (2, 1, 0))
+
+        writer.engine = self.engine  # DB 복구
+        self.assertTrue(writer.flush())
+        self.assertEqual(len(self.stored_keys()), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import time
+import argparse
+
+import numpy as np
+
+from catalog import CATEGORY_MAP, load_master_data
+from ann import IVF_PROBES, ivf_candidates
+from scoring import (QUANTIZE_MODES, quantize_fused, prepare_queries, score_block,
+                     select_top_candidates, category_candidates)
+
+# ---------------------------------------------------------
+# [벤치마크] 압축 통합 행렬 + 재순위 / IVF vs float32 정확 계산 recall@k
+# ---------------------------------------------------------
+def recall(found, expected):
+    if len(expected) == 0:
+        return 1.0
+    return len(np.intersect1d(found, expected)) / len(expected)
+
+def run_bench(data_path, mode='int8', k=10, rerank=200, n_probe=IVF_PROBES, n_queries=20, reps_per_query=10, seed=0):
+    master_data = load_master_data(data_path)
+    if master_data is None:
+        return
+
+    # 디렉토리에 압축 행렬이 없으면 메모리에서 만들어 비교
+    if 'fused_q' not in master_data:
+        print(f"⚠️ {data_path} 에 fused_q 없음 -> 메모리에서 {mode} 압축")
+        quantized, scales = quantize_fused(master_data['fused_vecs'], master_data['fused_blocks'], mode)
+        master_data['fused_q'] = quantized
+        if scales is not None:
+            master_data['fused_q_scale'] = scales
+
+    fused_bytes = master_data['fused_vecs'].nbytes
+    quantized_bytes = master_data['fused_q'].nbytes
+    if 'fused_q_scale' in master_data:
+        quantized_bytes += master_data['fused_q_scale'].nbytes
+    print(f"📦 통합 행렬: float32 {fused_bytes / 2**20:.1f}MB -> {master_data['fused_q'].dtype} {quantized_bytes / 2**20:.1f}MB "
+          f"({fused_bytes / quantized_bytes:.1f}배)")
+
+    rng = np.random.default_rng(seed)
+    offsets = master_data['index']['cat_offsets']
+    n_rows = len(master_data['ids'])
+
+    use_ivf = 'ivf' in master_data
+    stats = {"first_pass": [], "reranked": [], "ivf": []}
+    times = {"exact": 0.0, "reranked": 0.0, "ivf": 0.0}
+    for _ in range(n_queries):
+        rep_indices = rng.choice(n_rows, size=min(reps_per_query, n_rows), replace=False)
+        queries = prepare_queries(master_data, rep_indices)
+        for code in range(len(CATEGORY_MAP)):
+            start, end = int(offsets[code]), int(offsets[code + 1])
+            if start >= end:
+                continue
+
+            t = time.perf_counter()
+            exact, _ = category_candidates(master_data, queries, start, end, k)
+            times["exact"] += time.perf_counter() - t
+
+            t = time.perf_counter()
+            reranked, _ = category_candidates(master_data, queries, start, end, k, rerank)
+            times["reranked"] += time.perf_counter() - t
+
+            # 재순위 없이 압축 점수만으로 고른 경우 (참고용)
+            first_pass, _ = select_top_candidates(score_block(master_data, queries, start, end, quantized=True), k)
+
+            stats["first_pass"].append(recall(first_pass + start, exact))
+            stats["reranked"].append(recall(reranked, exact))
+
+            if use_ivf:
+                t = time.perf_counter()
+                approx, _ = ivf_candidates(master_data, queries, code, start, end, k, n_probe)
+                times["ivf"] += time.perf_counter() - t
+                stats["ivf"].append(recall(approx, exact))
+
+    print(f"\n📊 [recall@{k}] 쿼리 {n_queries}개 x 대표 상품 {reps_per_query}개 x 카테고리 {len(CATEGORY_MAP)}개")
+    print(f"   👉 압축 점수만: {np.mean(stats['first_pass']):.4f}")
+    print(f"   👉 상위 {rerank}개 재순위: {np.mean(stats['reranked']):.4f} (최소 {np.min(stats['reranked']):.4f})")
+    if use_ivf:
+        print(f"   👉 IVF (리스트 {n_probe}개 탐색): {np.mean(stats['ivf']):.4f} (최소 {np.min(stats['ivf']):.4f})")
+    else:
+        print("   👉 IVF: 인덱스 없음 (python ann.py 로 생성)")
+    ivf_time = f" / IVF {times['ivf'] * 1000:.1f}ms" if use_ivf else ""
+    print(f"   👉 소요 시간: 정확 {times['exact'] * 1000:.1f}ms / 압축+재순위 {times['reranked'] * 1000:.1f}ms{ivf_time}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="압축 통합 행렬 + 재순위 / IVF 의 recall@k 를 float32 정확 계산과 비교합니다.")
+    parser.add_argument('--data', default='../data/master_data', help="master_data 경로 (디렉토리 또는 npz)")
+    parser.add_argument('--mode', choices=QUANTIZE_MODES, default='int8', help="fused_q 가 없을 때 사용할 압축 방식")
+    parser.add_argument('--k', type=int, default=10, help="대표 상품당 후보 수 (TOP_K_PER_REPRESENTATIVE)")
+    parser.add_argument('--rerank', type=int, default=200, help="재순위 후보 수 (RERANK_CANDIDATES)")
+    parser.add_argument('--probes', type=int, default=IVF_PROBES, help="IVF 탐색 리스트 수 (IVF_PROBES)")
+    parser.add_argument('--queries', type=int, default=20, help="무작위 대표 상품 세트 수")
+    parser.add_argument('--reps', type=int, default=10, help="세트당 대표 상품 수")
+    args = parser.parse_args()
+
+    run_bench(args.data, mode=args.mode, k=args.k, rerank=args.rerank, n_probe=args.probes,
+              n_queries=args.queries, reps_per_query=args.reps)
@@ -0,0 +1,566 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import threading
+import numpy as np
+
+from scoring import (DEFAULT_WEIGHTS, TABLE_MODALITIES, QUANTIZE_MODES, build_fused_matrix, encode_categories,
+                     factorize_rows, quantize_fused)
+from metrics import REGISTRY, STAGE_SECONDS
+
+# [설정]
+CATEGORY_MAP = {"outer": "아우터", "top": "상의", "bottom": "바지", "shoes": "신발", "acc": "액세서리"}
+REQUIRED_KEYS = ['ids', 'names', 'prices', 'imgs', 'cats', 'name_vecs', 'img_vecs',
+                 'brand_table', 'brand_idx', 'cat_table', 'cat_idx']
+STRING_KEYS = ['names', 'imgs', 'cats', 'lower_cats']
+INDEX_KEYS = ['cat_offsets', 'id_sorted', 'id_order']
+IVF_KEYS = ['centroids', 'list_offsets', 'rows', 'cat_list_offsets']
+KNN_KEYS = ['sources', 'offsets', 'neighbor_idx', 'neighbor_score']
+# 선택 인덱스 (meta.json 항목 이름 -> 파일 접두사.키.npy), 모두 기본 가중치 기준
+OPTIONAL_INDEXES = {'ivf': IVF_KEYS, 'knn': KNN_KEYS}
+CATALOG_FORMAT_VERSION = 2
+
+SAVE_CHUNK_ROWS = 65536
+
+CATALOG_ROWS = REGISTRY.gauge('catalog_rows', '현재 서비스 중인 카탈로그 상품 수')
+
+# ---------------------------------------------------------
+# [초기화] master_data 로드 + 파생 인덱스 생성
+# ---------------------------------------------------------
+def read_raw_master_data(path):
+    """
+    정렬/결합 전의 원본 배열 dict를 읽는다. 필수 키가 없으면 None.
+    - .npz: preprocess 결과 (압축 해제)
+    - 디렉토리: preprocess 빌드 디렉토리 (*.npy 를 mmap으로 연다)
+    """
+    if os.path.isdir(path):
+        data = {}
+        for file_name in os.listdir(path):
+            if file_name.endswith('.npy'):
+                data[file_name[:-len('.npy')]] = np.load(os.path.join(path, file_name), mmap_mode='r')
+        # 문자열 열은 StringColumn 포맷 (preprocess 가 청크 단위로 기록)
+        for key in STRING_KEYS:
+            if f"{key}.offsets" in data:
+                data[key] = StringColumn(data.pop(f"{key}.offsets"), data.pop(f"{key}.bytes"))
+    else:
+        data = dict(np.load(path, allow_pickle=True))
+
+    # 기존 형식(상품마다 복사된 brand_vecs / cat_vecs) -> 중복 제거 테이블 + 행 번호
+    for m in TABLE_MODALITIES:
+        if f'{m}_table' not in data and f'{m}_vecs' in data:
+            data[f'{m}_table'], data[f'{m}_idx'] = factorize_rows(data.pop(f'{m}_vecs'))
+
+    temp_data = {}
+    for key in REQUIRED_KEYS:
+        if key not in data:
+            print(f"❌ [키 누락] {key}")
+            return None
+
+        val = data[key]
+        if key.endswith('_vecs') or key.endswith('_table'):
+            try:
+                if val.dtype == object or isinstance(val, list):
+                    temp_data[key] = np.array([np.array(x, dtype=np.float32) for x in val])
+                elif val.dtype != np.float32:
+                    temp_data[key] = val.astype(np.float32)
+                else:
+                    temp_data[key] = val
+            except Exception:
+                temp_data[key] = val
+        else:
+            temp_data[key] = val
+    if 'lower_cats' in data:
+        temp_data['lower_cats'] = data['lower_cats']
+    return temp_data
+
+def is_catalog_dir(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, 'meta.json'))
+
+def load_master_data(path):
+    """
+    master_data 를 읽어 통합 행렬/카테고리 정렬/조회 인덱스까지 만든 dict를 반환.
+    - 카탈로그 디렉토리(save_catalog_dir 결과): mmap으로 바로 연다 (워커 간 페이지 캐시 공유)
+    - .npz / 빌드 디렉토리: 파생 데이터를 메모리에서 만든다
+    파일이나 키가 없으면 None.
+    """
+    if not os.path.exists(path):
+        print(f"🚨 [오류] {path} 파일 없음")
+        return None
+
+    if is_catalog_dir(path):
+        return load_catalog_dir(path)
+
+    temp_data = read_raw_master_data(path)
+    if temp_data is None:
+        return None
+    temp_data = materialize_strings(temp_data)
+
+    # 4개 임베딩을 가중치 반영된 통합 행렬 하나로 결합 (요청마다 GEMM 1회)
+    temp_data['fused_vecs'], temp_data['fused_blocks'] = build_fused_matrix(temp_data)
+    # 카테고리 정수 코드 (CATEGORY_MAP 순서, 그 외 -1) 기준으로 카테고리 -> 가격 순 재정렬
+    cat_codes = encode_categories(temp_data['cats'], list(CATEGORY_MAP.values()))
+    temp_data = sort_by_category_and_price(temp_data, cat_codes)
+    temp_data['index'] = build_catalog_index(temp_data, len(CATEGORY_MAP))
+    return temp_data
+
+# ---------------------------------------------------------
+# [저장 포맷] 비압축 .npy 디렉토리 (mmap 로드용)
+#   master_data/
+#     meta.json                       포맷 버전, 행 수, 가중치, fused_blocks, 카테고리
+#     ids.npy, prices.npy, cat_codes.npy, *_vecs.npy, fused_vecs.npy
+#     brand_table.npy + brand_idx.npy, cat_table.npy + cat_idx.npy   (중복 제거 테이블 + 상품별 행 번호)
+#     fused_q.npy (+ fused_q_scale.npy)   (선택) int8 / float16 압축 통합 행렬
+#     names.offsets.npy + names.bytes.npy   (문자열: utf-8 버퍼 + 시작 위치)
+#     index.cat_offsets.npy, index.id_sorted.npy, index.id_order.npy
+#     ivf.centroids.npy, ivf.list_offsets.npy, ivf.rows.npy, ivf.cat_list_offsets.npy   (선택, ann.py)
+#     knn.sources.npy, knn.offsets.npy, knn.neighbor_idx.npy, knn.neighbor_score.npy     (선택, knn_graph.py)
+# ---------------------------------------------------------
+class StringColumn:
+    """
+    offsets(int64, N+1) + utf-8 바이트 버퍼로 저장된 문자열 배열.
+    pickle 없이 mmap으로 열 수 있으며, 접근한 행만 디코딩한다.
+    """
+
+    def __init__(self, offsets, buffer):
+        self.offsets = offsets
+        self.buffer = buffer
+
+    @staticmethod
+    def encode(values):
+        encoded = [str(v).encode('utf-8') for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return offsets, buffer
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def to_array(self):
+        return np.array([self[i] for i in range(len(self))], dtype=str) if len(self) else np.empty(0, dtype=str)
+
+    def __getitem__(self, i):
+        if isinstance(i, (int, np.integer)):
+            start, end = self.offsets[i], self.offsets[i + 1]
+            return self.buffer[start:end].tobytes().decode('utf-8')
+        return np.array([self[j] for j in np.arange(len(self))[i]], dtype=object)
+
+class StringColumnWriter:
+    """
+    StringColumn 포맷({prefix}.offsets.npy + {prefix}.bytes.npy)을 청크 단위로 기록한다.
+    행 수를 미리 알아 offsets 는 memmap 으로 할당하고, 바이트는 임시 파일에 이어 쓴 뒤 close() 에서 .npy 로 감싼다.
+    """
+
+    def __init__(self, prefix, n_rows):
+        self.prefix = prefix
+        self.offsets = np.lib.format.open_memmap(f"{prefix}.offsets.npy", mode='w+', dtype=np.int64, shape=(n_rows + 1,))
+        self.rows = 0
+        self._raw = open(f"{prefix}.bytes.raw", 'wb')
+
+    def append(self, values):
+        offsets, buffer = StringColumn.encode(values)
+        n = len(offsets) - 1
+        self.offsets[self.rows + 1:self.rows + 1 + n] = self.offsets[self.rows] + offsets[1:]
+        self._raw.write(buffer.tobytes())
+        self.rows += n
+
+    def close(self):
+        self._raw.close()
+        if self.rows != len(self.offsets) - 1:
+            raise RuntimeError(f"{self.prefix}: {len(self.offsets) - 1}행 중 {self.rows}행만 기록됨")
+        size = int(self.offsets[-1])
+        self.offsets.flush()
+        self.offsets = None
+        with open(f"{self.prefix}.bytes.raw", 'rb') as src, open(f"{self.prefix}.bytes.npy", 'wb') as out:
+            np.lib.format.write_array_header_1_0(out, {'descr': '|u1', 'fortran_order': False, 'shape': (size,)})
+            shutil.copyfileobj(src, out, 1 << 20)
+        os.remove(f"{self.prefix}.bytes.raw")
+
+def materialize_strings(data):
+    """StringColumn 열을 일반 문자열 배열로 (메모리에서 정렬하거나 npz 로 저장할 때)"""
+    return {key: val.to_array() if isinstance(val, StringColumn) else val for key, val in data.items()}
+
+def replace_dir(tmp_dir, out_dir):
+    """완성된 tmp_dir 을 out_dir 로 교체 (기존 디렉토리는 .old 로 옮긴 뒤 삭제)"""
+    old_dir = f"{out_dir.rstrip(os.sep)}.old"
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+    if os.path.exists(out_dir):
+        os.rename(out_dir, old_dir)
+    os.rename(tmp_dir, out_dir)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+
+def save_catalog_dir(raw, out_dir, chunk_rows=SAVE_CHUNK_ROWS, quantize=None):
+    """
+    read_raw_master_data 결과(원본 배열 dict, mmap 가능)를 서버용 디렉토리 포맷으로 저장한다.
+    정렬/통합 행렬 생성을 chunk_rows 행 단위로 처리하므로 메모리에 전체 행렬을 올리지 않는다.
+    quantize('int8' / 'float16')를 주면 1차 점수 계산용 압축 통합 행렬도 함께 저장한다.
+    임시 디렉토리에 모두 쓴 뒤 rename 하므로, 읽는 쪽은 완성된 디렉토리만 보게 된다.
+    """
+    tmp_dir = f"{out_dir.rstrip(os.sep)}.tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    def path_of(name):
+        return os.path.join(tmp_dir, f"{name}.npy")
+
+    # 1) 정렬 순서와 작은 열(ids, prices, cat_codes, 문자열)
+    #    문자열 열(ndarray 또는 StringColumn)은 전체를 풀지 않고 chunk_rows 행씩 읽고 쓴다
+    n_raw = len(raw['ids'])
+    cat_codes = np.empty(n_raw, dtype=np.int8)
+    for start in range(0, n_raw, chunk_rows):
+        cats = raw['cats'][start:start + chunk_rows]
+        cat_codes[start:start + len(cats)] = encode_categories(cats, list(CATEGORY_MAP.values()))
+    prices = np.asarray(raw['prices'])
+    order = np.lexsort((prices, cat_codes))
+    n_rows = len(order)
+
+    small = {'ids': np.asarray(raw['ids'])[order], 'prices': prices[order], 'cat_codes': cat_codes[order]}
+    for m in TABLE_MODALITIES:
+        small[f'{m}_idx'] = np.asarray(raw[f'{m}_idx'], dtype=np.int32)[order]
+        np.save(path_of(f'{m}_table'), np.asarray(raw[f'{m}_table'], dtype=np.float32))
+    for key, val in small.items():
+        np.save(path_of(key), val)
+    for key in STRING_KEYS:
+        if key in raw:
+            writer = StringColumnWriter(os.path.join(tmp_dir, key), n_rows)
+            for start in range(0, n_rows, chunk_rows):
+                writer.append(raw[key][order[start:start + chunk_rows]])
+            writer.close()
+
+    index = build_catalog_index(small, len(CATEGORY_MAP))
+    for key in INDEX_KEYS:
+        np.save(path_of(f"index.{key}"), index[key])
+
+    # 2) 벡터 / 통합 행렬은 블록 단위로 gather -> 기록
+    vec_keys = [key for key in raw if key.endswith('_vecs')]
+    outputs = {key: np.lib.format.open_memmap(path_of(key), mode='w+', dtype=np.float32,
+                                              shape=(n_rows, raw[key].shape[1]))
+               for key in vec_keys}
+    fused_out = None
+    fused_blocks = None
+    quantized_out = None
+    scales_out = None
+    for start in range(0, n_rows, chunk_rows):
+        rows = order[start:start + chunk_rows]
+        block = {key: np.asarray(raw[key][np.sort(rows)], dtype=np.float32) for key in vec_keys}
+        # np.sort 로 디스크 순서대로 읽은 뒤 원래 순서로 되돌림
+        restore = np.argsort(np.argsort(rows, kind='stable'), kind='stable')
+        block = {key: val[restore] for key, val in block.items()}
+        for key, val in block.items():
+            outputs[key][start:start + len(rows)] = val
+
+        fused, fused_blocks = build_fused_matrix(block)
+        if fused_out is None:
+            fused_out = np.lib.format.open_memmap(path_of('fused_vecs'), mode='w+', dtype=np.float32,
+                                                  shape=(n_rows, fused.shape[1]))
+        fused_out[start:start + len(rows)] = fused
+
+        if quantize:
+            quantized, scales = quantize_fused(fused, fused_blocks, quantize)
+            if quantized_out is None:
+                quantized_out = np.lib.format.open_memmap(path_of('fused_q'), mode='w+', dtype=quantized.dtype,
+                                                          shape=(n_rows, quantized.shape[1]))
+                if scales is not None:
+                    scales_out = np.lib.format.open_memmap(path_of('fused_q_scale'), mode='w+', dtype=np.float32,
+                                                           shape=(n_rows, scales.shape[1]))
+            quantized_out[start:start + len(rows)] = quantized
+            if scales is not None:
+                scales_out[start:start + len(rows)] = scales
+
+    for out in list(outputs.values()) + [fused_out, quantized_out, scales_out]:
+        if out is not None:
+            out.flush()
+    del outputs, fused_out, quantized_out, scales_out
+
+    meta = {
+        "format_version": CATALOG_FORMAT_VERSION,
+        "version": time.strftime('%Y%m%d-%H%M%S'),
+        "rows": int(n_rows),
+        "weights": DEFAULT_WEIGHTS,
+        "fused_blocks": {m: list(block) for m, block in (fused_blocks or {}).items()},
+        "quantize": quantize,
+        "categories": list(CATEGORY_MAP.values()),
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    replace_dir(tmp_dir, out_dir)
+
+def load_catalog_dir(path):
+    """save_catalog_dir 포맷을 mmap_mode='r'로 연다. (복사/압축 해제/unpickle 없음)"""
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('format_version') != CATALOG_FORMAT_VERSION:
+        print(f"❌ [포맷 불일치] {path} (version={meta.get('format_version')}) -> python catalog.py 또는 preprocess.py 로 다시 생성하세요.")
+        return None
+    if meta.get('categories') != list(CATEGORY_MAP.values()):
+        print(f"❌ [카테고리 불일치] {path} 를 다시 생성하세요.")
+        return None
+
+    def load(name):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+
+    data = {}
+    for file_name in sorted(os.listdir(path)):
+        # index.* / ivf.* / knn.* / 문자열(.offsets / .bytes) 은 아래에서 따로 묶어 읽음
+        if not file_name.endswith('.npy') or '.' in file_name[:-len('.npy')]:
+            continue
+        key = file_name[:-len('.npy')]
+        data[key] = load(key)
+    for key in STRING_KEYS:
+        if os.path.exists(os.path.join(path, f"{key}.offsets.npy")):
+            data[key] = StringColumn(load(f"{key}.offsets"), load(f"{key}.bytes"))
+
+    missing = [key for key in REQUIRED_KEYS + ['fused_vecs', 'cat_codes'] if key not in data]
+    if missing:
+        print(f"❌ [키 누락] {missing}")
+        return None
+
+    data['fused_blocks'] = {m: tuple(block) for m, block in meta['fused_blocks'].items()}
+    data['index'] = {key: load(f"index.{key}") for key in INDEX_KEYS}
+    for name, keys in OPTIONAL_INDEXES.items():
+        if meta.get(name) and meta.get('weights') == DEFAULT_WEIGHTS:
+            data[name] = {key: load(f"{name}.{key}") for key in keys}
+
+    # 저장 당시와 기본 가중치가 다르면 통합 행렬만 메모리에서 다시 만든다
+    if meta.get('weights') != DEFAULT_WEIGHTS:
+        print("⚠️ 가중치 변경 감지 -> 통합 행렬 재생성 (mmap 공유 안 됨, 디렉토리 재생성 권장)")
+        data['fused_vecs'], data['fused_blocks'] = build_fused_matrix(data)
+        if meta.get('quantize'):
+            quantized, scales = quantize_fused(data['fused_vecs'], data['fused_blocks'], meta['quantize'])
+            data['fused_q'] = quantized
+            if scales is not None:
+                data['fused_q_scale'] = scales
+        if meta.get('ivf') or meta.get('knn'):
+            print("⚠️ IVF / kNN 그래프는 저장 당시 가중치 기준이므로 사용하지 않습니다. (ann.py / knn_graph.py 로 재생성)")
+    return data
+
+def update_catalog_meta(path, **fields):
+    """카탈로그 디렉토리의 meta.json 에 항목을 추가하고 version 을 갱신한다 (임시 파일 후 교체 -> 파일 감시가 다시 로드)"""
+    meta_path = os.path.join(path, 'meta.json')
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    meta.update(fields)
+    meta['version'] = time.strftime('%Y%m%d-%H%M%S')
+
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, meta_path)
+
+def save_optional_index(path, name, arrays, **info):
+    """OPTIONAL_INDEXES 의 {name}.{key}.npy 를 카탈로그 디렉토리에 쓰고 meta.json 을 마지막에 갱신 (실행 중인 서버가 다시 로드)"""
+    for key in OPTIONAL_INDEXES[name]:
+        file_path = os.path.join(path, f"{name}.{key}.npy")
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, arrays[key])
+        os.replace(tmp_path, file_path)
+    update_catalog_meta(path, **{name: info})
+
+# ---------------------------------------------------------
+# [로드 시 1회] 카테고리 → 가격 순 정렬 인덱스
+# ---------------------------------------------------------
+def sort_by_category_and_price(data, cat_codes):
+    """
+    모든 행 단위 배열을 (카테고리 코드, 가격) 순으로 재배치한다.
+    이후 같은 카테고리 상품은 연속 구간에 모이고, 구간 안에서는 가격 오름차순이 된다.
+
+    Returns:
+        재배치된 새 dict (cat_codes 포함)
+    """
+    order = np.lexsort((data['prices'], cat_codes))
+    n_rows = len(cat_codes)
+
+    sorted_data = {}
+    for key, val in data.items():
+        # 브랜드/카테고리 테이블은 상품 순서와 무관 (행 수가 우연히 같아도 재배치하지 않음)
+        if key.endswith('_table'):
+            sorted_data[key] = val
+        elif isinstance(val, np.ndarray) and val.ndim >= 1 and len(val) == n_rows:
+            sorted_data[key] = np.ascontiguousarray(val[order])
+        else:
+            sorted_data[key] = val
+    sorted_data['cat_codes'] = cat_codes[order]
+    return sorted_data
+
+def build_catalog_index(data, n_categories):
+    """
+    sort_by_category_and_price로 정렬된 데이터에 대한 조회용 인덱스.
+
+    - cat_offsets: 카테고리 c의 행 구간은 [cat_offsets[c], cat_offsets[c+1])
+    - id_sorted / id_order: product_id -> 행 인덱스 이진 탐색용
+    """
+    ids = np.asarray(data['ids']).astype(np.int64)
+    id_order = np.argsort(ids, kind='stable')
+    return {
+        'cat_offsets': np.searchsorted(data['cat_codes'], np.arange(n_categories + 1)),
+        'id_sorted': ids[id_order],
+        'id_order': id_order,
+    }
+
+# ---------------------------------------------------------
+# [요청 시] 조회 함수
+# ---------------------------------------------------------
+def lookup_indices(index, product_ids):
+    """
+    product_id 배열 -> 행 인덱스 배열 (벡터화된 searchsorted)
+
+    Returns:
+        (indices, missing_ids)
+    """
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    id_sorted = index['id_sorted']
+    if len(id_sorted) == 0:
+        return np.empty(0, dtype=np.int64), product_ids
+
+    pos = np.searchsorted(id_sorted, product_ids)
+    pos = np.minimum(pos, len(id_sorted) - 1)
+    found = id_sorted[pos] == product_ids
+    return index['id_order'][pos[found]], product_ids[~found]
+
+def price_window(index, prices, cat_code, min_price=None, max_price=None):
+    """
+    카테고리 구간 안에서 min_price <= price <= max_price 를 만족하는 연속 행 구간
+
+    Returns:
+        (start, end) - 비어 있으면 start == end
+    """
+    start = int(index['cat_offsets'][cat_code])
+    end = int(index['cat_offsets'][cat_code + 1])
+    cat_prices = prices[start:end]
+
+    lo = 0 if min_price is None else int(np.searchsorted(cat_prices, min_price, side='left'))
+    hi = len(cat_prices) if max_price is None else int(np.searchsorted(cat_prices, max_price, side='right'))
+    return start + lo, start + max(lo, hi)
+
+# ---------------------------------------------------------
+# [핫 리로드] 버전이 붙은 카탈로그 스냅샷 + 원자적 교체
+# ---------------------------------------------------------
+class CatalogSnapshot:
+    """
+    한 시점의 master_data(배열 + 파생 인덱스)와 버전.
+    요청 처리 시작 시 스냅샷 참조를 한 번 잡아 두면, 도중에 새 버전으로 교체되어도
+    그 요청은 끝까지 이전 버전으로 처리된다.
+    """
+
+    def __init__(self, data, version, source_path):
+        self.data = data
+        self.version = version
+        self.source_path = source_path
+        self.loaded_at = time.time()
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+def _source_signature(path):
+    """변경 감지용 (경로, mtime). 카탈로그 디렉토리는 마지막에 교체되는 meta.json 기준"""
+    target = os.path.join(path, 'meta.json') if is_catalog_dir(path) else path
+    try:
+        return path, os.stat(target).st_mtime_ns
+    except OSError:
+        return None
+
+def _source_version(path):
+    if is_catalog_dir(path):
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            version = json.load(f).get('version')
+        if version:
+            return version
+    signature = _source_signature(path)
+    return time.strftime('%Y%m%d-%H%M%S', time.localtime(signature[1] / 1e9))
+
+class CatalogManager:
+    """
+    카탈로그 스냅샷을 보관하고, 데이터 파일이 바뀌면 백그라운드에서 새 스냅샷을 만들어 교체한다.
+    candidate_paths 중 처음으로 존재하는 경로를 사용한다 (디렉토리 포맷 우선, 없으면 npz).
+    """
+
+    def __init__(self, candidate_paths):
+        self.candidate_paths = candidate_paths
+        self._snapshot = None
+        self._signature = None
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+
+    def current(self):
+        return self._snapshot
+
+    def _resolve_path(self):
+        for path in self.candidate_paths:
+            if os.path.exists(path):
+                return path
+        return self.candidate_paths[0]
+
+    def reload(self, force=False):
+        """
+        새 스냅샷을 만들어 교체한다. 실패하면 기존 스냅샷을 유지한다.
+
+        Returns:
+            교체되었으면 True
+        """
+        # 빌드는 한 번에 하나만 (파일 감시와 관리자 요청이 겹쳐도 중복 로드 없음)
+        with self._reload_lock:
+            path = self._resolve_path()
+            signature = _source_signature(path)
+            if not force and signature is not None and signature == self._signature:
+                return False
+
+            try:
+                with STAGE_SECONDS.time(stage='catalog_load'):
+                    data = load_master_data(path)
+                if data is None:
+                    return False
+                snapshot = CatalogSnapshot(data, _source_version(path), path)
+            except Exception as e:
+                print(f"❌ 데이터 로딩 에러: {e}")
+                return False
+
+            old = self._snapshot
+            self._snapshot = snapshot  # 참조 교체는 원자적
+            self._signature = signature
+            CATALOG_ROWS.set(len(snapshot['ids']))
+            print(f"✅ 데이터 로드 완료! (총 {len(snapshot['ids'])}개, 버전 {snapshot.version}"
+                  f"{'' if old is None else f', 이전 {old.version}'})")
+            return True
+
+    def reload_async(self, force=False):
+        thread = threading.Thread(target=self.reload, kwargs={'force': force}, daemon=True)
+        thread.start()
+        return thread
+
+    def start_watch(self, interval):
+        """interval(초)마다 데이터 파일 변경을 확인해 바뀌었으면 다시 로드"""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                signature = _source_signature(self._resolve_path())
+                if signature is not None and signature != self._signature:
+                    self.reload()
+
+        self._watcher = threading.Thread(target=watch, name='catalog-watch', daemon=True)
+        self._watcher.start()
+
+if __name__ == "__main__":
+    # 기존 master_data.npz -> mmap 디렉토리 포맷 변환
+    parser = argparse.ArgumentParser(description="master_data.npz 를 mmap용 디렉토리 포맷으로 변환합니다.")
+    parser.add_argument('src', nargs='?', default='../data/master_data.npz')
+    parser.add_argument('dst', nargs='?', default='../data/master_data')
+    parser.add_argument('--quantize', choices=QUANTIZE_MODES, help="1차 점수 계산용 압축 통합 행렬 추가 저장")
+    args = parser.parse_args()
+
+    raw = read_raw_master_data(args.src)
+    if raw is not None:
+        save_catalog_dir(raw, args.dst, quantize=args.quantize)
+        print(f"✅ 변환 완료: {args.dst} (총 {len(raw['ids'])}개)")
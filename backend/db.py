@@ -0,0 +1,116 @@
+import os
+import time
+import threading
+
+import numpy as np
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+from metrics import STAGE_SECONDS
+
+# backend 디렉토리의 .env 파일 로드 (아래 풀 설정도 .env 에서 읽도록 import 시점에)
+load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
+
+# [설정] 커넥션 풀 (서버 워커 1개 기준)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))   # MySQL wait_timeout 보다 짧게 (초)
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '10'))     # 풀이 가득 찼을 때 대기 시간 (초)
+
+# ---------------------------------------------------------
+# [엔진] 풀 크기 / 재활용 / pre-ping 명시
+# ---------------------------------------------------------
+def database_url():
+    # DB_URL 이 있으면 그대로 사용 (벤치마크의 SQLite 대체 DB 등)
+    return os.getenv('DB_URL') or \
+        f"mysql+mysqlconnector://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
+
+def create_db_engine():
+    return create_engine(
+        database_url(),
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=True,  # 끊어진 커넥션은 사용 전에 걸러냄 (DB 재시작 후 첫 요청 실패 방지)
+    )
+
+# ---------------------------------------------------------
+# [미러] representative_item (persona -> product_id 배열)
+#   - 시작 시 전체 로드, 이후 interval 마다 (행 수, 체크섬)만 조회해 바뀌었을 때만 다시 로드
+#   - 추천 요청은 메모리만 읽으므로 DB 가 잠시 끊겨도 마지막으로 읽은 데이터로 계속 동작
+# ---------------------------------------------------------
+CHANGE_QUERY = text("""
+    SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT(persona, ':', product_id))), 0)
+    FROM representative_item
+""")
+LOAD_QUERY = text("SELECT persona, product_id FROM representative_item ORDER BY persona, product_id")
+
+class RepresentativeMirror:
+    def __init__(self, engine):
+        self.engine = engine
+        self._personas = None
+        self._signature = None
+        self._refresh_lock = threading.Lock()
+        self._watcher = None
+        self.loaded_at = None
+
+    @property
+    def loaded(self):
+        return self._personas is not None
+
+    def get(self, persona):
+        """페르소나의 대표 상품 ID (int64 배열). 없거나 아직 로드 전이면 None. DB 접근 없음"""
+        personas = self._personas
+        if personas is None:
+            return None
+        return personas.get(persona)
+
+    def _fetch_signature(self, conn):
+        count, checksum = conn.execute(CHANGE_QUERY).one()
+        return int(count), int(checksum)
+
+    def refresh(self, force=False):
+        """
+        변경이 있으면 다시 로드해 교체한다. DB 오류 시 기존 미러를 유지한다.
+
+        Returns:
+            교체되었으면 True
+        """
+        with self._refresh_lock:
+            try:
+                with STAGE_SECONDS.time(stage='db_fetch'), self.engine.connect() as conn:
+                    signature = self._fetch_signature(conn)
+                    if not force and self._personas is not None and signature == self._signature:
+                        return False
+                    rows = conn.execute(LOAD_QUERY).all()
+            except Exception as e:
+                print(f"⚠️ representative_item 갱신 실패 (기존 데이터 유지): {e}")
+                return False
+
+            grouped = {}
+            for persona, product_id in rows:
+                grouped.setdefault(persona, []).append(product_id)
+            self._personas = {persona: np.array(ids, dtype=np.int64) for persona, ids in grouped.items()}  # 참조 교체는 원자적
+            self._signature = signature
+            self.loaded_at = time.time()
+            print(f"✅ representative_item 로드 완료 (페르소나 {len(grouped)}개, 대표 상품 {len(rows)}개)")
+            return True
+
+    def refresh_async(self, force=False):
+        thread = threading.Thread(target=self.refresh, kwargs={'force': force}, daemon=True)
+        thread.start()
+        return thread
+
+    def start_watch(self, interval):
+        """interval(초)마다 변경 확인 (시작 시 로드에 실패했으면 여기서 재시도)"""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                self.refresh()
+
+        self._watcher = threading.Thread(target=watch, name='representative-watch', daemon=True)
+        self._watcher.start()
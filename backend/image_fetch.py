@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# [설정]
+# 원본 캐시는 서빙 폴더(static/) 밖에 둔다. 누끼 PNG 가 저장되면 해당 원본은 지운다 (discard_cached)
+RAW_CACHE_DIR = os.getenv('RAW_IMAGE_CACHE_DIR', os.path.join(os.getcwd(), "raw_cache"))
+LEGACY_RAW_CACHE_DIR = os.path.join(os.getcwd(), "static", "raw_imgs")  # 예전 위치 (공개 서빙됨)
+RAW_CACHE_MAX_AGE = int(os.getenv('RAW_IMAGE_MAX_AGE', '86400'))  # 이 시간(초)이 지나면 조건부 재검증
+FETCH_WORKERS = int(os.getenv('IMAGE_FETCH_WORKERS', '8'))        # 응답 1건당 동시 다운로드 수
+FETCH_DEADLINE = float(os.getenv('IMAGE_FETCH_DEADLINE', '10'))   # 응답 1건당 다운로드 제한 시간(초)
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+# ---------------------------------------------------------
+# [세션] 프로세스당 1개, 커넥션 재사용
+# ---------------------------------------------------------
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            retry = Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+                          allowed_methods=['GET'])
+            adapter = HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_WORKERS,
+                                  max_retries=retry)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(HEADERS)
+            _session = session
+        return _session
+
+# ---------------------------------------------------------
+# [디스크 캐시] 원본 이미지는 내용 해시(sha256)로 저장, URL -> 해시는 메타 파일로 관리
+#   raw_cache/objects/ab/abcdef...   원본 바이트
+#   raw_cache/urls/<sha1(url)>.json  {"sha256", "etag", "last_modified", "checked_at"}
+# ---------------------------------------------------------
+def _object_path(digest, cache_dir):
+    return os.path.join(cache_dir, 'objects', digest[:2], digest)
+
+def _meta_path(url, cache_dir):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, 'urls', f"{key}.json")
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _read_cached(url, cache_dir):
+    """(meta, content) 또는 (None, None)"""
+    try:
+        with open(_meta_path(url, cache_dir), encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(_object_path(meta['sha256'], cache_dir), 'rb') as f:
+            return meta, f.read()
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+def _save_meta(url, meta, cache_dir):
+    _write_atomic(_meta_path(url, cache_dir), json.dumps(meta).encode('utf-8'))
+
+def _store(url, response, cache_dir):
+    content = response.content
+    digest = hashlib.sha256(content).hexdigest()
+    object_path = _object_path(digest, cache_dir)
+    if not os.path.exists(object_path):
+        _write_atomic(object_path, content)
+
+    _save_meta(url, {
+        "sha256": digest,
+        "etag": response.headers.get('ETag'),
+        "last_modified": response.headers.get('Last-Modified'),
+        "checked_at": time.time(),
+    }, cache_dir)
+    return content
+
+def discard_cached(url, cache_dir=RAW_CACHE_DIR):
+    """
+    처리가 끝난 원본을 캐시에서 지운다. (같은 내용을 가리키는 다른 URL 이 있으면 그 URL 은 다음에 다시 받는다)
+    """
+    try:
+        with open(_meta_path(url, cache_dir), encoding='utf-8') as f:
+            digest = json.load(f)['sha256']
+    except (OSError, ValueError, KeyError):
+        return
+    for path in (_object_path(digest, cache_dir), _meta_path(url, cache_dir)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def remove_legacy_cache():
+    """예전 버전이 static/raw_imgs 에 둔 원본 캐시를 지운다 (공개 서빙 폴더라서). Returns: 지웠으면 True"""
+    if os.path.abspath(RAW_CACHE_DIR) == os.path.abspath(LEGACY_RAW_CACHE_DIR) or not os.path.isdir(LEGACY_RAW_CACHE_DIR):
+        return False
+    shutil.rmtree(LEGACY_RAW_CACHE_DIR, ignore_errors=True)
+    print(f"🧹 예전 원본 이미지 캐시 삭제: {LEGACY_RAW_CACHE_DIR}")
+    return True
+
+# ---------------------------------------------------------
+# [다운로드] 단건 / 다건(동시)
+# ---------------------------------------------------------
+def fetch_image(url, timeout=10, max_age=RAW_CACHE_MAX_AGE, cache_dir=RAW_CACHE_DIR):
+    """
+    원본 이미지 바이트를 반환. 실패 시 None.
+    - 캐시가 max_age 이내면 네트워크 없이 반환
+    - 오래된 캐시는 ETag / Last-Modified 로 조건부 요청 (304면 캐시 재사용)
+    - 네트워크 오류 시 오래된 캐시라도 있으면 그대로 사용
+    """
+    meta, cached = _read_cached(url, cache_dir)
+    if cached is not None and time.time() - meta.get('checked_at', 0) < max_age:
+        return cached
+
+    headers = {}
+    if cached is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    try:
+        response = get_session().get(url, headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        print(f"   ⚠️ 이미지 다운로드 에러: {e}")
+        return cached
+
+    if response.status_code == 304 and cached is not None:
+        meta['checked_at'] = time.time()
+        _save_meta(url, meta, cache_dir)
+        return cached
+    if response.status_code == 200:
+        return _store(url, response, cache_dir)
+    return cached
+
+def fetch_many(urls, max_workers=FETCH_WORKERS, deadline=FETCH_DEADLINE, cache_dir=RAW_CACHE_DIR):
+    """
+    여러 이미지를 제한된 동시성으로 내려받는다. deadline 안에 끝나지 않은 URL은 None.
+    전체 소요 시간이 각 다운로드 시간의 합이 아니라 최댓값 수준이 된다.
+
+    Returns:
+        {url: bytes 또는 None}
+    """
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return {}
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)))
+    futures = {executor.submit(fetch_image, url, deadline, RAW_CACHE_MAX_AGE, cache_dir): url for url in urls}
+    done, _ = wait(futures, timeout=deadline)
+    # 제한 시간을 넘긴 다운로드는 기다리지 않는다 (진행 중인 것은 끝나면 캐시에만 저장됨)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = {url: None for url in urls}
+    for future in done:
+        try:
+            results[futures[future]] = future.result()
+        except Exception as e:
+            print(f"   ⚠️ 이미지 다운로드 에러: {e}")
+    return results
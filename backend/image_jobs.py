@@ -0,0 +1,327 @@
+import os
+import time
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from PIL import Image
+
+try:
+    import fcntl  # 프로세스 간 파일 잠금 (Windows에서는 프로세스 내 잠금만 사용)
+except ImportError:
+    fcntl = None
+
+from image_fetch import discard_cached, fetch_image, fetch_many
+from image_variants import write_variants
+from image_store import PROCESSED_META_DIR, LOCK_DIR
+from metrics import REGISTRY, STAGE_SECONDS
+
+# [설정]
+REMBG_MODEL = os.getenv('REMBG_MODEL', 'u2net')
+REMBG_WORKERS = int(os.getenv('REMBG_WORKERS', '2'))
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv('SINGLE_FLIGHT_TIMEOUT', '60'))  # 다른 호출자의 처리를 기다리는 최대 시간(초)
+IMAGE_RETRY_BACKOFF = float(os.getenv('IMAGE_RETRY_BACKOFF', '300'))  # 실패한 상품을 다시 작업 대상으로 삼기까지(초)
+
+# 작업 상태
+STATUS_READY = 'ready'      # 누끼 이미지 준비 완료
+STATUS_PENDING = 'pending'  # 백그라운드 처리 중 (원본 이미지로 응답)
+STATUS_FAILED = 'failed'    # 다운로드/누끼 실패 (원본 이미지 유지)
+
+IMAGE_JOBS = REGISTRY.counter('image_jobs_total', '누끼 작업 결과 (fetch_failed / submit_failed / rembg_failed / ready)', ['result'])
+
+# ---------------------------------------------------------
+# [워커 프로세스] rembg 세션은 워커당 1번만 생성해서 재사용
+# ---------------------------------------------------------
+_session = None
+
+def _init_worker(model_name, intra_op_threads=0):
+    """intra_op_threads > 0 이면 onnxruntime 연산 스레드 수를 제한 (프로세스 수 x 스레드 수 조절용)"""
+    global _session
+    import onnxruntime as ort
+    from rembg import new_session
+
+    sess_opts = ort.SessionOptions()
+    if intra_op_threads > 0:
+        sess_opts.intra_op_num_threads = intra_op_threads
+        sess_opts.inter_op_num_threads = 1
+    _session = new_session(model_name, sess_opts=sess_opts)
+
+# ---------------------------------------------------------
+# [Single-flight] 같은 결과 파일은 한 번에 한 곳에서만 생성
+#   - 프로세스 내: 경로별 threading.Lock (참조 카운트로 정리)
+#   - 프로세스 간: <lock_dir>/<파일명>.lock 에 flock (공개로 서빙되는 이미지 폴더 밖, image_store 메타데이터 폴더)
+# ---------------------------------------------------------
+_flight_locks = {}  # {save_path: [threading.Lock, 참조 수]}
+_flight_guard = threading.Lock()
+
+@contextmanager
+def single_flight(save_path, timeout=SINGLE_FLIGHT_TIMEOUT, lock_dir=None):
+    """
+    save_path 생성 권한을 얻으면 True, timeout 안에 얻지 못하면 False를 넘긴다.
+    권한을 얻은 뒤에는 다른 호출자가 이미 파일을 만들었는지 다시 확인해야 한다.
+    """
+    with _flight_guard:
+        entry = _flight_locks.setdefault(save_path, [threading.Lock(), 0])
+        entry[1] += 1
+    thread_lock = entry[0]
+
+    lock_file = None
+    thread_acquired = thread_lock.acquire(timeout=timeout)
+    acquired = thread_acquired
+    try:
+        if thread_acquired and fcntl is not None:
+            lock_dir = lock_dir or os.path.join(PROCESSED_META_DIR, LOCK_DIR)
+            os.makedirs(lock_dir, exist_ok=True)
+            lock_file = open(os.path.join(lock_dir, os.path.basename(save_path) + '.lock'), 'w')
+
+            deadline = time.time() + timeout
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.time() >= deadline:
+                        acquired = False
+                        break
+                    time.sleep(0.05)
+
+        yield acquired
+    finally:
+        if lock_file is not None:
+            lock_file.close()  # flock 해제
+        if thread_acquired:
+            thread_lock.release()
+        with _flight_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                _flight_locks.pop(save_path, None)
+
+def save_png_atomic(image, save_path):
+    """임시 파일에 쓴 뒤 rename -> 읽는 쪽은 완성된 PNG만 보게 된다."""
+    tmp_path = os.path.join(os.path.dirname(save_path),
+                            f".{os.path.basename(save_path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        image.save(tmp_path, format="PNG")
+        os.replace(tmp_path, save_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def process_and_save_image(image_url, save_path, session=None, timings=None, lock_dir=None):
+    """
+    이미지를 받아 배경을 제거하고 축소본(WebP 등) + PNG로 저장한다. 성공 여부를 반환.
+    원본은 image_fetch 의 디스크 캐시를 거치므로, 미리 받아 둔 이미지는 다시 내려받지 않는다. (PNG 가 생기면 원본은 지움)
+    같은 상품을 여러 요청/프로세스가 동시에 처리하려 하면 한 곳만 추론하고 나머지는 결과를 기다린다.
+    timings 에 dict 를 넘기면 단계별 소요 시간(초)을 채운다. ('image_download', 'rembg', 'image_variants')
+    """
+    from rembg import remove
+    try:
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)  # shard 폴더
+        with single_flight(save_path, lock_dir=lock_dir) as acquired:
+            if os.path.exists(save_path):
+                discard_cached(image_url)  # 다른 곳에서 처리 완료 -> 미리 받아 둔 원본은 필요 없음
+                return True
+            if not acquired:
+                # 다른 호출자가 아직 처리 중 -> 원본 이미지로 대체
+                return False
+
+            t = time.perf_counter()
+            content = fetch_image(image_url)
+            if timings is not None:
+                timings['image_download'] = time.perf_counter() - t
+            if content is None:
+                return False
+
+            t = time.perf_counter()
+            input_image = Image.open(BytesIO(content)).convert("RGBA")
+            output_image = remove(input_image, session=session or _session)
+            if timings is not None:
+                timings['rembg'] = time.perf_counter() - t
+
+            # 축소본을 먼저 쓰고 PNG 는 마지막에 (PNG 가 보이면 축소본도 있음). 실패해도 PNG 는 저장
+            t = time.perf_counter()
+            try:
+                write_variants(output_image, save_path)
+            except Exception as e:
+                print(f"   ⚠️ 축소본 생성 실패: {e}")
+            save_png_atomic(output_image, save_path)
+            discard_cached(image_url)
+            if timings is not None:
+                timings['image_variants'] = time.perf_counter() - t
+            return True
+    except Exception as e:
+        print(f"   ⚠️ 누끼 에러: {e}")
+        return False
+
+def _timed_job(image_url, save_path, lock_dir=None):
+    # 워커 프로세스의 지표는 메인 프로세스로 보이지 않으므로 소요 시간을 결과와 함께 돌려준다
+    timings = {}
+    return process_and_save_image(image_url, save_path, timings=timings, lock_dir=lock_dir), timings
+
+# ---------------------------------------------------------
+# [메인 프로세스] product_id 단위 작업 테이블 + 프로세스 풀
+# ---------------------------------------------------------
+class ImageJobQueue:
+    """
+    누끼 작업을 백그라운드 프로세스 풀로 넘기고 product_id별 상태를 추적한다.
+    요청 스레드는 submit() 후 바로 반환되며, 완료 여부는 status()로 조회한다.
+    처리 완료 여부는 파일 대신 store(image_store.ProcessedImageStore) 색인으로 판단한다.
+    """
+
+    def __init__(self, store, max_workers=REMBG_WORKERS, model_name=REMBG_MODEL, retry_backoff=IMAGE_RETRY_BACKOFF):
+        self.store = store
+        self.max_workers = max_workers
+        self.model_name = model_name
+        self.retry_backoff = retry_backoff
+        self._executor = None
+        self._prefetcher = None
+        self._jobs = {}       # {product_id: status} (처리 중 / 실패. 완료되면 store 로 넘어간다)
+        self._failed_at = {}  # {product_id: 실패 시각(monotonic)} -> retry_backoff 가 지나면 다시 등록
+        self._issued = set()  # 추천 응답에 내보낸 상품 (작업을 등록할 수 있는 상품, 카탈로그 크기 이하)
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # 첫 작업 때 풀 생성 (spawn: Flask 프로세스의 스레드/소켓 상태를 복제하지 않도록)
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.model_name,),
+            )
+        return self._executor
+
+    def _get_prefetcher(self):
+        # 응답 단위 원본 다운로드를 요청 스레드 밖에서 돌리는 스레드
+        if self._prefetcher is None:
+            self._prefetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-prefetch')
+        return self._prefetcher
+
+    def submit(self, product_id, image_url, save_path):
+        return self.submit_many([(product_id, image_url, save_path)])[product_id]
+
+    def submit_many(self, jobs, issue=True):
+        """
+        응답 1건에 필요한 이미지들을 한 번에 등록한다.
+        저장소 색인에 있으면 ready, 없으면 작업을 등록(중복 등록 없음)하고 현재 상태를 반환.
+        색인에도 작업 테이블에도 없는 상품만 파일을 1번 확인한다. (다른 프로세스가 만든 이미지)
+        실패한 상품은 retry_backoff 가 지난 뒤 다시 등록한다.
+
+        Args:
+            jobs: [(product_id, image_url, save_path), ...]
+            issue: True 면 추천 응답에 내보내는 상품으로 기록. False(상태 조회)면 이미 내보낸 상품만 작업을 등록하고,
+                   나머지는 상태만 알려 준다 (다른 워커가 내보낸 상품일 수 있으므로 pending)
+
+        Returns:
+            {product_id: status}
+        """
+        statuses = {}
+        new_jobs = []
+        now = time.monotonic()
+        for product_id, image_url, save_path in jobs:
+            if self.store.contains(product_id):
+                statuses[product_id] = STATUS_READY
+                continue
+
+            with self._lock:
+                known = product_id in self._jobs
+            if not known and os.path.exists(save_path) and self.store.add(product_id):
+                statuses[product_id] = STATUS_READY
+                continue
+
+            with self._lock:
+                if issue:
+                    self._issued.add(product_id)
+                status = self._jobs.get(product_id)
+                retry = status == STATUS_FAILED and now - self._failed_at.get(product_id, now) >= self.retry_backoff
+                if (status is None or retry) and product_id in self._issued:
+                    status = STATUS_PENDING
+                    self._jobs[product_id] = status
+                    self._failed_at.pop(product_id, None)
+                    new_jobs.append((product_id, image_url, save_path))
+            statuses[product_id] = status or STATUS_PENDING
+
+        if new_jobs:
+            self._get_prefetcher().submit(self._prefetch_and_submit, new_jobs)
+        return statuses
+
+    def _prefetch_and_submit(self, jobs):
+        # 원본을 동시에 내려받아 캐시에 채운 뒤 누끼 작업을 프로세스 풀로 넘김
+        # 이 함수는 프리페치 스레드에서 돌아 예외가 future 에 묻히므로, 풀로 넘기지 못한 상품은 어떤 오류든
+        # 실패로 기록한다 (pending 으로 남지 않고 retry_backoff 뒤 다시 등록됨)
+        unsubmitted = {product_id for product_id, _, _ in jobs}
+        try:
+            with STAGE_SECONDS.time(stage='image_download'):
+                fetched = fetch_many([image_url for _, image_url, _ in jobs])
+            for product_id, image_url, save_path in jobs:
+                if fetched.get(image_url) is None:
+                    IMAGE_JOBS.inc(result='fetch_failed')
+                    unsubmitted.discard(product_id)
+                    self._fail(product_id)
+                    continue
+
+                try:
+                    future = self._submit_job(image_url, save_path)
+                except Exception as e:
+                    print(f"   ⚠️ 누끼 작업 등록 실패 (ID: {product_id}): {e}")
+                    IMAGE_JOBS.inc(result='submit_failed')
+                    unsubmitted.discard(product_id)
+                    self._fail(product_id)
+                    continue
+                future.add_done_callback(lambda f, pid=product_id: self._on_done(pid, f))
+                unsubmitted.discard(product_id)
+        except Exception as e:
+            print(f"   ⚠️ 원본 이미지 프리페치 실패 ({len(unsubmitted)}건): {e}")
+        finally:
+            for product_id in unsubmitted:
+                self._fail(product_id)
+
+    def _submit_job(self, image_url, save_path):
+        try:
+            return self._get_executor().submit(_timed_job, image_url, save_path, self.store.lock_dir())
+        except BrokenProcessPool:
+            # 워커가 비정상 종료된 풀은 버리고 새로 만든다
+            self._executor = None
+            return self._get_executor().submit(_timed_job, image_url, save_path, self.store.lock_dir())
+
+    def _on_done(self, product_id, future):
+        try:
+            success, timings = future.result()
+        except Exception as e:
+            print(f"   ⚠️ 누끼 작업 실패 (ID: {product_id}): {e}")
+            success, timings = False, {}
+
+        # 원본은 미리 받아 두었으므로 워커의 다운로드 시간은 캐시 읽기 -> rembg 만 기록
+        for stage in ('rembg', 'image_variants'):
+            if stage in timings:
+                STAGE_SECONDS.observe(timings[stage], stage=stage)
+        IMAGE_JOBS.inc(result='ready' if success else 'rembg_failed')
+
+        # 완료된 상품은 저장소 색인으로 옮긴다 (나중에 예산 초과로 지워지면 다시 작업 대상이 됨)
+        if success and self.store.add(product_id):
+            with self._lock:
+                self._jobs.pop(product_id, None)
+        else:
+            self._fail(product_id)
+
+    def _fail(self, product_id):
+        with self._lock:
+            self._jobs[product_id] = STATUS_FAILED
+            self._failed_at[product_id] = time.monotonic()
+
+    def status(self, product_id):
+        if self.store.contains(product_id, touch=False):
+            return STATUS_READY
+        with self._lock:
+            return self._jobs.get(product_id)
+
+    def shutdown(self):
+        if self._prefetcher is not None:
+            self._prefetcher.shutdown(wait=False, cancel_futures=True)
+            self._prefetcher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,433 @@
+import os
+import re
+import json
+import time
+import atexit
+import shutil
+import hashlib
+import argparse
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+
+try:
+    import fcntl  # 프로세스 간 파일 잠금 (Windows에서는 프로세스 내 잠금만 사용)
+except ImportError:
+    fcntl = None
+
+from image_variants import read_manifest
+from metrics import REGISTRY
+
+# [설정]
+PROCESSED_MAX_MB = int(os.getenv('PROCESSED_MAX_MB', '10240'))             # 누끼 이미지 디스크 예산 (0이면 무제한)
+PROCESSED_INDEX_SAVE_INTERVAL = int(os.getenv('PROCESSED_INDEX_SAVE_INTERVAL', '60'))  # 색인 동기화 주기(초)
+# 색인 / 잠금 / 실패 기록 등 메타데이터 폴더. 공개로 서빙되는 누끼 이미지 폴더(static/) 밖에 둔다
+PROCESSED_META_DIR = os.getenv('PROCESSED_META_DIR', os.path.join(os.getcwd(), 'processed_meta'))
+EVICT_TARGET = 0.9  # 예산을 넘으면 이 비율까지 줄인다 (매번 조금씩 지우지 않도록)
+INDEX_FILE = 'index.json'
+INDEX_LOCK_FILE = 'index.lock'
+LOCK_DIR = 'locks'  # image_jobs.single_flight 의 상품별 잠금 파일
+LEGACY_META = ('index.json', 'precut_failures.json')  # 예전에 이미지 폴더 안에 두던 메타데이터
+
+STORE_IMAGES = REGISTRY.gauge('processed_images', '누끼 이미지 저장소 상품 수')
+STORE_BYTES = REGISTRY.gauge('processed_images_bytes', '누끼 이미지 저장소 크기 (PNG + 축소본 + 목록)')
+STORE_EVICTIONS = REGISTRY.counter('processed_image_evictions_total', '디스크 예산 초과로 지운 상품 수')
+
+# nobg_<id>.png / nobg_<id>.json / nobg_<id>_<가로>w.<해시>.<포맷>
+FILE_NAME = re.compile(r'^nobg_(\d+)(?:\.png|\.json|_\d+w\.[0-9a-f]+\.\w+)$')
+
+def shard_of(product_id):
+    """상품 ID -> 하위 폴더 이름 (md5 앞 2자리, 256개로 고르게)"""
+    return hashlib.md5(str(int(product_id)).encode('ascii')).hexdigest()[:2]
+
+def product_of(relpath):
+    """서빙 경로 '<shard>/nobg_<id>...' -> product_id (저장소 이미지 파일 경로가 아니면 None)"""
+    shard, _, name = relpath.replace(os.sep, '/').partition('/')
+    match = FILE_NAME.match(name)
+    if match is None or shard != shard_of(match.group(1)):
+        return None
+    return int(match.group(1))
+
+# ---------------------------------------------------------
+# [누끼 이미지 저장소] <root>/<shard>/nobg_<id>.* + 메모리 색인
+#   - 색인: {product_id: [바이트 수, 축소본 목록(처음 필요할 때 읽음)]} 를 마지막 사용 순서(OrderedDict)로 유지
+#     -> 요청 경로의 존재 확인 / 마지막 사용 갱신은 시스템 호출 없이 dict 조회만
+#   - 공유 색인 <meta_dir>/index.json 은 모든 워커 / precut.py 가 같이 쓴다
+#     동기화 스레드가 주기적으로(+ 예산 초과 시 바로, 종료 시) flock 을 잡고 공유 색인에 이 프로세스가 쓴 / 지운 상품을 합친 뒤
+#     예산을 넘으면 합친 색인 기준으로 오래 쓰이지 않은 상품의 PNG / 축소본 / 목록을 지우고 저장한다
+#     -> 삭제와 색인 저장은 잠금을 잡은 한 프로세스만 하고, 나머지 워커는 다음 동기화 때 결과를 받아 온다
+#   - 시작 시 공유 색인을 읽고, 색인보다 나중에 바뀐 shard 폴더만 다시 훑어 맞춘다 (색인이 없으면 전체 재구성)
+#   동기화 사이에 다른 프로세스가 지운 파일은 이 프로세스 색인에 남아 있을 수 있으므로
+#   서빙할 때 파일이 없으면 verify() 로 색인에서 빼 다시 작업 대상이 되게 한다
+# ---------------------------------------------------------
+class ProcessedImageStore:
+    def __init__(self, root, max_bytes=PROCESSED_MAX_MB * 1024 * 1024, meta_dir=PROCESSED_META_DIR):
+        self.root = root
+        self.meta_dir = meta_dir
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # product_id -> [bytes, manifest]
+        self._total = 0
+        self._touched = OrderedDict()  # 마지막 동기화 이후 이 프로세스가 쓰거나 만든 상품 (사용 순서)
+        self._removed = set()          # 마지막 동기화 이후 이 프로세스가 지운 상품
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._saver = None
+        self._wake = threading.Event()  # 예산 초과 시 동기화 스레드를 주기보다 먼저 깨운다
+        os.makedirs(root, exist_ok=True)
+        os.makedirs(meta_dir, exist_ok=True)
+
+    # ----- [경로] -----
+    def relpath(self, product_id):
+        """URL / 디스크 공용 상대 경로: '<shard>/nobg_<id>.png'"""
+        return f"{shard_of(product_id)}/nobg_{int(product_id)}.png"
+
+    def path(self, product_id):
+        return os.path.join(self.root, shard_of(product_id), f"nobg_{int(product_id)}.png")
+
+    def lock_dir(self):
+        """상품별 처리 잠금 파일 폴더 (image_jobs.single_flight)"""
+        return os.path.join(self.meta_dir, LOCK_DIR)
+
+    def _mark(self, product_id):
+        # self._lock 안에서 호출
+        self._touched[product_id] = None
+        self._touched.move_to_end(product_id)
+        self._removed.discard(product_id)
+
+    def _unmark(self, product_id):
+        # self._lock 안에서 호출
+        self._touched.pop(product_id, None)
+        self._removed.add(product_id)
+
+    # ----- [조회] -----
+    def contains(self, product_id, touch=True):
+        """처리된 이미지가 있는지 (파일 확인 없음). touch=True 면 마지막 사용으로 표시"""
+        with self._lock:
+            if product_id not in self._entries:
+                return False
+            if touch:
+                self._entries.move_to_end(product_id)
+                self._mark(product_id)
+            return True
+
+    def verify(self, product_id):
+        """
+        서빙할 파일이 없을 때 호출: PNG 가 정말 없으면 (다른 프로세스가 지움) 색인에서 빼고 False.
+        색인에서 빠진 상품은 다음 요청에서 다시 작업 대상이 된다.
+        """
+        if os.path.exists(self.path(product_id)):
+            return True
+        with self._lock:
+            entry = self._entries.pop(product_id, None)
+            if entry is not None:
+                self._total -= entry[0]
+            self._unmark(product_id)
+        self._update_metrics()
+        return False
+
+    def manifest(self, product_id):
+        """축소본 목록 (없으면 None). 처음 한 번만 목록 파일을 읽는다."""
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is None:
+                return None
+            if entry[1] is not None:
+                return entry[1]
+        manifest = read_manifest(self.path(product_id))
+        if manifest is not None:
+            with self._lock:
+                entry = self._entries.get(product_id)
+                if entry is not None:
+                    entry[1] = manifest
+        return manifest
+
+    # ----- [등록 / 삭제] -----
+    def _files(self, product_id, manifest=None):
+        """상품의 파일 경로 (PNG, 목록, 축소본)"""
+        png = self.path(product_id)
+        manifest = manifest or read_manifest(png)
+        folder = os.path.dirname(png)
+        names = [name for entries in (manifest or {}).get('variants', {}).values() for _, name in entries]
+        return [png, os.path.splitext(png)[0] + '.json'] + [os.path.join(folder, name) for name in names]
+
+    def add(self, product_id):
+        """
+        새로 만든(또는 다른 프로세스가 만든) 이미지를 색인에 넣는다. PNG 가 없으면 False.
+        예산을 넘으면 동기화 스레드를 깨울 뿐, 삭제 / 색인 저장은 호출한 (요청) 스레드에서 하지 않는다.
+        (동기화 스레드가 없으면 다음 sync() 때 지움)
+        """
+        manifest = read_manifest(self.path(product_id))
+        size = 0
+        for file_path in self._files(product_id, manifest):
+            try:
+                size += os.path.getsize(file_path)
+            except OSError:
+                if file_path.endswith('.png'):
+                    return False
+        with self._lock:
+            previous = self._entries.pop(product_id, None)
+            if previous is not None:
+                self._total -= previous[0]
+            self._entries[product_id] = [size, manifest]
+            self._total += size
+            self._mark(product_id)
+            over_budget = 0 < self.max_bytes < self._total
+        if over_budget:
+            self._wake.set()
+        self._update_metrics()
+        return True
+
+    def _evict(self, entries):
+        """
+        entries(공유 색인과 합친 색인)에서 예산을 넘는 만큼 오래 쓰이지 않은 상품을 빼고 파일을 지운다.
+        색인 파일 잠금 안에서만 호출한다. Returns: 지운 product_id 집합
+        """
+        total = sum(entry[0] for entry in entries.values())
+        if self.max_bytes <= 0 or total <= self.max_bytes:
+            return set()
+        target = self.max_bytes * EVICT_TARGET
+        victims = []
+        # 가장 최근에 쓴 상품(맨 뒤)은 남긴다
+        while total > target and len(entries) > 1:
+            product_id, (size, manifest) = entries.popitem(last=False)
+            total -= size
+            victims.append((product_id, manifest))
+        for product_id, manifest in victims:
+            self._remove_files(product_id, manifest)
+        STORE_EVICTIONS.inc(len(victims))
+        print(f"🧹 누끼 이미지 {len(victims)}개 삭제 (디스크 예산 {self.max_bytes // (1024 * 1024)}MB)")
+        return {product_id for product_id, _ in victims}
+
+    def _remove_files(self, product_id, manifest=None):
+        for file_path in self._files(product_id, manifest):
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+
+    def discard(self, product_id):
+        """색인과 파일에서 상품을 지운다 (재처리 등)"""
+        with self._lock:
+            entry = self._entries.pop(product_id, None)
+            if entry is not None:
+                self._total -= entry[0]
+            self._unmark(product_id)
+        self._remove_files(product_id, entry[1] if entry else None)
+        self._update_metrics()
+
+    def clear(self):
+        """모든 누끼 이미지와 색인(공유 색인 포함)을 지운다. Returns: 지운 상품 수"""
+        with self._lock:
+            entries = list(self._entries.items())
+            self._entries.clear()
+            self._total = 0
+            for product_id, _ in entries:
+                self._unmark(product_id)
+        for product_id, (_, manifest) in entries:
+            self._remove_files(product_id, manifest)
+        self.sync()
+        return len(entries)
+
+    # ----- [공유 색인 동기화] -----
+    def _index_path(self):
+        return os.path.join(self.meta_dir, INDEX_FILE)
+
+    @contextmanager
+    def _index_lock(self):
+        """공유 색인 읽기-합치기-삭제-저장은 한 번에 한 프로세스(스레드)만"""
+        with self._sync_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.meta_dir, INDEX_LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)  # 파일을 닫으면 해제
+                yield
+
+    def _read_index(self):
+        """공유 색인 [[product_id, bytes], ...] (마지막 사용 순서)와 저장 시각. 없으면 (None, 0.0)"""
+        try:
+            with open(self._index_path(), encoding='utf-8') as f:
+                data = json.load(f)
+            return [(int(product_id), size) for product_id, size in data["entries"]], os.path.getmtime(self._index_path())
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, 0.0
+
+    def _write_index(self, entries):
+        rows = [[product_id, entry[0]] for product_id, entry in entries.items()]
+        tmp_path = f"{self._index_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"saved_at": time.time(), "entries": rows}, f)
+        os.replace(tmp_path, self._index_path())
+
+    def _adopt(self, entries, victims):
+        """합친 색인을 이 프로세스 색인으로. 합치는 동안 생긴 변경(새로 쓴 / 지운 상품)은 그대로 둔다"""
+        with self._lock:
+            for product_id in self._removed:
+                entries.pop(product_id, None)
+            for product_id in self._touched:
+                entry = self._entries.get(product_id)
+                if entry is not None and product_id not in victims:
+                    entries[product_id] = entry
+                    entries.move_to_end(product_id)
+            self._entries = entries
+            self._total = sum(entry[0] for entry in entries.values())
+        self._update_metrics()
+
+    def sync(self):
+        """
+        공유 색인에 이 프로세스의 변경을 합치고, 예산을 넘으면 오래 쓰이지 않은 상품을 지운 뒤 저장한다.
+        합친 결과(다른 워커가 만든 / 지운 상품 포함)가 이 프로세스의 색인이 된다.
+        """
+        with self._index_lock():
+            saved, _ = self._read_index()
+            with self._lock:
+                touched, self._touched = self._touched, OrderedDict()
+                removed, self._removed = self._removed, set()
+                if saved is None:
+                    entries = OrderedDict((product_id, list(entry)) for product_id, entry in self._entries.items())
+                else:
+                    entries = OrderedDict()
+                    for product_id, size in saved:
+                        if product_id not in removed:
+                            entry = self._entries.get(product_id)
+                            entries[product_id] = [size, entry[1] if entry else None]
+                    # 이 프로세스가 쓴 상품은 가장 최근 사용으로
+                    for product_id in touched:
+                        entry = self._entries.get(product_id)
+                        if entry is not None:
+                            entries[product_id] = list(entry)
+                            entries.move_to_end(product_id)
+            victims = self._evict(entries)
+            if saved is None or touched or removed or victims:
+                self._write_index(entries)
+        self._adopt(entries, victims)
+
+    def _scan_shard(self, shard):
+        """shard 폴더를 훑어 {product_id: (bytes, 최근 수정 시각)}"""
+        found = {}
+        try:
+            with os.scandir(os.path.join(self.root, shard)) as it:
+                for entry in it:
+                    if entry.name == '.locks' and entry.is_dir():
+                        # 예전 버전이 이미지 폴더 안에 만든 잠금 파일 폴더
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                        continue
+                    match = FILE_NAME.match(entry.name)
+                    if match is None or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    size, mtime, has_png = found.get(int(match.group(1)), (0, 0.0, False))
+                    found[int(match.group(1))] = (size + stat.st_size, max(mtime, stat.st_mtime),
+                                                  has_png or entry.name.endswith('.png'))
+        except FileNotFoundError:
+            pass
+        # PNG 없이 남은 축소본(처리 중 / 삭제 중)은 색인에 넣지 않는다
+        return {product_id: (size, mtime) for product_id, (size, mtime, has_png) in found.items() if has_png}
+
+    def _migrate_flat(self):
+        """
+        예전 평면 구조(<root>/nobg_*)의 파일을 shard 폴더로, 이미지 폴더 안의 색인 / 실패 기록은 meta_dir 로 옮긴다.
+        Returns: 옮긴 파일 수
+        """
+        moved = 0
+        for name in LEGACY_META:
+            legacy_path = os.path.join(self.root, name)
+            if os.path.exists(legacy_path):
+                if not os.path.exists(os.path.join(self.meta_dir, name)):
+                    os.replace(legacy_path, os.path.join(self.meta_dir, name))
+                else:
+                    os.remove(legacy_path)
+        shutil.rmtree(os.path.join(self.root, '.locks'), ignore_errors=True)
+
+        with os.scandir(self.root) as it:
+            flat = [entry.name for entry in it if entry.is_file() and FILE_NAME.match(entry.name)]
+        for name in flat:
+            shard = shard_of(FILE_NAME.match(name).group(1))
+            os.makedirs(os.path.join(self.root, shard), exist_ok=True)
+            os.replace(os.path.join(self.root, name), os.path.join(self.root, shard, name))
+            moved += 1
+        return moved
+
+    def load(self, rebuild=False):
+        """
+        저장된 색인을 읽고 디스크와 맞춘다.
+        색인이 없거나 rebuild=True 면 전체 shard 를, 아니면 색인 저장 이후 바뀐 shard 만 다시 훑는다.
+        """
+        start = time.perf_counter()
+        with self._index_lock():
+            entries, moved, shards = self._load_locked(rebuild)
+            victims = self._evict(entries)
+            self._write_index(entries)
+        with self._lock:
+            self._touched.clear()
+            self._removed.clear()
+        self._adopt(entries, victims)
+        print(f"✅ 누끼 이미지 색인: {len(entries)}개 / {self._total / (1024 * 1024):.1f}MB "
+              f"(다시 훑은 폴더 {len(shards)}개, 옮긴 파일 {moved}개, {time.perf_counter() - start:.2f}초)")
+
+    def _load_locked(self, rebuild):
+        moved = self._migrate_flat()
+        saved, saved_at = (None, 0.0) if rebuild else self._read_index()
+        if saved is None:
+            saved, rebuild = [], True
+
+        shards = [f"{i:02x}" for i in range(256)]
+        if not rebuild:
+            # 폴더 mtime 은 파일이 생기거나 지워질 때 바뀐다
+            shards = [shard for shard in shards
+                      if os.path.isdir(os.path.join(self.root, shard))
+                      and os.path.getmtime(os.path.join(self.root, shard)) >= saved_at]
+        rescanned = set(shards)
+
+        scanned = {}
+        for shard in shards:
+            scanned.update(self._scan_shard(shard))
+
+        # 색인에 있던 상품은 저장된 순서 그대로 (다시 훑은 shard 는 디스크에 남은 것만, 크기는 새로 잰 값)
+        entries = OrderedDict()
+        for product_id, size in saved:
+            if shard_of(product_id) not in rescanned:
+                entries[product_id] = [size, None]
+            elif product_id in scanned:
+                entries[product_id] = [scanned.pop(product_id)[0], None]
+        # 색인 저장 이후 다른 프로세스가 만든 상품은 가장 최근 사용으로 (파일 수정 시각 순)
+        for product_id in sorted(scanned, key=lambda pid: scanned[pid][1]):
+            entries[product_id] = [scanned[product_id][0], None]
+        return entries, moved, shards
+
+    def start_saver(self, interval=PROCESSED_INDEX_SAVE_INTERVAL):
+        """interval(초)마다 (예산을 넘으면 바로) 공유 색인과 동기화하고, 종료 시에도 동기화"""
+        atexit.register(self.sync)
+        if self._saver is not None or interval <= 0:
+            return
+
+        def run():
+            while True:
+                self._wake.wait(interval)
+                self._wake.clear()
+                try:
+                    self.sync()
+                except OSError as e:
+                    print(f"⚠️ 누끼 이미지 색인 동기화 실패: {e}")
+
+        self._saver = threading.Thread(target=run, name='image-store-saver', daemon=True)
+        self._saver.start()
+
+    def _update_metrics(self):
+        STORE_IMAGES.set(len(self._entries))
+        STORE_BYTES.set(self._total)
+
+    def stats(self):
+        with self._lock:
+            return {"images": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes}
+
+if __name__ == "__main__":
+    # 예전 평면 폴더 이전 + 색인 재구성 (서버가 꺼져 있을 때)
+    parser = argparse.ArgumentParser(description="누끼 이미지 저장소 색인을 디스크에서 다시 만듭니다.")
+    parser.add_argument('root', nargs='?', default=os.path.join('static', 'processed_imgs'))
+    parser.add_argument('--meta', default=PROCESSED_META_DIR, help="색인 / 잠금 파일 폴더 (서빙 폴더 밖)")
+    parser.add_argument('--max-mb', type=int, default=PROCESSED_MAX_MB, help="디스크 예산(MB), 넘으면 오래된 것부터 삭제 (0: 무제한)")
+    args = parser.parse_args()
+
+    store = ProcessedImageStore(args.root, max_bytes=args.max_mb * 1024 * 1024, meta_dir=args.meta)
+    store.load(rebuild=True)
@@ -0,0 +1,101 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from io import BytesIO
+
+from PIL import Image, features
+
+# [설정]
+# 누끼 이미지(nobg_<id>.png)를 만들 때 함께 만드는 축소본 가로 크기 / 포맷 / 품질
+IMAGE_VARIANT_WIDTHS = [int(w) for w in os.getenv('IMAGE_VARIANT_WIDTHS', '160,320,640').split(',') if w.strip()]
+IMAGE_VARIANT_FORMATS = [f.strip().lower() for f in os.getenv('IMAGE_VARIANT_FORMATS', 'webp').split(',') if f.strip()]
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', '80'))
+
+# 포맷 -> (Pillow 저장 이름, MIME, Pillow 지원 여부 확인 이름)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', 'webp'),
+    'avif': ('AVIF', 'image/avif', 'avif'),
+}
+# 내용 해시가 들어간 파일명 -> 내용이 바뀌면 이름도 바뀌므로 브라우저/CDN 이 영구 캐시해도 된다
+VARIANT_NAME = re.compile(r'^nobg_\d+_\d+w\.[0-9a-f]{10}\.(webp|avif)$')
+
+# ---------------------------------------------------------
+# [축소본] 누끼 PNG 옆에 가로 크기별 WebP(/AVIF) + 목록 파일(nobg_<id>.json)
+#   - 축소본과 목록을 먼저 쓰고 PNG 를 마지막에 저장하므로 ready(PNG 존재)이면 축소본도 있다
+#   - 목록이 없는 예전 PNG 는 원본 PNG 주소만 응답 (precut.py 가 나중에 채움)
+# ---------------------------------------------------------
+def enabled_formats():
+    """설정한 포맷 중 현재 Pillow 가 저장할 수 있는 것만"""
+    return [fmt for fmt in IMAGE_VARIANT_FORMATS if fmt in FORMATS and features.check(FORMATS[fmt][2])]
+
+def manifest_path(save_path):
+    return os.path.splitext(save_path)[0] + '.json'
+
+def is_immutable(filename):
+    return VARIANT_NAME.match(os.path.basename(filename)) is not None
+
+def _write_atomic(path, data):
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _variant_widths(width):
+    """원본보다 작은 설정 크기들 + (원본이 더 작으면) 원본 크기 1개. 확대는 하지 않는다."""
+    widths = sorted(w for w in set(IMAGE_VARIANT_WIDTHS) if 0 < w < width)
+    if len(widths) < len(set(IMAGE_VARIANT_WIDTHS)):
+        widths.append(width)
+    return widths
+
+def write_variants(image, save_path):
+    """
+    RGBA 누끼 이미지로 축소본을 만들고 목록 파일을 쓴다.
+
+    Returns:
+        목록 dict {"width", "height", "variants": {포맷: [[가로, 파일명], ...]}}
+    """
+    image = image.convert('RGBA')
+    base = os.path.splitext(os.path.basename(save_path))[0]
+    out_dir = os.path.dirname(save_path)
+    formats = enabled_formats()
+    variants = {}
+    for width in _variant_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            buf = BytesIO()
+            resized.save(buf, format=FORMATS[fmt][0], quality=IMAGE_VARIANT_QUALITY)
+            data = buf.getvalue()
+            name = f"{base}_{width}w.{hashlib.sha1(data).hexdigest()[:10]}.{fmt}"
+            _write_atomic(os.path.join(out_dir, name), data)
+            variants.setdefault(fmt, []).append([width, name])
+
+    manifest = {"width": image.width, "height": image.height, "variants": variants}
+    _write_atomic(manifest_path(save_path), json.dumps(manifest).encode('utf-8'))
+    return manifest
+
+def read_manifest(save_path):
+    try:
+        with open(manifest_path(save_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def ensure_variants(save_path):
+    """목록이 없는 기존 누끼 PNG 에 축소본을 만든다. (precut.py 백필용) Returns: 새로 만들었으면 True"""
+    if read_manifest(save_path) is not None or not os.path.exists(save_path):
+        return False
+    with Image.open(save_path) as image:
+        write_variants(image, save_path)
+    return True
+
+def srcsets(manifest, base_url):
+    """목록 -> {MIME: "url 160w, url 320w, ..."}"""
+    return {FORMATS[fmt][1]: ", ".join(f"{base_url}{name} {width}w" for width, name in entries)
+            for fmt, entries in manifest["variants"].items() if fmt in FORMATS}
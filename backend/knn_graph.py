@@ -0,0 +1,203 @@
+import os
+import time
+import argparse
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+
+from catalog import CATEGORY_MAP, is_catalog_dir, load_master_data, lookup_indices, save_optional_index
+from scoring import DEFAULT_WEIGHTS, prepare_queries, score_block, merge_candidates
+from db import database_url
+
+# backend 디렉토리의 .env 파일 로드
+load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
+
+# [설정]
+KNN_K = 50                # 상품당 카테고리별 이웃 수 (가격 필터 후에도 요청 k개가 남도록 여유 있게)
+KNN_BLOCK_ROWS = 256      # 워커 1건당 원본 상품 수
+KNN_COL_CHUNK = 65536     # 카테고리 구간을 나눠 계산하는 열 수 (메모리: 블록 x 청크 float32)
+
+# ---------------------------------------------------------
+# [오프라인] 워커: 원본 상품 블록 x 카테고리 구간 GEMM -> 카테고리별 상위 K
+# ---------------------------------------------------------
+_worker_data = None
+
+def _init_worker(catalog_dir):
+    # 워커마다 mmap으로 열기 때문에 행렬은 페이지 캐시를 공유한다
+    global _worker_data
+    _worker_data = load_master_data(catalog_dir)
+
+def _top_k(scores, indices, k):
+    """행마다 점수 상위 k개 (점수 내림차순). 열이 k보다 적으면 있는 만큼"""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(indices, np.take_along_axis(top, order, axis=1), axis=1), \
+        np.take_along_axis(top_scores, order, axis=1)
+
+def neighbor_block(data, source_rows, k):
+    """
+    Returns:
+        (idx, scores): (B, 카테고리 수, k) 전역 행 인덱스 / 점수. 빈 칸은 -1 / -inf
+    """
+    n_categories = len(CATEGORY_MAP)
+    offsets = data['index']['cat_offsets']
+    queries = prepare_queries(data, source_rows)
+
+    out_idx = np.full((len(source_rows), n_categories, k), -1, dtype=np.int64)
+    out_scores = np.full((len(source_rows), n_categories, k), -np.inf, dtype=np.float32)
+    for code in range(n_categories):
+        start, end = int(offsets[code]), int(offsets[code + 1])
+        best_idx = np.empty((len(source_rows), 0), dtype=np.int64)
+        best_scores = np.empty((len(source_rows), 0), dtype=np.float32)
+        for chunk_start in range(start, end, KNN_COL_CHUNK):
+            chunk_end = min(chunk_start + KNN_COL_CHUNK, end)
+            scores = score_block(data, queries, chunk_start, chunk_end)
+            # 자기 자신(score_block 에서 -1)은 이웃에서 제외
+            scores[source_rows[:, None] == np.arange(chunk_start, chunk_end)[None, :]] = -np.inf
+            chunk_idx = np.broadcast_to(np.arange(chunk_start, chunk_end), scores.shape)
+            best_idx, best_scores = _top_k(np.hstack([best_scores, scores]),
+                                           np.hstack([best_idx, chunk_idx]), k)
+
+        n = best_idx.shape[1]
+        out_idx[:, code, :n] = best_idx
+        out_scores[:, code, :n] = best_scores
+    out_idx[~np.isfinite(out_scores)] = -1
+    return out_idx, out_scores
+
+def _neighbor_task(task):
+    source_rows, k = task
+    return source_rows, neighbor_block(_worker_data, source_rows, k)
+
+# ---------------------------------------------------------
+# [오프라인] 그래프 생성 (CSR: 원본 상품 x 카테고리 -> 이웃 구간)
+# ---------------------------------------------------------
+def collect_representative_rows(data):
+    """representative_item 의 모든 대표 상품 행 번호"""
+    engine = create_engine(database_url())
+    rep_df = pd.read_sql("SELECT DISTINCT product_id FROM representative_item", engine)
+    rows, missing_ids = lookup_indices(data['index'], rep_df['product_id'].to_numpy())
+    if len(missing_ids):
+        print(f"⚠️ master_data에서 찾지 못한 대표 상품: {len(missing_ids)}개")
+    return rows
+
+def build_knn_graph(catalog_dir, scope='persona', k=KNN_K, workers=1, block_rows=KNN_BLOCK_ROWS):
+    """
+    scope 대상 상품마다 카테고리별 상위 k개 이웃(기본 가중치, 가격 필터 없음)을 구한다.
+
+    Returns:
+        {
+          sources (S,) 원본 상품 행 번호(오름차순),
+          offsets (S * 카테고리 수 + 1,) 원본 s, 카테고리 c의 이웃은 [offsets[s*C + c], offsets[s*C + c + 1]),
+          neighbor_idx, neighbor_score: 이웃 행 번호 / 점수 (구간 안에서 점수 내림차순)
+        }
+    """
+    data = load_master_data(catalog_dir)
+    if scope == 'all':
+        sources = np.arange(len(data['ids']), dtype=np.int64)
+    else:
+        sources = np.unique(collect_representative_rows(data)).astype(np.int64)
+    print(f"📋 대상 상품: {len(sources)}개 (scope={scope}, k={k}, 워커 {workers}개)")
+
+    tasks = [(sources[i:i + block_rows], k) for i in range(0, len(sources), block_rows)]
+    n_categories = len(CATEGORY_MAP)
+    idx_parts, score_parts, counts = [], [], np.zeros((len(sources), n_categories), dtype=np.int64)
+
+    start_time = time.time()
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(catalog_dir,))
+        results = pool.imap(_neighbor_task, tasks)
+    else:
+        _init_worker(catalog_dir)
+        pool = None
+        results = map(_neighbor_task, tasks)
+
+    try:
+        done = 0
+        for block_start, (source_rows, (block_idx, block_scores)) in zip(range(0, len(sources), block_rows), results):
+            valid = block_idx >= 0
+            counts[block_start:block_start + len(source_rows)] = valid.sum(axis=2)
+            # 유효 칸만 (원본, 카테고리, 점수 순) 으로 펼침 -> CSR 순서와 같다
+            idx_parts.append(block_idx[valid])
+            score_parts.append(block_scores[valid])
+            done += len(source_rows)
+            print(f"⏳ 진행 중... [{done}/{len(sources)}] {done / (time.time() - start_time):.1f}개/초", end='\r')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return {
+        'sources': sources,
+        'offsets': np.concatenate([[0], np.cumsum(counts.ravel())]).astype(np.int64),
+        'neighbor_idx': np.concatenate(idx_parts) if idx_parts else np.empty(0, dtype=np.int64),
+        'neighbor_score': (np.concatenate(score_parts) if score_parts else np.empty(0)).astype(np.float32),
+    }
+
+def build_and_save_knn_graph(catalog_dir, scope='persona', k=KNN_K, workers=1):
+    if not is_catalog_dir(catalog_dir):
+        print(f"❌ {catalog_dir} 는 카탈로그 디렉토리가 아닙니다. (catalog.py / preprocess.py 로 먼저 생성)")
+        return
+
+    print("🕸️ kNN 그래프 생성 중...")
+    start_time = time.time()
+    graph = build_knn_graph(catalog_dir, scope, k, workers)
+    save_optional_index(catalog_dir, 'knn', graph, scope=scope, k=k, sources=int(len(graph['sources'])),
+                        built_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+    print(f"\n✅ kNN 그래프 저장 완료 (이웃 {len(graph['neighbor_idx'])}개, {time.time() - start_time:.1f}초)")
+
+# ---------------------------------------------------------
+# [요청 시] 그래프 조회
+# ---------------------------------------------------------
+def graph_candidates(data, query_indices, cat_code, start, end, k, weights=None):
+    """
+    category_candidates 와 같은 결과 형식을 그래프 조회만으로 만든다.
+    대표 상품별로 이웃 중 [start, end) 구간(가격 필터)에 속한 상위 k개를 모으고 중복은 최대 점수로 병합.
+
+    그래프로 답할 수 없으면 None (호출 측에서 직접 계산):
+    - 가중치가 기본값이 아님 / 그래프에 없는 대표 상품
+    - 가격 필터 후 남은 이웃이 k개보다 적음 (그래프 밖에 더 나은 후보가 있을 수 있음)
+    """
+    if 'knn' not in data or (weights is not None and weights != DEFAULT_WEIGHTS):
+        return None
+    empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    if start >= end or len(query_indices) == 0:
+        return empty
+
+    graph = data['knn']
+    sources = graph['sources']
+    query_indices = np.asarray(query_indices, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(sources, query_indices), max(len(sources) - 1, 0))
+    if len(sources) == 0 or not np.all(sources[pos] == query_indices):
+        return None
+
+    n_categories = len(CATEGORY_MAP)
+    cat_size = int(data['index']['cat_offsets'][cat_code + 1] - data['index']['cat_offsets'][cat_code])
+    flat_idx, flat_scores = [], []
+    for p, query_index in zip(pos, query_indices):
+        segment = slice(graph['offsets'][p * n_categories + cat_code], graph['offsets'][p * n_categories + cat_code + 1])
+        neighbors = np.asarray(graph['neighbor_idx'][segment])
+        in_window = (neighbors >= start) & (neighbors < end)
+        # 구간 안 상품 수(자기 자신 제외)보다 이웃이 적으면 그래프만으로는 상위 k개를 보장할 수 없음
+        window_size = end - start - int(start <= query_index < end)
+        if in_window.sum() < min(k, window_size) and len(neighbors) < cat_size - 1:
+            return None
+        flat_idx.append(neighbors[in_window][:k])
+        flat_scores.append(np.asarray(graph['neighbor_score'][segment])[in_window][:k])
+
+    return merge_candidates(np.concatenate(flat_idx), np.concatenate(flat_scores))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="master_data 디렉토리에 상품별 카테고리 이웃(kNN) 그래프를 추가합니다.")
+    parser.add_argument('path', nargs='?', default='../data/master_data', help="카탈로그 디렉토리")
+    parser.add_argument('--scope', choices=['persona', 'all'], default='persona',
+                        help="persona: representative_item 대표 상품만 / all: 전체 카탈로그")
+    parser.add_argument('--k', type=int, default=KNN_K, help="카테고리당 이웃 수")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2), help="프로세스 수")
+    args = parser.parse_args()
+
+    build_and_save_knn_graph(args.path, scope=args.scope, k=args.k, workers=args.workers)
@@ -0,0 +1,226 @@
+import os
+import time
+import atexit
+import threading
+from collections import deque
+
+from sqlalchemy import text
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+
+from metrics import STAGE_SECONDS
+
+# [설정]
+OUTFIT_BUFFER_SIZE = int(os.getenv('OUTFIT_BUFFER_SIZE', '5000'))       # 대기 중인 행 최대 수 (넘치면 503)
+OUTFIT_FLUSH_ROWS = int(os.getenv('OUTFIT_FLUSH_ROWS', '200'))          # 이만큼 쌓이면 바로 기록
+OUTFIT_FLUSH_INTERVAL = float(os.getenv('OUTFIT_FLUSH_INTERVAL', '1.0'))  # 가장 오래된 행이 이 시간(초)을 넘기면 기록
+
+OUTFIT_CATEGORIES = ['outer', 'top', 'bottom', 'shoes', 'acc']
+REQUIRED_CATEGORIES = ['top', 'bottom', 'shoes']
+# outfit 테이블 UNIQUE(outer_id, top_id, bottom_id, shoes_id, acc_id) 와 같은 순서
+KEY_COLUMNS = ['outer_id', 'top_id', 'bottom_id', 'shoes_id', 'acc_id']
+
+# 중복은 메모리 집합에서 먼저 거르고, 다른 프로세스와 겹친 행은 ON DUPLICATE KEY 로 넘긴다
+# (INSERT IGNORE 는 FK 위반 같은 데이터 오류까지 경고로 삼켜 버리므로 쓰지 않음)
+INSERT_STMT = text("""
+    INSERT INTO outfit (persona, outer_id, acc_id, top_id, bottom_id, shoes_id)
+    VALUES (:persona, :outer_id, :acc_id, :top_id, :bottom_id, :shoes_id)
+    ON DUPLICATE KEY UPDATE outfit_id = outfit_id
+""")
+KNOWN_KEYS_QUERY = text(f"SELECT {', '.join(KEY_COLUMNS)} FROM outfit")
+
+# 연결 끊김 / 락 대기 초과 등: 같은 행을 나중에 다시 시도하면 되는 오류
+# (그 밖의 IntegrityError / DataError 등은 행 자체의 문제로 보고 한 행씩 기록해 걸러낸다)
+TRANSIENT_ERRORS = (OperationalError, DisconnectionError, InterfaceError)
+
+# 접수 결과
+ACCEPTED = 'accepted'
+DUPLICATE = 'duplicate'
+BUSY = 'busy'
+
+def parse_outfit(payload):
+    """
+    Frontend payload -> outfit 행
+
+    Rules:
+    - top/bottom/shoes are required
+    - outer/acc are optional; if missing, store 0 (dummy product_id meaning "None")
+
+    Returns:
+        (row, error): 둘 중 하나는 None
+    """
+    if not isinstance(payload, dict):
+        return None, "outfit must be an object"
+    persona = payload.get('persona')
+    items = payload.get('items', [])
+
+    if not persona or not isinstance(persona, str):
+        return None, "persona is required"
+    if not isinstance(items, list):
+        return None, "items must be a list"
+
+    by_cat = {}
+    for it in items:
+        if not isinstance(it, dict):
+            continue
+        cat = it.get('category')
+        pid = it.get('product_id')
+        if cat in OUTFIT_CATEGORIES and pid is not None:
+            try:
+                by_cat[cat] = int(pid)
+            except Exception:
+                pass
+
+    if any(cat not in by_cat for cat in REQUIRED_CATEGORIES):
+        return None, "top, bottom, shoes are required"
+
+    row = {"persona": persona}
+    for cat in OUTFIT_CATEGORIES:
+        row[f"{cat}_id"] = int(by_cat.get(cat, 0))
+    return row, None
+
+def outfit_key(row):
+    return tuple(row[col] for col in KEY_COLUMNS)
+
+# ---------------------------------------------------------
+# [Write-behind] 접수는 메모리 버퍼에만, 기록은 백그라운드 스레드가 executemany 로 모아서
+#   - 이미 있는(또는 대기 중인) 조합은 DB 왕복 없이 DUPLICATE
+#   - 일시적인 DB 오류면 행을 버퍼에 되돌려 다음 주기에 재시도
+#   - 데이터 오류(FK 위반 등)면 한 행씩 다시 기록해 문제 행만 버린다 (뒤의 행을 막지 않게)
+# ---------------------------------------------------------
+class OutfitWriter:
+    def __init__(self, engine, max_buffer=OUTFIT_BUFFER_SIZE, flush_rows=OUTFIT_FLUSH_ROWS,
+                 flush_interval=OUTFIT_FLUSH_INTERVAL):
+        self.engine = engine
+        self.max_buffer = max_buffer
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+
+        self._buffer = deque()          # [(접수 시각, row)]
+        self._known = set()             # 저장되었거나 대기 중인 outfit_key
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+        self.duplicates = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    def load_known_keys(self):
+        """기존 outfit 조합을 읽어 둔다. 실패해도 ON DUPLICATE KEY 가 중복을 막으므로 계속 진행"""
+        try:
+            with self.engine.connect() as conn:
+                keys = {tuple(int(v) for v in r) for r in conn.execute(KNOWN_KEYS_QUERY)}
+        except Exception as e:
+            print(f"⚠️ 기존 아웃핏 조합 로드 실패 (DB 유니크 키로만 중복 처리): {e}")
+            return 0
+        with self._cond:
+            self._known |= keys
+        print(f"✅ 기존 아웃핏 조합 {len(keys)}개 로드")
+        return len(keys)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='outfit-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit_many(self, rows):
+        """
+        Returns:
+            행마다 ACCEPTED / DUPLICATE / BUSY(버퍼가 가득 참)
+        """
+        results = []
+        with self._cond:
+            for row in rows:
+                key = outfit_key(row)
+                if key in self._known:
+                    self.duplicates += 1
+                    results.append(DUPLICATE)
+                elif len(self._buffer) >= self.max_buffer:
+                    results.append(BUSY)
+                else:
+                    self._known.add(key)
+                    self._buffer.append((time.time(), row))
+                    results.append(ACCEPTED)
+            if len(self._buffer) >= self.flush_rows:
+                self._cond.notify()
+        return results
+
+    def submit(self, row):
+        return self.submit_many([row])[0]
+
+    def _due(self):
+        if not self._buffer:
+            return False
+        return len(self._buffer) >= self.flush_rows or time.time() - self._buffer[0][0] >= self.flush_interval
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due():
+                    timeout = self.flush_interval
+                    if self._buffer:
+                        timeout = max(0.0, self._buffer[0][0] + self.flush_interval - time.time())
+                    self._cond.wait(timeout)
+            if not self.flush():
+                time.sleep(self.flush_interval)  # DB 장애 중에는 재시도 간격을 둔다
+
+    def flush(self):
+        """버퍼를 모두 기록. Returns: 성공(또는 기록할 것이 없음)이면 True, 일시적인 DB 오류면 False"""
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = [self._buffer.popleft() for _ in range(min(self.flush_rows, len(self._buffer)))]
+                if not batch:
+                    return True
+                try:
+                    with STAGE_SECONDS.time(stage='outfit_flush'), self.engine.begin() as conn:
+                        conn.execute(INSERT_STMT, [row for _, row in batch])
+                except TRANSIENT_ERRORS as e:
+                    self._requeue(batch, e)
+                    return False
+                except Exception as e:
+                    print(f"⚠️ 아웃핏 {len(batch)}건 일괄 기록 실패, 한 건씩 다시 기록: {e}")
+                    if not self._write_rows(batch):
+                        return False
+                    continue
+                self.written += len(batch)
+
+    def _requeue(self, batch, error):
+        self.failed_flushes += 1
+        print(f"⚠️ 아웃핏 {len(batch)}건 기록 실패 (재시도 예정): {error}")
+        with self._cond:
+            self._buffer.extendleft(reversed(batch))
+
+    def _write_rows(self, batch):
+        """
+        한 행씩 기록하며 데이터 오류가 난 행은 로그를 남기고 버린다 (키도 잊어서 다시 접수할 수 있게)
+        Returns: 일시적인 DB 오류로 중단했으면 False (남은 행은 버퍼에 되돌림)
+        """
+        for i, (_, row) in enumerate(batch):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(INSERT_STMT, row)
+            except TRANSIENT_ERRORS as e:
+                self._requeue(batch[i:], e)
+                return False
+            except Exception as e:
+                self.dropped += 1
+                print(f"⚠️ 아웃핏 행 기록 불가, 버림: {row} ({e})")
+                with self._cond:
+                    self._known.discard(outfit_key(row))
+                continue
+            self.written += 1
+        return True
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._buffer),
+                "known_keys": len(self._known),
+                "written": self.written,
+                "duplicates": self.duplicates,
+                "failed_flushes": self.failed_flushes,
+                "dropped": self.dropped,
+            }
@@ -0,0 +1,82 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import REGISTRY
+
+CACHE_LOOKUPS = REGISTRY.counter('candidate_pool_cache_total', '후보 풀 캐시 조회 (hit / miss)', ['result'])
+
+# ---------------------------------------------------------
+# [후보 풀 캐시] 페르소나별 카테고리 후보(인덱스, 점수) LRU
+#   키: (persona, 카탈로그 버전, 대표 상품 digest, 가중치, 계산 모드, 카테고리, 행 구간)
+#   - 카탈로그가 교체되면 버전이, representative_item 이 바뀌면 digest 가 달라져 자연히 새 키가 된다
+#   - 이전 키는 사용되지 않으므로 LRU 순서대로 밀려난다
+# ---------------------------------------------------------
+def representative_digest(product_ids):
+    """대표 상품 ID 집합의 짧은 지문 (순서 무관)"""
+    ids = np.unique(np.asarray(product_ids, dtype=np.int64))
+    return hashlib.sha1(ids.tobytes()).hexdigest()[:16]
+
+class CandidatePoolCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value, result = self.lookup(key)
+        self.record(result)
+        return value
+
+    def lookup(self, key):
+        """hit/miss 통계에 넣지 않고 조회. Returns: (value 또는 None, 'hit' / 'miss') -> 응답에 쓰면 record(result)"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                return None, 'miss'
+            self._entries.move_to_end(key)
+        return value, 'hit'
+
+    def record(self, result):
+        with self._lock:
+            if result == 'hit':
+                self.hits += 1
+            else:
+                self.misses += 1
+        CACHE_LOOKUPS.inc(result=result)
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, persona=None):
+        """persona 의 항목(없으면 전체)을 비운다. Returns: 삭제된 항목 수"""
+        with self._lock:
+            if persona is None:
+                count = len(self._entries)
+                self._entries.clear()
+                return count
+            keys = [key for key in self._entries if key[0] == persona]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import argparse
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+
+from catalog import CATEGORY_MAP, load_master_data, lookup_indices
+from scoring import prepare_queries, category_candidates
+from image_jobs import REMBG_MODEL, _init_worker, process_and_save_image
+from image_variants import ensure_variants, read_manifest
+from image_store import ProcessedImageStore, PROCESSED_META_DIR
+from db import database_url
+
+# backend 디렉토리의 .env 파일 로드
+load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
+
+FAILURES_FILE = 'precut_failures.json'
+
+# ---------------------------------------------------------
+# [1] 처리 대상 상품 수집
+# ---------------------------------------------------------
+def collect_persona_candidates(master_data, top_k):
+    """
+    representative_item 의 모든 페르소나에 대해 /api/products 와 같은 방식
+    (카테고리별 구간, 가격 필터 없음, 기본 가중치)으로 후보 풀을 만들고 합집합 인덱스를 반환.
+    """
+    engine = create_engine(database_url())
+    rep_df = pd.read_sql("SELECT persona, product_id FROM representative_item", engine)
+
+    offsets = master_data['index']['cat_offsets']
+    targets = []
+    for persona, group in rep_df.groupby('persona'):
+        rep_indices, missing_ids = lookup_indices(master_data['index'], group['product_id'].to_numpy())
+        if len(rep_indices) == 0:
+            continue
+
+        # 대표 상품 자체도 화면에 쓰일 수 있으므로 포함
+        targets.append(rep_indices)
+        queries = prepare_queries(master_data, rep_indices)
+        for code in range(len(CATEGORY_MAP)):
+            cand_indices, _ = category_candidates(
+                master_data, queries, int(offsets[code]), int(offsets[code + 1]), top_k)
+            targets.append(cand_indices)
+        print(f"   👤 {persona}: 대표 상품 {len(rep_indices)}개 (누락 {len(missing_ids)}개)")
+
+    if not targets:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(targets))
+
+# ---------------------------------------------------------
+# [2] 워커: 한 상품 처리
+# ---------------------------------------------------------
+def _precut_one(task):
+    p_id, image_url, save_path, lock_dir = task
+    return p_id, image_url, process_and_save_image(image_url, save_path, lock_dir=lock_dir)
+
+def _backfill_one(save_path):
+    try:
+        return ensure_variants(save_path)
+    except Exception as e:
+        print(f"   ⚠️ 축소본 생성 실패 ({os.path.basename(save_path)}): {e}")
+        return False
+
+# ---------------------------------------------------------
+# [3] 일괄 처리 (재시작 가능)
+# ---------------------------------------------------------
+def run_precut(data_path, out_dir, scope='persona', workers=2, threads=1,
+               top_k=10, model_name=REMBG_MODEL, retry_failed=False, meta_dir=PROCESSED_META_DIR):
+    print("🔄 누끼 이미지 일괄 생성 시작...")
+    master_data = load_master_data(data_path)
+    if master_data is None:
+        return
+
+    # 서버와 같은 shard 폴더 구조 + 공유 색인 (만든 상품은 색인에 넣어 서버 워커들이 다음 동기화 때 받아 간다)
+    # 색인 / 실패 기록은 공개로 서빙되는 out_dir 밖(meta_dir)에 둔다
+    store = ProcessedImageStore(out_dir, meta_dir=meta_dir)
+    store.load()
+    failures_path = os.path.join(meta_dir, FAILURES_FILE)
+    failures = {}
+    if os.path.exists(failures_path):
+        with open(failures_path, encoding='utf-8') as f:
+            failures = json.load(f)
+
+    if scope == 'all':
+        indices = np.arange(len(master_data['ids']))
+    else:
+        indices = collect_persona_candidates(master_data, top_k)
+    print(f"📋 대상 상품: {len(indices)}개 (scope={scope})")
+
+    # 이미 처리된 파일과(재시도 옵션이 없으면) 이전 실패 건은 건너뜀
+    tasks, backfill = [], []
+    skipped_done, skipped_failed = 0, 0
+    for idx in indices:
+        p_id = int(master_data['ids'][idx])
+        save_path = store.path(p_id)
+        if os.path.exists(save_path):
+            skipped_done += 1
+            if read_manifest(save_path) is None:
+                backfill.append(save_path)  # 축소본 도입 전에 만든 PNG
+            continue
+        if not retry_failed and str(p_id) in failures:
+            skipped_failed += 1
+            continue
+        tasks.append((p_id, str(master_data['imgs'][idx]), save_path, store.lock_dir()))
+
+    print(f"   - 이미 처리됨: {skipped_done}개 / 이전 실패(건너뜀): {skipped_failed}개 / 처리 예정: {len(tasks)}개")
+
+    # 기존 PNG 에 축소본만 추가 (rembg 모델 불필요)
+    if backfill:
+        print(f"🖼️ 축소본 없는 기존 누끼 이미지 {len(backfill)}개에 축소본 생성")
+        with multiprocessing.Pool(workers) as pool:
+            created = sum(pool.imap_unordered(_backfill_one, backfill, chunksize=16))
+        print(f"   - 축소본 생성: {created}개")
+    if not tasks:
+        print("✅ 처리할 상품이 없습니다.")
+        return
+
+    # 모델 파일을 워커 생성 전에 한 번 내려받아 두고, 로드 실패 시 워커를 띄우지 않고 중단
+    try:
+        _init_worker(model_name, threads)
+    except Exception as e:
+        print(f"❌ rembg 모델 로드 실패 ({model_name}): {e}")
+        return
+
+    print(f"🏗️ 워커 {workers}개 x onnxruntime 스레드 {threads}개 (model: {model_name})")
+    start_time = time.time()
+    done, failed = 0, 0
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(model_name, threads)) as pool:
+        for i, (p_id, image_url, success) in enumerate(pool.imap_unordered(_precut_one, tasks, chunksize=4), 1):
+            if success:
+                done += 1
+                failures.pop(str(p_id), None)
+                store.add(p_id)
+            else:
+                failed += 1
+                failures[str(p_id)] = {"img_url": image_url, "failed_at": time.strftime('%Y-%m-%d %H:%M:%S')}
+
+            if i % 50 == 0 or i == len(tasks):
+                elapsed = time.time() - start_time
+                print(f"⏳ 진행 중... [{i}/{len(tasks)}] {i / elapsed:.1f}장/초", end='\r')
+                # 중간에 끊겨도 실패 기록은 남도록 주기적으로 저장
+                with open(failures_path, 'w', encoding='utf-8') as f:
+                    json.dump(failures, f, ensure_ascii=False, indent=2)
+                store.sync()
+
+    print(f"\n\n📊 [처리 결과] 성공: {done} / 실패: {failed} ({time.time() - start_time:.1f}초)")
+    if failed:
+        print(f"   👉 실패 목록: {failures_path} (--retry-failed 로 재시도)")
+    print("✅ precut 완료!")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="추천 후보 상품의 누끼 이미지를 미리 생성합니다. (preprocess.py 이후 실행)")
+    parser.add_argument('--data', default='../data/master_data', help="master_data 경로 (디렉토리 또는 npz)")
+    parser.add_argument('--out', default=os.path.join('static', 'processed_imgs'), help="누끼 이미지 저장 폴더")
+    parser.add_argument('--meta', default=PROCESSED_META_DIR, help="색인 / 잠금 / 실패 기록 폴더 (서빙 폴더 밖, 서버와 같게)")
+    parser.add_argument('--scope', choices=['persona', 'all'], default='persona',
+                        help="persona: 대표 상품 후보 풀만 / all: 전체 카탈로그")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2), help="프로세스 수")
+    parser.add_argument('--threads', type=int, default=1, help="워커당 onnxruntime intra-op 스레드 수")
+    parser.add_argument('--top-k', type=int, default=10, help="대표 상품당 카테고리별 후보 수")
+    parser.add_argument('--model', default=REMBG_MODEL, help="rembg 모델 이름")
+    parser.add_argument('--retry-failed', action='store_true', help="이전에 실패한 상품도 다시 처리")
+    args = parser.parse_args()
+
+    run_precut(args.data, args.out, scope=args.scope, workers=args.workers, threads=args.threads,
+               top_k=args.top_k, model_name=args.model, retry_failed=args.retry_failed, meta_dir=args.meta)
@@ -1,136 +1,311 @@
 import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 import os
+import json
+import time
+import shutil
+import argparse
 from dotenv import load_dotenv
+from catalog import (CATALOG_FORMAT_VERSION, StringColumnWriter, is_catalog_dir, materialize_strings,
+                     read_raw_master_data, save_catalog_dir, replace_dir)
+from scoring import DEFAULT_WEIGHTS, DENSE_MODALITIES, TABLE_MODALITIES, QUANTIZE_MODES
+from ann import build_and_save_ivf
+from knn_graph import KNN_K, build_and_save_knn_graph
+from db import database_url
 
 # backend 디렉토리의 .env 파일 로드
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
-def create_master_data():
+# [설정]
+BUILD_DIR = 'data/master_build'     # 상품 순(product_id) 원본 배열 + manifest (증분 빌드 기준)
+CATALOG_DIR = 'data/master_data'    # 서버용 mmap 디렉토리
+CHUNK_SIZE = 20000
+
+# 임베딩 소스: (modality, 파일, 이름, 조인 키, 기본 차원)
+EMB_SOURCES = [
+    ('name', 'data/product_name_emb.npz', "상품명", 'product_id', 200),
+    ('brand', 'data/brand_description_emb.npz', "브랜드", 'brand_id', 768),
+    ('img', 'data/image_emb.npz', "이미지", 'product_id', 512),
+    ('cat', 'data/category_emb.npz', "카테고리", 'category_id', 50),
+]
+# 이 열 중 하나라도 바뀐 상품만 증분 빌드에서 다시 계산
+HASH_COLUMNS = ['product_name', 'original_price', 'img_url', 'upper_category',
+                'lower_category', 'category_id', 'brand_id']
+STRING_COLUMNS = {'names': 'product_name', 'imgs': 'img_url', 'cats': 'upper_category', 'lower_cats': 'lower_category'}
+
+PRODUCT_QUERY = """
+    SELECT p.product_id, p.product_name, p.original_price, p.img_url,
+           c.upper_category, c.lower_category, p.category_id, p.brand_id
+    FROM product p
+    JOIN category c ON p.category_id = c.category_id
+    ORDER BY p.product_id
+"""
+COUNT_QUERY = "SELECT COUNT(*) FROM product p JOIN category c ON p.category_id = c.category_id"
+
+# ---------------------------------------------------------
+# [1] 임베딩 테이블 로드 및 조인
+# ---------------------------------------------------------
+# 더 안전하고 진단 가능한 로딩 함수: ID 정렬 배열 + 벡터 행렬 반환
+def get_vec_table(path, name="Data"):
+    if not os.path.exists(path):
+        print(f"⚠️ [누락] {path} 파일이 없습니다. (모두 0으로 채워집니다)")
+        return None
+
+    data = np.load(path, allow_pickle=True)
+    files = data.files
+
+    ids_arr = None
+    vecs_arr = None
+
+    for f in files:
+        arr = data[f]
+        if arr.ndim == 1: # 1차원이면 ID로 간주
+            ids_arr = arr
+        elif arr.ndim == 2: # 2차원이면 벡터로 간주
+            vecs_arr = arr
+
+    if ids_arr is None or vecs_arr is None:
+        print(f"❌ [{name}] 파일 구조 인식 실패: keys={files}")
+        return None
+
+    print(f"✅ [{name}] 로드 완료 | 개수: {len(ids_arr)} | Key타입: {type(ids_arr[0])} | 예시키: {ids_arr[0]}")
+
+    # 키를 int64로 통일 (문자열 키는 숫자로 된 것만 사용 - 기존 int / str(int) 조회와 동일)
+    if ids_arr.dtype.kind in 'iuf':
+        keys = ids_arr.astype(np.int64)
+        valid = np.ones(len(keys), dtype=bool)
+    else:
+        ids_str = ids_arr.astype(str)
+        valid = np.char.isdigit(ids_str)
+        keys = np.zeros(len(ids_str), dtype=np.int64)
+        keys[valid] = ids_str[valid].astype(np.int64)
+    keys = keys[valid]
+    vecs_arr = vecs_arr[valid]
+
+    # 중복 키는 마지막 항목 우선 (dict 생성 시와 동일): 뒤집은 뒤 첫 항목을 남김
+    keys_rev = keys[::-1]
+    uniq_keys, first_rev = np.unique(keys_rev, return_index=True)
+    rows = len(keys) - 1 - first_rev
+    return uniq_keys, vecs_arr, rows
+
+def align(table, keys, dim):
+    """
+    정렬된 키 배열에 대한 searchsorted 조인 -> 미스는 0 벡터, 이후 행 단위 일괄 정규화
+
+    Returns:
+        (vectors (len(keys), dim) float32, hit mask)
+    """
+    out = np.zeros((len(keys), dim), dtype=np.float32)
+    if table is None or len(table[0]) == 0:
+        return out, np.zeros(len(keys), dtype=bool)
+
+    uniq_keys, vecs_arr, rows = table
+    pos = np.minimum(np.searchsorted(uniq_keys, keys), len(uniq_keys) - 1)
+    hit = uniq_keys[pos] == keys
+
+    out[hit] = vecs_arr[rows[pos[hit]], :dim]
+
+    normalize_rows(out)
+    return out, hit
+
+def normalize_rows(out):
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    np.divide(out, norms + 1e-9, out=out, where=norms > 0)
+    return out
+
+def build_table(table, dim):
+    """브랜드/카테고리 임베딩 -> 키 순서의 정규화된 테이블 (B, dim) float32 (상품별 복사 없이 1벌만 저장)"""
+    if table is None:
+        return np.zeros((0, dim), dtype=np.float32)
+    uniq_keys, vecs_arr, rows = table
+    out = np.zeros((len(uniq_keys), dim), dtype=np.float32)
+    out[:] = vecs_arr[rows, :dim]
+    return normalize_rows(out)
+
+def table_rows(table, keys):
+    """키 배열 -> build_table 의 행 번호 (int32, 매칭 실패는 -1)"""
+    out = np.full(len(keys), -1, dtype=np.int32)
+    if table is None or len(table[0]) == 0:
+        return out
+    uniq_keys = table[0]
+    pos = np.minimum(np.searchsorted(uniq_keys, keys), len(uniq_keys) - 1)
+    hit = uniq_keys[pos] == keys
+    out[hit] = pos[hit]
+    return out
+
+def source_signatures():
+    """임베딩 파일 변경 감지용 {path: [size, mtime_ns]}"""
+    signatures = {}
+    for _, path, _, _, _ in EMB_SOURCES:
+        if os.path.exists(path):
+            st = os.stat(path)
+            signatures[path] = [st.st_size, st.st_mtime_ns]
+    return signatures
+
+# ---------------------------------------------------------
+# [2] 이전 빌드 (증분 모드)
+# ---------------------------------------------------------
+def load_previous_build(signatures):
+    """
+    이전 빌드를 mmap으로 연다. 임베딩 파일이 바뀌었으면 모든 벡터가 바뀔 수 있으므로 None.
+    """
+    manifest_path = os.path.join(BUILD_DIR, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        print("⚠️ 이전 빌드가 없습니다. 전체 빌드를 진행합니다.")
+        return None
+
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('sources') != signatures:
+        print("⚠️ 임베딩 파일이 변경되었습니다. 전체 빌드를 진행합니다.")
+        return None
+
+    def load(name):
+        return np.load(os.path.join(BUILD_DIR, f"{name}.npy"), mmap_mode='r')
+
+    names = ['ids', 'row_hashes', 'hits'] + [f'{m}_vecs' for m in DENSE_MODALITIES] + [f'{m}_idx' for m in TABLE_MODALITIES]
+    if not all(os.path.exists(os.path.join(BUILD_DIR, f"{name}.npy")) for name in names):
+        print("⚠️ 이전 빌드 형식이 다릅니다. 전체 빌드를 진행합니다.")
+        return None
+
+    prev = {name: load(name) for name in names}
+    prev['manifest'] = manifest
+    return prev
+
+def catalog_matches(path, quantize):
+    """기존 서버용 디렉토리가 지금 옵션(포맷 / 기본 가중치 / 압축 모드)으로 만든 것과 같은지"""
+    if not is_catalog_dir(path):
+        return False
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    return (meta.get('format_version') == CATALOG_FORMAT_VERSION and meta.get('weights') == DEFAULT_WEIGHTS
+            and meta.get('quantize') == quantize)
+
+# ---------------------------------------------------------
+# [3] 청크 단위 빌드
+# ---------------------------------------------------------
+def create_master_data(incremental=False, chunk_size=CHUNK_SIZE, export_npz=False, quantize=None,
+                       ivf=False, ivf_lists=None, knn_scope=None, knn_k=KNN_K, knn_workers=1):
     print("🔄 완전체 마스터 데이터 결합 시작...")
-    
-    db_url = f"mysql+mysqlconnector://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}"
-    engine = create_engine(db_url)
-    
-    print("📥 DB에서 상품 정보 로딩 중...")
-    # [수정 1] SQL 쿼리에 c.lower_category 추가
-    df_base = pd.read_sql("""
-        SELECT p.product_id, p.product_name, p.original_price, p.img_url, 
-               c.upper_category, c.lower_category, p.category_id, p.brand_id 
-        FROM product p 
-        JOIN category c ON p.category_id = c.category_id
-    """, engine)
-    
-    # 더 안전하고 진단 가능한 맵핑 함수
-    def get_vec_map(path, name="Data"):
-        if not os.path.exists(path):
-            print(f"⚠️ [누락] {path} 파일이 없습니다. (모두 0으로 채워집니다)")
-            return {}
-            
-        data = np.load(path, allow_pickle=True)
-        files = data.files
-        
-        ids_arr = None
-        vecs_arr = None
-        
-        for f in files:
-            arr = data[f]
-            if arr.ndim == 1: # 1차원이면 ID로 간주
-                ids_arr = arr
-            elif arr.ndim == 2: # 2차원이면 벡터로 간주
-                vecs_arr = arr
-        
-        if ids_arr is None or vecs_arr is None:
-            print(f"❌ [{name}] 파일 구조 인식 실패: keys={files}")
-            return {}
-
-        mapping = {k: v for k, v in zip(ids_arr, vecs_arr)}
-        
-        first_key = next(iter(mapping))
-        print(f"✅ [{name}] 로드 완료 | 개수: {len(mapping)} | Key타입: {type(first_key)} | 예시키: {first_key}")
-        return mapping
-
-    print("\n📦 개별 벡터 파일 로딩 및 분석...")
-    name_map = get_vec_map('data/product_name_emb.npz', "상품명")
-    img_map = get_vec_map('data/image_emb.npz', "이미지")
-    cat_map = get_vec_map('data/category_emb.npz', "카테고리")
-    brand_map = get_vec_map('data/brand_description_emb.npz', "브랜드")
-
-    # 차원 설정
-    def get_dim(v_map, default):
-        if not v_map: return default
-        return len(next(iter(v_map.values())))
-
-    d_name = get_dim(name_map, 200)
-    d_brand = get_dim(brand_map, 768)
-    d_img = get_dim(img_map, 512)
-    d_cat = get_dim(cat_map, 50)
-
-    # [수정 2] lower_cats 리스트 초기화 추가
-    ids, names, prices, imgs, cats, lower_cats = [], [], [], [], [], []
-    name_matrix, brand_matrix, img_matrix, cat_matrix = [], [], [], []
-
-    print(f"\n🏗️ 데이터 매칭 및 결합 시작... (Total: {len(df_base)} items)")
-    print(f"   - Dimensions: Name({d_name}), Brand({d_brand}), Img({d_img}), Cat({d_cat})")
-    
+    start_time = time.time()
+
+    engine = create_engine(database_url())
+
+    signatures = source_signatures()
+    prev = load_previous_build(signatures) if incremental else None
+
+    # 상품별 임베딩(name/img)은 다시 계산할 행이 생길 때 처음 로드 (증분 모드에서 변경이 없으면 읽지 않음)
+    tables = {}
+    def get_table(modality):
+        if modality not in tables:
+            for m, path, name, _, _ in EMB_SOURCES:
+                if m == modality:
+                    tables[modality] = get_vec_table(path, name)
+        return tables[modality]
+
+    # 차원: 이전 빌드 -> 임베딩 파일 -> 기본값 순
+    dims = {}
+    for modality, _, _, _, default_dim in EMB_SOURCES:
+        if prev is not None and modality in DENSE_MODALITIES:
+            dims[modality] = prev[f'{modality}_vecs'].shape[1]
+        else:
+            table = get_table(modality)
+            dims[modality] = default_dim if table is None else table[1].shape[1]
+
+    # 브랜드/카테고리는 brand_id / category_id 에만 의존 -> 테이블 1벌 + 상품별 행 번호로 저장
+    emb_tables = {m: build_table(get_table(m), dims[m]) for m in TABLE_MODALITIES}
+
+    with engine.connect() as conn:
+        total_count = int(conn.execute(text(COUNT_QUERY)).scalar())
+
+    print(f"\n🏗️ 데이터 매칭 및 결합 시작... (Total: {total_count} items, chunk: {chunk_size}, 증분: {prev is not None})")
+    print(f"   - Dimensions: Name({dims['name']}), Brand({dims['brand']}), Img({dims['img']}), Cat({dims['cat']})")
+
+    # 출력 배열은 디스크에 미리 할당하고 청크마다 바로 기록 (가격 / 문자열 열 포함 -> 메모리는 청크 크기만큼만 사용)
+    tmp_dir = f"{BUILD_DIR}.tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    def alloc(name, dtype, shape):
+        return np.lib.format.open_memmap(os.path.join(tmp_dir, f"{name}.npy"), mode='w+', dtype=dtype, shape=shape)
+
+    out_vecs = {m: alloc(f'{m}_vecs', np.float32, (total_count, dims[m])) for m in DENSE_MODALITIES}
+    out_vecs.update({m: alloc(f'{m}_idx', np.int32, (total_count,)) for m in TABLE_MODALITIES})
+    out_hits = alloc('hits', np.bool_, (total_count, len(EMB_SOURCES)))
+    out_ids = alloc('ids', np.int64, (total_count,))
+    out_hashes = alloc('row_hashes', np.uint64, (total_count,))
+    out_prices = alloc('prices', np.int64, (total_count,))
+    out_strings = {key: StringColumnWriter(os.path.join(tmp_dir, key), total_count) for key in STRING_COLUMNS}
+
     stats = {"name_hit": 0, "brand_hit": 0, "img_hit": 0, "cat_hit": 0}
+    reused_count = 0
+    offset = 0
+
+    print("📥 DB에서 상품 정보 로딩 중... (청크 단위)")
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(text(PRODUCT_QUERY), conn, chunksize=chunk_size):
+            n = len(chunk)
+            if offset + n > total_count:
+                raise RuntimeError("빌드 중 상품 수가 늘었습니다. 다시 실행하세요.")
+            rows = slice(offset, offset + n)
+
+            keys = {
+                'product_id': chunk['product_id'].to_numpy(dtype=np.int64),
+                'brand_id': pd.to_numeric(chunk['brand_id'], errors='coerce').fillna(-1).to_numpy(dtype=np.int64),
+                'category_id': chunk['category_id'].to_numpy(dtype=np.int64),
+            }
+            row_hashes = pd.util.hash_pandas_object(chunk[HASH_COLUMNS], index=False).to_numpy()
+
+            # 이전 빌드와 product_id / 행 해시가 같은 상품은 벡터를 그대로 복사
+            reuse = np.zeros(n, dtype=bool)
+            if prev is not None and len(prev['ids']):
+                pos = np.minimum(np.searchsorted(prev['ids'], keys['product_id']), len(prev['ids']) - 1)
+                reuse = (prev['ids'][pos] == keys['product_id']) & (prev['row_hashes'][pos] == row_hashes)
+                prev_rows = pos[reuse]
+            changed = ~reuse
+            reused_count += int(reuse.sum())
 
-    total_count = len(df_base)
-    for i, (_, row) in enumerate(df_base.iterrows()):
-        if i % 2000 == 0:
-            print(f"⏳ 진행 중... [{i}/{total_count}]", end='\r')
-
-        pid = int(row['product_id'])
-        bid = int(row['brand_id']) if row['brand_id'] is not None else -1
-        cid = int(row['category_id'])
-
-        def fetch_vec(v_map, key, dim, stat_key=None):
-            val = v_map.get(key)
-            if val is None:
-                val = v_map.get(str(key))
-            if val is None and isinstance(key, str) and key.isdigit():
-                val = v_map.get(int(key))
-            
-            if val is not None:
-                if stat_key: stats[stat_key] += 1
-                if not hasattr(val, "__len__"): val = np.array([val])
-                if len(val) != dim:
-                    res = np.zeros(dim)
-                    lim = min(len(val), dim)
-                    res[:lim] = val[:lim]
-                    return res
-                return val
-            return np.zeros(dim)
-
-        nv = fetch_vec(name_map, pid, d_name, "name_hit")
-        bv = fetch_vec(brand_map, bid, d_brand, "brand_hit")
-        iv = fetch_vec(img_map, pid, d_img, "img_hit")
-        cv = fetch_vec(cat_map, cid, d_cat, "cat_hit")
-
-        ids.append(pid)
-        names.append(row['product_name'])
-        prices.append(row['original_price'])
-        imgs.append(row['img_url'])
-        cats.append(row['upper_category']) # 기존 cats는 상위 카테고리 유지
-        lower_cats.append(row['lower_category']) # [수정 3] 하위 카테고리 추가
-        
-        # 정규화
-        norm_n = np.linalg.norm(nv)
-        norm_b = np.linalg.norm(bv)
-        norm_i = np.linalg.norm(iv)
-        norm_c = np.linalg.norm(cv)
-
-        name_matrix.append(nv / (norm_n + 1e-9) if norm_n > 0 else nv)
-        brand_matrix.append(bv / (norm_b + 1e-9) if norm_b > 0 else bv)
-        img_matrix.append(iv / (norm_i + 1e-9) if norm_i > 0 else iv)
-        cat_matrix.append(cv / (norm_c + 1e-9) if norm_c > 0 else cv)
+            hits = np.zeros((n, len(EMB_SOURCES)), dtype=bool)
+            for col, (modality, _, _, key_col, _) in enumerate(EMB_SOURCES):
+                if modality in TABLE_MODALITIES:
+                    block = np.full(n, -1, dtype=np.int32)
+                    if reuse.any():
+                        block[reuse] = prev[f'{modality}_idx'][prev_rows]
+                    if changed.any():
+                        block[changed] = table_rows(get_table(modality), keys[key_col][changed])
+                    hits[:, col] = block >= 0
+                else:
+                    block = np.zeros((n, dims[modality]), dtype=np.float32)
+                    if reuse.any():
+                        block[reuse] = prev[f'{modality}_vecs'][prev_rows]
+                        hits[reuse, col] = prev['hits'][prev_rows, col]
+                    if changed.any():
+                        block[changed], hits[changed, col] = align(get_table(modality), keys[key_col][changed], dims[modality])
+                out_vecs[modality][rows] = block
+                stats[f'{modality}_hit'] += int(hits[:, col].sum())
+
+            out_hits[rows] = hits
+            out_ids[rows] = keys['product_id']
+            out_hashes[rows] = row_hashes
+            out_prices[rows] = pd.to_numeric(chunk['original_price'], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+            for key, col in STRING_COLUMNS.items():
+                out_strings[key].append(chunk[col].to_numpy())
+
+            offset += n
+            print(f"⏳ 진행 중... [{offset}/{total_count}]", end='\r')
+
+    if offset != total_count:
+        raise RuntimeError("빌드 중 상품 수가 줄었습니다. 다시 실행하세요.")
 
     print(f"\n\n📊 [매칭 결과 통계]")
     print(f"   👉 상품명 매칭 성공: {stats['name_hit']} / {total_count} ({(stats['name_hit']/total_count)*100:.1f}%)")
     print(f"   👉 브랜드 매칭 성공: {stats['brand_hit']} / {total_count} ({(stats['brand_hit']/total_count)*100:.1f}%)")
     print(f"   👉 이미지 매칭 성공: {stats['img_hit']} / {total_count} ({(stats['img_hit']/total_count)*100:.1f}%)")
     print(f"   👉 카테고리 매칭 성공: {stats['cat_hit']} / {total_count} ({(stats['cat_hit']/total_count)*100:.1f}%)")
+    if prev is not None:
+        print(f"   👉 재사용: {reused_count} / 재계산: {total_count - reused_count}")
 
     if stats['name_hit'] == 0:
         print("🚨 경고: 상품명 벡터 매칭 실패.")
@@ -140,21 +315,70 @@ def create_master_data():
         print("🚨 경고: 카테고리 벡터 매칭 실패.")
 
     print(f"\n✅ 파일 저장 중...")
-    
-    # [수정 4] 저장 시 lower_cats 추가
-    np.savez_compressed('data/master_data.npz', 
-                        ids=np.array(ids), 
-                        names=np.array(names), 
-                        prices=np.array(prices), 
-                        imgs=np.array(imgs), 
-                        cats=np.array(cats),           # 상위 카테고리
-                        lower_cats=np.array(lower_cats), # 하위 카테고리 (새로 추가됨)
-                        name_vecs=np.vstack(name_matrix).astype(np.float32),
-                        brand_vecs=np.vstack(brand_matrix).astype(np.float32),
-                        img_vecs=np.vstack(img_matrix).astype(np.float32),
-                        cat_vecs=np.vstack(cat_matrix).astype(np.float32))
-    
-    print("✅ preprocess 완료! 이제 app.py를 재실행하세요.")
+
+    for arr in list(out_vecs.values()) + [out_hits, out_ids, out_hashes, out_prices]:
+        arr.flush()
+    for writer in out_strings.values():
+        writer.close()
+    # 증분 모드에서 이전 빌드와 행 구성이 같고 바뀐 행이 없으면 서버용 디렉토리는 그대로 둔다
+    unchanged = (prev is not None and reused_count == total_count == len(prev['ids'])
+                 and catalog_matches(CATALOG_DIR, quantize))
+    del out_vecs, out_hits, out_ids, out_hashes, out_prices, out_strings, prev
+
+    for m, table in emb_tables.items():
+        np.save(os.path.join(tmp_dir, f"{m}_table.npy"), table)
+
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({"rows": total_count, "sources": signatures, "built_at": time.strftime('%Y-%m-%d %H:%M:%S')},
+                  f, ensure_ascii=False, indent=2)
+    replace_dir(tmp_dir, BUILD_DIR)
+
+    raw = read_raw_master_data(BUILD_DIR)
+
+    # 서버용 비압축 디렉토리 포맷 (워커들이 mmap으로 공유)
+    # 빌드 디렉토리(mmap)에서 chunk 단위로 정렬해 옮겨 쓰므로 카탈로그 크기와 무관하게 메모리 사용량이 일정하다.
+    # 실행 중인 서버가 mmap 한 디렉토리는 고치지 않고 새 디렉토리로 통째로 교체한다 (카테고리 -> 가격 순 정렬이라
+    # 행 하나만 바뀌어도 뒤 행 위치가 밀림). 파일 쓰기는 행 수에 비례하지만 임베딩 재계산은 바뀐 행만.
+    if unchanged:
+        print("✅ 바뀐 상품이 없어 mmap 디렉토리는 그대로 둡니다.")
+    else:
+        print("✅ mmap 디렉토리 포맷 저장 중...")
+        save_catalog_dir(raw, CATALOG_DIR, quantize=quantize)
+
+    # [선택] 카테고리별 IVF 인덱스 (통합 가중치 임베딩 기준, 추천 시 일부 리스트만 탐색)
+    if ivf:
+        build_and_save_ivf(CATALOG_DIR, lists_per_category=ivf_lists)
+
+    # [선택] 상품별 카테고리 이웃 그래프 (추천 요청이 조회만으로 끝나도록)
+    if knn_scope:
+        build_and_save_knn_graph(CATALOG_DIR, scope=knn_scope, k=knn_k, workers=knn_workers)
+
+    # [선택] 기존 단일 npz (labeling_tool 등)
+    if export_npz:
+        print("✅ master_data.npz 저장 중...")
+        # 임시 파일에 쓴 뒤 교체 (실행 중인 서버의 파일 감시가 쓰다 만 파일을 읽지 않도록)
+        np.savez_compressed('data/master_data.tmp.npz', **{key: np.asarray(val) for key, val in materialize_strings(raw).items()})
+        os.replace('data/master_data.tmp.npz', 'data/master_data.npz')
+
+    print(f"✅ preprocess 완료! ({time.time() - start_time:.1f}초) 실행 중인 app.py는 자동으로 새 데이터를 불러옵니다.")
 
 if __name__ == "__main__":
-    create_master_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="DB 상품 정보와 임베딩 파일을 결합해 master_data를 생성합니다.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="이전 빌드 대비 상품/브랜드/카테고리가 바뀐 행만 임베딩을 다시 결합하고 나머지는 이전 빌드에서 복사 "
+                             "(바뀐 행을 찾기 위해 DB 는 청크 단위로 전부 읽음, IVF / kNN 은 지정 시 전체 재생성)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="DB에서 한 번에 읽을 행 수")
+    parser.add_argument('--npz', action='store_true', help="data/master_data.npz 도 함께 저장 (labeling_tool 용)")
+    parser.add_argument('--quantize', choices=QUANTIZE_MODES,
+                        help="1차 점수 계산용 압축 통합 행렬(int8: 모달리티별 행 스케일 / float16) 추가 저장")
+    parser.add_argument('--ivf', action='store_true', help="카테고리별 IVF 근사 최근접 이웃 인덱스 생성")
+    parser.add_argument('--ivf-lists', type=int, help="카테고리당 IVF 리스트 수 (기본: sqrt(카테고리 상품 수))")
+    parser.add_argument('--knn', choices=['persona', 'all'],
+                        help="kNN 이웃 그래프 생성 (persona: representative_item 대표 상품만 / all: 전체 상품)")
+    parser.add_argument('--knn-k', type=int, default=KNN_K, help="상품당 카테고리별 이웃 수")
+    parser.add_argument('--knn-workers', type=int, default=max(1, (os.cpu_count() or 2) // 2), help="kNN 그래프 프로세스 수")
+    args = parser.parse_args()
+
+    create_master_data(incremental=args.incremental, chunk_size=args.chunk_size, export_npz=args.npz,
+                       quantize=args.quantize, ivf=args.ivf, ivf_lists=args.ivf_lists,
+                       knn_scope=args.knn, knn_k=args.knn_k, knn_workers=args.knn_workers)
@@ -0,0 +1,94 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from metrics import REGISTRY
+
+RESPONSE_LOOKUPS = REGISTRY.counter('response_cache_total', '/api/products 응답 캐시 조회 (hit / miss)', ['result'])
+
+# ---------------------------------------------------------
+# [응답 캐시] seed 를 지정한 /api/products 응답 본문 LRU + TTL
+#   키: (후보 풀 캐시 키 공통부, seed, 카테고리별 가격 구간 행 범위)
+#   - 카탈로그 버전 / 대표 상품 digest 가 키에 들어 있으므로 데이터가 바뀌면 자연히 새 키가 된다
+#   - 이미지 상태(누끼 완료 여부)는 계속 바뀌므로 이미지 URL 을 채우기 전 본문을 저장하고, 꺼낼 때마다 다시 채운다
+# ---------------------------------------------------------
+def etag_for(payload):
+    """응답 바이트의 강한 ETag"""
+    return '"' + hashlib.sha1(payload).hexdigest()[:20] + '"'
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match 헤더(쉼표 구분 / W/ 접두 / *)에 etag 가 있는지"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    # If-None-Match 는 약한 비교: W/"x" 와 "x" 를 같게 본다
+    return '*' in tags or etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+class ResponseCache:
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, body)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        body, result = self.lookup(key)
+        self.record(result)
+        return body
+
+    def lookup(self, key):
+        """hit/miss 통계에 넣지 않고 조회. Returns: (body 또는 None, 'hit' / 'miss') -> 응답에 쓰면 record(result)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                return None, 'miss'
+            self._entries.move_to_end(key)
+        return entry[1], 'hit'
+
+    def record(self, result):
+        with self._lock:
+            if result == 'hit':
+                self.hits += 1
+            else:
+                self.misses += 1
+        RESPONSE_LOOKUPS.inc(result=result)
+
+    def put(self, key, body):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, persona=None):
+        """persona 의 항목(없으면 전체)을 비운다. Returns: 삭제된 항목 수"""
+        with self._lock:
+            if persona is None:
+                count = len(self._entries)
+                self._entries.clear()
+                return count
+            keys = [key for key in self._entries if key[0] == persona]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
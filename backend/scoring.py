@@ -0,0 +1,287 @@
+import numpy as np
+
+# ---------------------------------------------------------
+# [설정] 모달리티별 유사도 가중치
+# ---------------------------------------------------------
+MODALITIES = ['name', 'brand', 'img', 'cat']
+DEFAULT_WEIGHTS = {"name": 0.1, "brand": 0.2, "img": 0.6, "cat": 0.1}
+
+# 상품마다 벡터가 다른 모달리티 -> 통합 행렬 (N, D)
+DENSE_MODALITIES = ['name', 'img']
+# brand_id / category_id 에만 의존하는 모달리티 -> 중복 제거 테이블 (B, d) + 상품별 행 번호 (N,)
+TABLE_MODALITIES = ['brand', 'cat']
+
+# 통합 행렬 압축 저장 모드 (1차 점수 계산용, 최종 순위는 float32로 재계산)
+QUANTIZE_MODES = ['int8', 'float16']
+SCORE_CHUNK_ROWS = 8192
+
+# 페르소나별 가중치 오버라이드 (없으면 DEFAULT_WEIGHTS 사용)
+# 예: {"고프코어": {"img": 0.5, "brand": 0.3}}
+PERSONA_WEIGHTS = {}
+
+# ---------------------------------------------------------
+# [로드 시 1회] 가중치가 반영된 통합 행렬 생성
+# ---------------------------------------------------------
+def build_fused_matrix(data, weights=DEFAULT_WEIGHTS):
+    """
+    상품별 벡터(name/img)를 하나의 float32 행렬로 이어 붙인다.
+    각 블록은 sqrt(w)로 스케일되어 있으므로, 같은 행렬의 행끼리 내적하면
+    sum(w * 모달리티 내적) = 기존 가중합 점수가 그대로 나온다.
+
+    Returns:
+        fused: (N, D) float32 C-contiguous 행렬
+        blocks: {modality: (start, end)} 열 구간
+    """
+    parts = []
+    blocks = {}
+    offset = 0
+    for m in DENSE_MODALITIES:
+        vecs = np.asarray(data[f'{m}_vecs'], dtype=np.float32)
+        dim = vecs.shape[1]
+        parts.append(vecs * np.float32(np.sqrt(weights[m])))
+        blocks[m] = (offset, offset + dim)
+        offset += dim
+
+    fused = np.ascontiguousarray(np.hstack(parts), dtype=np.float32)
+    return fused, blocks
+
+def factorize_rows(vecs, chunk_rows=65536):
+    """
+    상품별로 복사된 벡터(N, d) -> 중복 제거 테이블 (B, d) + 상품별 행 번호 (N,) int32.
+    0 벡터(매칭 실패) 행은 -1. (기존 brand_vecs / cat_vecs 형식 변환용)
+    """
+    n_rows = len(vecs)
+    idx = np.full(n_rows, -1, dtype=np.int32)
+    lookup = {}
+    rows = []
+    for start in range(0, n_rows, chunk_rows):
+        block = np.ascontiguousarray(vecs[start:start + chunk_rows], dtype=np.float32)
+        uniq, inverse = np.unique(block, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        uniq_idx = np.empty(len(uniq), dtype=np.int32)
+        for i, row in enumerate(uniq):
+            if not row.any():
+                uniq_idx[i] = -1
+                continue
+            key = row.tobytes()
+            if key not in lookup:
+                lookup[key] = len(rows)
+                rows.append(row)
+            uniq_idx[i] = lookup[key]
+        idx[start:start + len(block)] = uniq_idx[inverse]
+
+    dim = vecs.shape[1] if vecs.ndim == 2 else 0
+    table = np.array(rows, dtype=np.float32).reshape(len(rows), dim)
+    return table, idx
+
+def quantize_fused(fused, blocks, mode):
+    """
+    통합 행렬을 압축한다.
+    - int8: 모달리티 블록마다 행 단위 스케일 (max|x| / 127) -> (N, D) int8 + (N, 블록 수) float32
+    - float16: (N, D) float16, 스케일 없음
+
+    Returns:
+        (quantized, scales 또는 None)
+    """
+    fused = np.asarray(fused, dtype=np.float32)
+    if mode == 'float16':
+        return fused.astype(np.float16), None
+    if mode != 'int8':
+        raise ValueError(f"unknown quantize mode: {mode}")
+
+    quantized = np.empty(fused.shape, dtype=np.int8)
+    scales = np.empty((len(fused), len(blocks)), dtype=np.float32)
+    for b, (start, end) in enumerate(blocks.values()):
+        part = fused[:, start:end]
+        scale = np.abs(part).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        quantized[:, start:end] = np.rint(part / scale[:, None])
+        scales[:, b] = scale
+    return quantized, scales
+
+# ---------------------------------------------------------
+# [요청 시] 가중치 오버라이드 -> 쿼리 측 열 스케일
+# ---------------------------------------------------------
+def resolve_weights(persona=None, overrides=None):
+    """기본값 <- 페르소나 설정 <- 요청 파라미터 순으로 덮어쓴 가중치 dict"""
+    weights = dict(DEFAULT_WEIGHTS)
+    if persona in PERSONA_WEIGHTS:
+        weights.update(PERSONA_WEIGHTS[persona])
+    if overrides:
+        weights.update({k: v for k, v in overrides.items() if k in weights and v is not None})
+    return weights
+
+def query_scale(blocks, weights, base_weights=DEFAULT_WEIGHTS):
+    """
+    통합 행렬은 sqrt(base_w)로 스케일되어 있으므로, 쿼리 행에만 w / base_w 를 곱하면
+    카탈로그 행렬을 다시 만들지 않고도 새 가중치의 점수를 얻을 수 있다.
+    가중치가 기본값과 같으면 None (스케일 불필요)
+    """
+    if all(weights[m] == base_weights[m] for m in blocks):
+        return None
+
+    total_dim = max(end for _, end in blocks.values())
+    scale = np.ones(total_dim, dtype=np.float32)
+    for m, (start, end) in blocks.items():
+        base = base_weights[m]
+        scale[start:end] = weights[m] / base if base > 0 else 0.0
+    return scale
+
+# ---------------------------------------------------------
+# [요청 시 1회] 대표 상품 쿼리 준비
+# ---------------------------------------------------------
+def prepare_queries(data, query_indices, weights=None):
+    """
+    대표 상품의 통합 행렬 행과, 테이블 모달리티(brand/cat)의 대표 상품 x 테이블 유사도를 미리 계산한다.
+    테이블 유사도는 (R, B + 1) 이며 마지막 열은 0 (행 번호 -1 = 매칭 실패 상품이 그대로 가리키는 열).
+    비용은 상품 수가 아니라 브랜드/카테고리 수에 비례한다.
+
+    Args:
+        data: master_data (fused_vecs, fused_blocks, {m}_table, {m}_idx)
+        query_indices: 대표 상품 인덱스 배열 (R,)
+        weights: resolve_weights 결과 (None이면 DEFAULT_WEIGHTS)
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    query_indices = np.asarray(query_indices, dtype=np.int64)
+
+    fused_queries = np.asarray(data['fused_vecs'][query_indices])
+    scale = query_scale(data['fused_blocks'], weights)
+    if scale is not None:
+        fused_queries = fused_queries * scale
+
+    table_sims = {}
+    for m in TABLE_MODALITIES:
+        if weights[m] == 0:
+            continue
+        table = data[f'{m}_table']
+        query_rows = np.asarray(data[f'{m}_idx'][query_indices])
+        sims = np.zeros((len(query_indices), len(table) + 1), dtype=np.float32)
+        valid = query_rows >= 0
+        sims[valid, :-1] = table[query_rows[valid]] @ np.asarray(table).T
+        sims *= np.float32(weights[m])
+        table_sims[m] = sims
+
+    return {'indices': query_indices, 'fused': fused_queries, 'tables': table_sims, 'weights': weights}
+
+# ---------------------------------------------------------
+# [요청 시] 대표 상품 전체 vs 카탈로그 점수 블록 (GEMM 1회)
+# ---------------------------------------------------------
+def _quantized_dot(data, query_fused, start, end):
+    """압축 행렬(fused_q) 기준 근사 내적. 메모리 사용을 줄이기 위해 SCORE_CHUNK_ROWS 행씩 float32로 풀어 계산"""
+    fused_q = data['fused_q']
+    scales = data['fused_q_scale'] if 'fused_q_scale' in data else None
+    blocks = list(data['fused_blocks'].values())
+
+    scores = np.empty((len(query_fused), end - start), dtype=np.float32)
+    for chunk_start in range(start, end, SCORE_CHUNK_ROWS):
+        chunk_end = min(chunk_start + SCORE_CHUNK_ROWS, end)
+        rows = np.asarray(fused_q[chunk_start:chunk_end], dtype=np.float32)
+        out = scores[:, chunk_start - start:chunk_end - start]
+        if scales is None:
+            out[:] = query_fused @ rows.T
+            continue
+        row_scales = np.asarray(scales[chunk_start:chunk_end])
+        out[:] = 0
+        for b, (col_start, col_end) in enumerate(blocks):
+            out += (query_fused[:, col_start:col_end] @ rows[:, col_start:col_end].T) * row_scales[:, b]
+    return scores
+
+def score_block(data, queries, start=0, end=None, quantized=False):
+    """
+    Args:
+        data: master_data
+        queries: prepare_queries 결과
+        start, end: 점수를 계산할 카탈로그 행 구간 (기본값: 전체)
+        quantized: True면 통합 행렬 대신 압축 행렬(fused_q)로 근사 점수 계산
+
+    Returns:
+        (R, end - start) float32 점수 행렬. 구간 안의 대표 상품 자기 자신은 -1.0
+    """
+    end = len(data['fused_vecs']) if end is None else end
+    if quantized:
+        scores = _quantized_dot(data, queries['fused'], start, end)
+    else:
+        scores = queries['fused'] @ data['fused_vecs'][start:end].T
+
+    # 브랜드/카테고리: 테이블 유사도를 상품별 행 번호로 gather
+    for m, sims in queries['tables'].items():
+        scores += sims[:, data[f'{m}_idx'][start:end]]
+
+    local = queries['indices'] - start
+    in_window = (local >= 0) & (local < end - start)
+    scores[np.nonzero(in_window)[0], local[in_window]] = -1.0
+    return scores
+
+def score_rows(data, queries, rows):
+    """임의의 카탈로그 행(rows)에 대한 float32 정확 점수 (R, len(rows)). 압축 모드의 재순위용"""
+    scores = queries['fused'] @ np.asarray(data['fused_vecs'][rows]).T
+    for m, sims in queries['tables'].items():
+        scores += sims[:, np.asarray(data[f'{m}_idx'][rows])]
+    scores[queries['indices'][:, None] == rows[None, :]] = -1.0
+    return scores
+
+# ---------------------------------------------------------
+# [로드 시 1회] 카테고리 문자열 -> 정수 코드
+# ---------------------------------------------------------
+def encode_categories(cats, category_names):
+    """
+    category_names 순서대로 0..C-1 코드를 부여한다. 목록에 없는 카테고리는 -1.
+    """
+    cats = np.asarray(cats).astype(str)
+    codes = np.full(len(cats), -1, dtype=np.int8)
+    for code, name in enumerate(category_names):
+        codes[cats == name] = code
+    return codes
+
+# ---------------------------------------------------------
+# [요청 시] 후보 선택: 부분 선택 + 중복 후보 최대값 병합
+# ---------------------------------------------------------
+def select_top_candidates(scores, k):
+    """
+    각 대표 상품(행)마다 상위 k개를 argpartition으로 뽑고,
+    여러 대표 상품에서 중복으로 뽑힌 후보는 가장 높은 점수 하나만 남긴다.
+
+    Returns:
+        (indices, scores): 중복 제거된 카탈로그 인덱스와 해당 최대 점수
+    """
+    n_rows, n_cols = scores.shape
+    k = min(k, n_cols)
+    if n_rows == 0 or k == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+
+    top = np.argpartition(scores, n_cols - k, axis=1)[:, n_cols - k:]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    return merge_candidates(top.ravel(), top_scores.ravel())
+
+def merge_candidates(flat_idx, flat_scores):
+    """(인덱스, 점수) 목록에서 같은 인덱스는 최대 점수 하나만 남긴다."""
+    # 인덱스 오름차순, 같은 인덱스 내에서는 점수 내림차순 -> 첫 번째가 최대값
+    order = np.lexsort((-flat_scores, flat_idx))
+    flat_idx = flat_idx[order]
+    flat_scores = flat_scores[order]
+
+    first = np.ones(len(flat_idx), dtype=bool)
+    first[1:] = flat_idx[1:] != flat_idx[:-1]
+    return flat_idx[first], flat_scores[first]
+
+def category_candidates(data, queries, start, end, k, rerank=0):
+    """
+    카탈로그 행 구간 [start, end) 에 대해 score_block + select_top_candidates 를 수행한다.
+    rerank > 0 이고 압축 행렬(fused_q)이 있으면, 압축 행렬로 대표 상품별 상위 rerank개를 먼저 뽑고
+    그 후보만 float32 통합 행렬로 다시 계산해 최종 k개를 고른다.
+
+    Returns:
+        (indices, scores): 전역 행 인덱스와 점수 (구간이 비어 있으면 빈 배열)
+    """
+    if start >= end or len(queries['indices']) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    if rerank > k and 'fused_q' in data:
+        shortlist, _ = select_top_candidates(score_block(data, queries, start, end, quantized=True), rerank)
+        shortlist += start
+        local_indices, top_scores = select_top_candidates(score_rows(data, queries, shortlist), k)
+        return shortlist[local_indices], top_scores
+
+    scores = score_block(data, queries, start, end)
+    local_indices, top_scores = select_top_candidates(scores, k)
+    return local_indices + start, top_scores
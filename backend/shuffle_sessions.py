@@ -0,0 +1,126 @@
+import time
+import secrets
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import REGISTRY
+
+SESSION_LOOKUPS = REGISTRY.counter('shuffle_session_total', '셔플 세션 조회 (hit / miss / expired / stale)', ['result'])
+
+# ---------------------------------------------------------
+# [셔플 세션] 첫 /api/products 응답에서 만든 카테고리별 후보 순서 + 커서
+#   - 후보 풀(인덱스, 점수) 배열은 후보 풀 캐시와 같은 객체를 참조 (복사 없음)
+#   - 세션마다 풀 크기만큼의 순서 배열(int16/int32)과 커서만 추가로 가진다
+#   - 셔플은 커서 다음 페이지를 잘라 주기만 하므로 O(페이지 크기), 점수 계산 없음
+#   - 풀을 다 보면 남은 항목을 앞에 두고 새 순서로 이어 붙인다 (한 페이지 안에서는 중복 없음)
+#   - 순서는 (세션 seed, 카테고리, 회차) 로 만든 난수로 섞으므로 같은 seed + 같은 후보 풀이면 같은 페이지가 나온다
+#   세션은 프로세스 메모리에만 있으므로 워커가 여러 개면 다른 워커로 간 셔플은 새 세션이 된다
+# ---------------------------------------------------------
+class CategoryCursor:
+    __slots__ = ('window', 'indices', 'scores', 'stream', 'order', 'cursor', 'rounds')
+
+    def __init__(self, window, indices, scores, stream):
+        self.window = window  # (start, end) 가격 구간 행 범위
+        self.indices = indices
+        self.scores = scores
+        self.stream = stream  # (seed, 카테고리 코드): 난수 생성기를 들고 있지 않고 회차마다 다시 만든다
+        self.cursor = 0
+        self.rounds = 0  # 풀을 몇 번 다 돌았는지
+        dtype = np.int16 if len(indices) <= np.iinfo(np.int16).max else np.int32
+        self.order = self._rng().permutation(len(indices)).astype(dtype)
+
+    def _rng(self):
+        return np.random.default_rng([*self.stream, self.rounds])
+
+    def take(self, n):
+        """아직 보여주지 않은 후보 위치 n개 (풀이 n개보다 작으면 전체)"""
+        size = len(self.order)
+        n = min(n, size)
+        if self.cursor + n > size:
+            unseen = self.order[self.cursor:]
+            self.rounds += 1
+            rest = self._rng().permutation(np.setdiff1d(np.arange(size), unseen)).astype(self.order.dtype)
+            self.order = np.concatenate([unseen, rest])
+            self.cursor = 0
+        page = self.order[self.cursor:self.cursor + n]
+        self.cursor += n
+        return page
+
+class ShuffleSession:
+    __slots__ = ('base_key', 'seed', 'categories', 'expires_at')
+
+    def __init__(self, base_key, seed, expires_at):
+        self.base_key = base_key  # 후보 풀 캐시 키 공통부 (페르소나, 카탈로그 버전, 대표 상품 digest, 가중치, 모드)
+        self.seed = seed
+        self.categories = {}      # eng_key -> CategoryCursor
+        self.expires_at = expires_at
+
+class ShuffleSessionStore:
+    def __init__(self, max_sessions=10000, ttl=1800):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, base_key):
+        """
+        session_id 가 살아 있고 같은 조건(base_key)이면 세션을, 아니면 None.
+        조회할 때마다 만료 시각을 연장한다.
+        """
+        session, result = self.lookup(session_id, base_key)
+        self.record(result)
+        return session
+
+    def lookup(self, session_id, base_key):
+        """get 과 같지만 통계에 넣지 않는다. Returns: (세션 또는 None, 결과) -> 응답에 쓰면 record(result)"""
+        if not session_id:
+            return None, None
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                result = 'miss'
+            elif session.expires_at < now:
+                del self._sessions[session_id]
+                session, result = None, 'expired'
+            elif session.base_key != base_key:
+                # 카탈로그 / 대표 상품 / 가중치가 바뀐 세션은 새로 시작
+                session, result = None, 'stale'
+            else:
+                session.expires_at = now + self.ttl
+                self._sessions.move_to_end(session_id)
+                result = 'hit'
+        return session, result
+
+    def record(self, result):
+        if result is not None:  # session_id 없이 온 요청은 조회가 아님
+            SESSION_LOOKUPS.inc(result=result)
+
+    def create(self, base_key, seed):
+        """새 세션을 등록하고 (session_id, session) 반환. 최대 개수를 넘으면 가장 오래 안 쓴 세션부터 제거"""
+        session_id = secrets.token_urlsafe(12)
+        session = ShuffleSession(base_key, seed, time.monotonic() + self.ttl)
+        if self.max_sessions <= 0:
+            return session_id, session  # 저장하지 않음 (매번 새 세션 = 기존 무작위 추출과 같음)
+        with self._lock:
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session_id, session
+
+    def reset(self, session, eng_key, code, window, candidates):
+        """eng_key(카테고리 코드 code) 의 커서를 새 후보 풀로 (첫 요청 / 가격 구간 변경)"""
+        cursor = CategoryCursor(window, *candidates, stream=(session.seed, code))
+        with self._lock:
+            session.categories[eng_key] = cursor
+
+    def take(self, session, eng_key, n):
+        """세션의 eng_key 커서에서 다음 페이지 (같은 세션의 동시 셔플도 겹치지 않게 잠금 안에서)"""
+        with self._lock:
+            return session.categories[eng_key].take(n)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions, "ttl": self.ttl}
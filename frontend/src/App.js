@@ -114,7 +114,7 @@ function App() {
       const data = await res.json();
       if (data.items) {
         setRecommendedProducts(data.items); 
-        setCurrentOutfitId(data.current_outfit_id); 
+        setCurrentOutfitId(data.session_id); // 셔플 세션 (이미 본 상품 건너뛰기)
         setStep('collage');
       }
     } catch (err) {
@@ -278,6 +278,7 @@ function App() {
           result={result} 
           products={recommendedProducts} 
           currentOutfitId={currentOutfitId} 
+          onSessionChange={setCurrentOutfitId}
           onBackToMain={resetAll} 
           onBackToResult={() => setStep('price_setting')} 
           prices={prices}
@@ -5,7 +5,7 @@ import { personaBackMap } from './data';
 const API_BASE_URL = process.env.REACT_APP_API_BASE_URL || 'http://127.0.0.1:5000';
 
 // [수정] props에 onNavigateToPurchase 추가
-const CollagePage = ({ result, products, currentOutfitId, onBackToMain, onBackToResult, prices, onNavigateToPurchase }) => {
+const CollagePage = ({ result, products, currentOutfitId, onSessionChange, onBackToMain, onBackToResult, prices, onNavigateToPurchase }) => {
   const [displayItems, setDisplayItems] = useState({
     outer: [], top: [], bottom: [], shoes: [], acc: []
   });
@@ -26,6 +26,37 @@ const CollagePage = ({ result, products, currentOutfitId, onBackToMain, onBackTo
     }
   }, [products]);
 
+  // [추가] 누끼 처리 중(pending)인 상품은 주기적으로 상태를 조회해 완료되면 이미지 교체
+  useEffect(() => {
+    const pendingIds = Object.values(displayItems).flat()
+      .filter(item => item.img_status === 'pending')
+      .map(item => item.product_id);
+    if (pendingIds.length === 0) return;
+
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API_BASE_URL}/api/images/status`, {
+          params: { ids: pendingIds.join(',') }
+        });
+        const images = response.data.images || {};
+        setDisplayItems(prev => {
+          const next = {};
+          Object.keys(prev).forEach(cat => {
+            next[cat] = prev[cat].map(item => {
+              const info = images[item.product_id];
+              if (!info || info.status === 'pending') return item;
+              return { ...item, img_url: info.img_url, img_srcset: info.img_srcset, img_status: info.status };
+            });
+          });
+          return next;
+        });
+      } catch (error) {
+        console.error("이미지 상태 조회 실패:", error);
+      }
+    }, 2000);
+    return () => clearTimeout(timer);
+  }, [displayItems]);
+
   const bgImageName = personaBackMap[result];
   const bgPath = bgImageName ? `/backgrounds/${bgImageName}` : null;
 
@@ -35,13 +66,15 @@ const CollagePage = ({ result, products, currentOutfitId, onBackToMain, onBackTo
       const response = await axios.get(`${API_BASE_URL}/api/products`, {
         params: {
           persona: result,
-          outfit_id: currentOutfitId,
+          session: currentOutfitId,
           category: category,
           [`min_${category}`]: prices[category].min, 
           [`max_${category}`]: prices[category].max,
           _t: Date.now()
         }
       });
+      // [추가] 세션이 만료되어 새로 만들어졌으면 다음 셔플부터 새 세션 사용
+      if (response.data.session_id && onSessionChange) onSessionChange(response.data.session_id);
       const newItemsData = response.data.items;
       if (newItemsData && newItemsData[category]) {
         setDisplayItems(prev => ({ ...prev, [category]: newItemsData[category] }));
@@ -108,7 +141,8 @@ const CollagePage = ({ result, products, currentOutfitId, onBackToMain, onBackTo
               }}
               onContextMenu={(e) => { e.preventDefault(); setSelectedItems(prev => prev.filter(it => it.instanceId !== item.instanceId)); }} 
               style={{ left: `${item.x}px`, top: `${item.y}px`, transform: `scale(${item.scale})`, position: 'absolute', zIndex: item.zIndex, cursor: 'move' }}>
-              <img src={item.img_url} alt="" draggable="false" style={{ userSelect: 'none', width: '150px' }} />
+              {/* [추가] 확대(최대 3배)해도 흐려지지 않도록 축소본 중 큰 쪽을 고르게 */}
+              <img src={item.img_url} srcSet={item.img_srcset || undefined} sizes="450px" alt="" draggable="false" style={{ userSelect: 'none', width: '150px' }} />
             </div>
           ))}
         </div>
@@ -137,11 +171,14 @@ const CollagePage = ({ result, products, currentOutfitId, onBackToMain, onBackTo
                         <div className="img-box">
                           <img 
                             src={item.img_url} 
+                            // [추가] 누끼 축소본(WebP)이 있으면 썸네일 크기에 맞는 것만 받음
+                            srcSet={item.img_srcset || undefined}
+                            sizes="100px"
                             alt="" 
                             // 2. 이미지 태그에만 드래그 속성과 이벤트를 부여합니다.
                             draggable 
                             onDragStart={(e) => handleExternalDragStart(e, item, cat)}
-                            onError={(e) => e.target.src = 'https://via.placeholder.com/150'} 
+                            onError={(e) => { e.target.srcset = ''; e.target.src = 'https://via.placeholder.com/150'; }} 
                             style={{ cursor: 'grab' }} // 드래그 가능함을 시각적으로 표시
                           />
                         </div>
@@ -24,7 +24,7 @@ const PurchasePage = ({ selectedItems, onBack, bgPath, persona }) => {
 
       const data = await res.json().catch(() => ({}));
 
-      if (res.status === 201) {
+      if (res.status === 201 || res.status === 202) {
         alert("✅ 결제가 완료되어 아웃핏이 저장되었습니다!");
         return;
       }
@@ -55,7 +55,7 @@ const PurchasePage = ({ selectedItems, onBack, bgPath, persona }) => {
                    transform: `scale(${item.scale})`, 
                    zIndex: item.zIndex 
                  }}>
-              <img src={item.img_url} alt="" draggable="false" />
+              <img src={item.img_url} srcSet={item.img_srcset || undefined} sizes="150px" alt="" draggable="false" />
             </div>
           ))}
         </div>
@@ -71,7 +71,7 @@ const PurchasePage = ({ selectedItems, onBack, bgPath, persona }) => {
             {selectedItems.map((item) => (
               <div key={item.instanceId} className="purchase-item-card">
                 <div className="item-img-container">
-                  <img src={item.img_url} alt="" />
+                  <img src={item.img_url} srcSet={item.img_srcset || undefined} sizes="80px" alt="" />
                 </div>
                 <div className="item-text-info">
                   <p className="item-name">{item.product_name}</p>